@@ -0,0 +1,320 @@
+"""Per-view request metrics: SQL query counts, database time, cache lookups
+and latency, plus cache hits, misses and time per cache namespace.
+
+``RequestMetricsMiddleware`` measures every request and aggregates the
+numbers per resolved view (its dotted class or function path). They are
+served in the Prometheus text format by ``metrics_view`` and kept in
+process memory, so each worker reports its own totals.
+
+Views can declare a ``query_budget``; a request that runs more queries is
+logged as a warning, and raises ``QueryBudgetExceeded`` when
+``QUERY_BUDGET_RAISE`` is on (in the tests).
+Requests slower than ``SLOW_REQUEST_THRESHOLD_MS`` are logged as well.
+"""
+
+import contextvars
+import hmac
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+from users.jwks import auth_cache_stats
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A view ran more SQL queries than its declared ``query_budget``."""
+
+
+class RequestStats:
+    """What one request did, collected while it runs."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - start
+
+
+_current = contextvars.ContextVar("request_stats", default=None)
+
+
+def record_cache_lookup(hit):
+    """Count a cache hit or miss against the request being served, if any."""
+    stats = _current.get()
+    if stats is None:
+        return
+    if hit:
+        stats.cache_hits += 1
+    else:
+        stats.cache_misses += 1
+
+
+class MetricsRegistry:
+    """Process-wide totals per view and cache namespace, safe to update from
+    several threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = Counter()
+        self.latency_buckets = {}
+        self.latency_sum = Counter()
+        self.queries = Counter()
+        self.db_time = Counter()
+        self.cache = Counter()
+        self.budget_exceeded = Counter()
+        self.namespace_lookups = Counter()
+        self.namespace_operations = Counter()
+        self.namespace_time = Counter()
+
+    def observe_cache(self, namespace, operation, elapsed, hits=0, misses=0):
+        with self._lock:
+            self.namespace_operations[(namespace, operation)] += 1
+            self.namespace_time[(namespace, operation)] += elapsed
+            if hits:
+                self.namespace_lookups[(namespace, "hit")] += hits
+            if misses:
+                self.namespace_lookups[(namespace, "miss")] += misses
+
+    def observe(self, view, method, status, elapsed, stats, over_budget):
+        with self._lock:
+            self.requests[(view, method, str(status))] += 1
+            buckets = self.latency_buckets.setdefault(
+                view, [0] * (len(LATENCY_BUCKETS) + 1)
+            )
+            buckets[bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+            self.latency_sum[view] += elapsed
+            self.queries[view] += stats.queries
+            self.db_time[view] += stats.db_time
+            self.cache[(view, "hit")] += stats.cache_hits
+            self.cache[(view, "miss")] += stats.cache_misses
+            if over_budget:
+                self.budget_exceeded[view] += 1
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format."""
+        with self._lock:
+            lines = []
+            _family(
+                lines,
+                "http_requests_total",
+                "counter",
+                "Requests served, by view, method and status.",
+                (
+                    ({"view": v, "method": m, "status": s}, n)
+                    for (v, m, s), n in sorted(self.requests.items())
+                ),
+            )
+            lines += [
+                "# HELP http_request_duration_seconds Request latency by view.",
+                "# TYPE http_request_duration_seconds histogram",
+            ]
+            for view, buckets in sorted(self.latency_buckets.items()):
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), buckets):
+                    cumulative += count
+                    labels = _labels({"view": view, "le": bound})
+                    lines.append(
+                        f"http_request_duration_seconds_bucket{labels} {cumulative}"
+                    )
+                labels = _labels({"view": view})
+                lines.append(
+                    f"http_request_duration_seconds_sum{labels} "
+                    f"{self.latency_sum[view]:.6f}"
+                )
+                lines.append(
+                    f"http_request_duration_seconds_count{labels} {cumulative}"
+                )
+            _family(
+                lines,
+                "db_queries_total",
+                "counter",
+                "SQL queries run, by view.",
+                (({"view": v}, n) for v, n in sorted(self.queries.items())),
+            )
+            _family(
+                lines,
+                "db_query_duration_seconds_total",
+                "counter",
+                "Time spent in SQL queries, by view.",
+                (({"view": v}, f"{n:.6f}") for v, n in sorted(self.db_time.items())),
+            )
+            _family(
+                lines,
+                "cache_lookups_total",
+                "counter",
+                "Application cache lookups, by view and result.",
+                (
+                    ({"view": v, "result": r}, n)
+                    for (v, r), n in sorted(self.cache.items())
+                ),
+            )
+            _family(
+                lines,
+                "cache_namespace_lookups_total",
+                "counter",
+                "Cache lookups, by namespace and result.",
+                (
+                    ({"namespace": n, "result": r}, count)
+                    for (n, r), count in sorted(self.namespace_lookups.items())
+                ),
+            )
+            _family(
+                lines,
+                "cache_operations_total",
+                "counter",
+                "Cache operations, by namespace and operation.",
+                (
+                    ({"namespace": n, "operation": o}, count)
+                    for (n, o), count in sorted(self.namespace_operations.items())
+                ),
+            )
+            _family(
+                lines,
+                "cache_operation_duration_seconds_total",
+                "counter",
+                "Time spent in cache operations, by namespace and operation.",
+                (
+                    ({"namespace": n, "operation": o}, f"{seconds:.6f}")
+                    for (n, o), seconds in sorted(self.namespace_time.items())
+                ),
+            )
+            _family(
+                lines,
+                "query_budget_exceeded_total",
+                "counter",
+                "Requests that ran more queries than their view's budget.",
+                (({"view": v}, n) for v, n in sorted(self.budget_exceeded.items())),
+            )
+
+        _family(
+            lines,
+            "auth_cache_events_total",
+            "counter",
+            "Auth0 signing key and token claims cache events.",
+            (
+                ({"cache": name, "event": event}, value)
+                for name, stats in sorted(auth_cache_stats().items())
+                for event, value in sorted(stats.items())
+                if event != "hit_rate"
+            ),
+        )
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    pairs = ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+    return "{" + pairs + "}"
+
+
+def _family(lines, name, kind, description, samples):
+    lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+    lines += [f"{name}{_labels(labels)} {value}" for labels, value in samples]
+
+
+registry = MetricsRegistry()
+
+
+def _view(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unresolved", None
+    view = getattr(match.func, "view_class", match.func)
+    return f"{view.__module__}.{view.__qualname__}", view
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats.execute))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        elapsed = time.perf_counter() - start
+
+        name, view = _view(request)
+        budget = getattr(view, "query_budget", None)
+        over_budget = budget is not None and stats.queries > budget
+        registry.observe(
+            name, request.method, response.status_code, elapsed, stats, over_budget
+        )
+
+        if settings.DEBUG:
+            response["Server-Timing"] = (
+                f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", '
+                f"total;dur={elapsed * 1000:.1f}"
+            )
+        if elapsed * 1000 >= settings.SLOW_REQUEST_THRESHOLD_MS:
+            logger.warning(
+                "Slow request: %s %s (%s) took %.0f ms, %d queries in %.0f ms, "
+                "%d cache hits, %d misses",
+                request.method,
+                request.get_full_path(),
+                name,
+                elapsed * 1000,
+                stats.queries,
+                stats.db_time * 1000,
+                stats.cache_hits,
+                stats.cache_misses,
+            )
+        if over_budget:
+            message = (
+                f"{name} ran {stats.queries} queries for {request.method} "
+                f"{request.path}, over its budget of {budget}"
+            )
+            if settings.QUERY_BUDGET_RAISE:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint.
+
+    Needs ``Authorization: Bearer <METRICS_TOKEN>`` when a token is
+    configured, and a staff session otherwise.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        expected = f"Bearer {token}"
+        supplied = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(supplied.encode(), expected.encode()):
+            return HttpResponseForbidden()
+    elif not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(
+        registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -105,6 +105,14 @@ EMAIL_HOST_USER = config("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = config("EMAIL_HOST_PASSWORD")
 DEFAULT_FROM_EMAIL = config("DEFAULT_FROM_EMAIL")
 
+# Transactional email outbox (communications.tasks.send_outbound_emails).
+EMAIL_OUTBOX_BATCH_SIZE = config("EMAIL_OUTBOX_BATCH_SIZE", default=50, cast=int)
+EMAIL_OUTBOX_MAX_ATTEMPTS = config("EMAIL_OUTBOX_MAX_ATTEMPTS", default=6, cast=int)
+# Retries back off exponentially: 1, 2, 4, 8... minutes by default.
+EMAIL_OUTBOX_RETRY_BASE_SECONDS = config(
+    "EMAIL_OUTBOX_RETRY_BASE_SECONDS", default=60, cast=int
+)
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
 
@@ -135,6 +143,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "users",
     "exampapers",
     "mpesa_api",
@@ -181,6 +190,7 @@ SIMPLE_JWT = {
 }
 
 MIDDLEWARE = [
+    "backend.metrics.RequestMetricsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.security.SecurityMiddleware",
@@ -290,8 +300,51 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+# Original, unwatermarked uploads. Must not be served or lie under MEDIA_ROOT.
+PRIVATE_MEDIA_ROOT = config(
+    "PRIVATE_MEDIA_ROOT", default=str(BASE_DIR / "private_media")
+)
+
+# Chunked paper uploads are assembled here before being moved to storage.
+# Every web worker must see the same directory.
+PAPER_UPLOAD_TEMP_DIR = config(
+    "PAPER_UPLOAD_TEMP_DIR", default=str(BASE_DIR / "tmp" / "paper_uploads")
+)
+PAPER_UPLOAD_CHUNK_SIZE = config(
+    "PAPER_UPLOAD_CHUNK_SIZE", default=8 * 1024 * 1024, cast=int
+)
+PAPER_UPLOAD_MAX_SIZE = config(
+    "PAPER_UPLOAD_MAX_SIZE", default=500 * 1024 * 1024, cast=int
+)
+# How purchased papers are sent to buyers: "stream" (through Django),
+# "x_accel" (nginx X-Accel-Redirect), "x_sendfile" (Apache/lighttpd) or
+# "signed_url" (redirect to a short-lived object storage URL).
+PAPER_DELIVERY_BACKEND = config("PAPER_DELIVERY_BACKEND", default="stream")
+# Internal nginx location aliased to MEDIA_ROOT, used by "x_accel".
+PAPER_DELIVERY_X_ACCEL_PREFIX = config(
+    "PAPER_DELIVERY_X_ACCEL_PREFIX", default="/protected-media/"
+)
+PAPER_DELIVERY_SIGNED_URL_TTL = config(
+    "PAPER_DELIVERY_SIGNED_URL_TTL", default=300, cast=int
+)
+
+# Uploads still waiting for the processing pipeline after this many minutes
+# are queued again.
+PAPER_PROCESSING_REQUEUE_MINUTES = config(
+    "PAPER_PROCESSING_REQUEUE_MINUTES", default=15, cast=int
+)
+
+# Unfinished upload sessions are discarded after this many hours.
+PAPER_UPLOAD_SESSION_TTL_HOURS = config(
+    "PAPER_UPLOAD_SESSION_TTL_HOURS", default=24, cast=int
+)
 
 CELERY_BROKER_URL = config("CELERY_BROKER_URL")
+# Seconds paper view and download counts are buffered before being written
+# in bulk (exampapers.counters).
+PAPER_COUNTER_FLUSH_INTERVAL = config(
+    "PAPER_COUNTER_FLUSH_INTERVAL", default=5, cast=int
+)
 # CELERY_BEAT_SCHEDULE = {
 #     "process-weekly-withdrawals": {
 #         "task": "payments.services.payout_service.disburse_withdrawals",
@@ -304,6 +357,30 @@ CELERY_BEAT_SCHEDULE = {
         "task": "payments.signals.batch_process_withdrawals",
         "schedule": crontab(minute=0, hour="0-23", day_of_week="sun"),
     },
+    "send-outbound-emails": {
+        "task": "communications.tasks.send_outbound_emails",
+        "schedule": crontab(),
+    },
+    "requeue-pending-papers": {
+        "task": "exampapers.tasks.requeue_pending_papers",
+        "schedule": crontab(minute="*/10"),
+    },
+    "expire-paper-upload-sessions": {
+        "task": "exampapers.tasks.expire_upload_sessions",
+        "schedule": crontab(minute=30),
+    },
+    "warm-catalog-cache": {
+        "task": "exampapers.tasks.warm_catalog_cache",
+        "schedule": crontab(minute="*/5"),
+    },
+    "flush-paper-counters": {
+        "task": "exampapers.tasks.flush_paper_counters",
+        "schedule": PAPER_COUNTER_FLUSH_INTERVAL,
+    },
+    "rollup-statistics": {
+        "task": "exampapers.tasks.rollup_statistics",
+        "schedule": crontab(hour=0, minute=5),
+    },
 }
 
 # Redis as the channel layer
@@ -354,6 +431,83 @@ PESAPAL_IPN_URL = config("PESAPAL_IPN_URL")
 AUTH0_DOMAIN = config("AUTH0_DOMAIN")
 AUTH0_API_IDENTIFIER = config("AUTH0_API_IDENTIFIER")
 AUTH0_ALGORITHMS = ["RS256"]
+# Signing keys are refreshed in the background after AUTH0_JWKS_CACHE_TTL
+# seconds and, if Auth0 is unreachable, used for up to AUTH0_JWKS_MAX_STALE.
+AUTH0_JWKS_CACHE_TTL = config("AUTH0_JWKS_CACHE_TTL", default=600, cast=int)
+AUTH0_JWKS_MAX_STALE = config("AUTH0_JWKS_MAX_STALE", default=86400, cast=int)
+AUTH0_JWKS_MIN_REFRESH_INTERVAL = config(
+    "AUTH0_JWKS_MIN_REFRESH_INTERVAL", default=30, cast=int
+)
+AUTH0_CLAIMS_CACHE_SIZE = config("AUTH0_CLAIMS_CACHE_SIZE", default=10000, cast=int)
+# How long an Auth0 subject stays mapped to its user without a database hit.
+AUTH0_USER_CACHE_TTL = config("AUTH0_USER_CACHE_TTL", default=300, cast=int)
+
+# Request metrics (backend.metrics). Requests slower than this are logged.
+SLOW_REQUEST_THRESHOLD_MS = config("SLOW_REQUEST_THRESHOLD_MS", default=1000, cast=int)
+# Raise instead of logging when a view runs more queries than its
+# query_budget; meant for tests.
+QUERY_BUDGET_RAISE = config("QUERY_BUDGET_RAISE", default=False, cast=bool)
+# Bearer token for /metrics/; without one only staff sessions may scrape.
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+
+# Seconds the approximate totals of cursor-paginated paper listings are
+# cached.
+PAPER_LISTING_COUNT_CACHE_TTL = config(
+    "PAPER_LISTING_COUNT_CACHE_TTL", default=120, cast=int
+)
+
+# Seconds the homepage's latest and popular listings are cached
+# (exampapers.catalog_cache). Edits invalidate them sooner; the beat task
+# recomputes them every 5 minutes.
+CATALOG_CACHE_TTL = config("CATALOG_CACHE_TTL", default=600, cast=int)
+
+# Seconds search facet counts are cached per query and filters.
+PAPER_SEARCH_FACET_CACHE_TTL = config(
+    "PAPER_SEARCH_FACET_CACHE_TTL", default=300, cast=int
+)
+
+# Seconds a user's purchased paper ids stay cached; orders changing
+# invalidate them sooner.
+PAPER_ENTITLEMENT_CACHE_TTL = config(
+    "PAPER_ENTITLEMENT_CACHE_TTL", default=3600, cast=int
+)
+# Seconds payment gateway data (e.g. OAuth tokens without an expiry) is
+# cached.
+PAYMENTS_CACHE_TTL = config("PAYMENTS_CACHE_TTL", default=3000, cast=int)
+
+# Caches (backend.cache): one alias per namespace, each with its own key
+# prefix and default TTL, shared by every worker through Redis. Leave
+# CACHE_REDIS_URL empty for per-process local memory (tests, local dev).
+CACHE_REDIS_URL = config("CACHE_REDIS_URL", default="redis://127.0.0.1:6379/1")
+# Cached values of at least this many bytes are stored zlib-compressed.
+CACHE_COMPRESS_MIN_SIZE = config("CACHE_COMPRESS_MIN_SIZE", default=1024, cast=int)
+CACHE_NAMESPACES = {
+    "default": 300,
+    "catalog": CATALOG_CACHE_TTL,
+    "auth": AUTH0_USER_CACHE_TTL,
+    "entitlements": PAPER_ENTITLEMENT_CACHE_TTL,
+    "payments": PAYMENTS_CACHE_TTL,
+    # Dashboard counts of the day, read back by the next night's rollup.
+    # Needs the shared Redis cache to be right across workers.
+    "stats": 2 * 24 * 60 * 60,
+}
+CACHES = {
+    name: {
+        "BACKEND": (
+            "backend.cache.RedisCache"
+            if CACHE_REDIS_URL
+            else "backend.cache.LocMemCache"
+        ),
+        "LOCATION": CACHE_REDIS_URL or name,
+        "OPTIONS": (
+            {"serializer": "backend.cache.MsgpackSerializer"} if CACHE_REDIS_URL else {}
+        ),
+        "NAMESPACE": name,
+        "KEY_PREFIX": name,
+        "TIMEOUT": timeout,
+    }
+    for name, timeout in CACHE_NAMESPACES.items()
+}
 
 JAZZMIN_SETTINGS = {
     "site_title": "HQZen Admin",
@@ -22,6 +22,8 @@ from django.http import JsonResponse
 from django.urls import include, path
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
+from backend.metrics import metrics_view
+
 
 def index(request):
     return JsonResponse({"message": "Welcome to GradesWorld API"})
@@ -37,6 +39,7 @@ urlpatterns = [
     path("", index),
     path("admin/", admin.site.urls),
     path("health/", health_check),
+    path("metrics/", metrics_view),
     path("api/users/", include("users.urls")),
     path("api/exampapers/", include("exampapers.urls")),
     path("api/blog/", include("blog.urls")),
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.utils.timezone import now
 
 from .models import (
     ChatMessage,
@@ -6,6 +7,7 @@ from .models import (
     CopyrightReport,
     EmailSubscriber,
     Notification,
+    OutboundEmail,
 )
 
 
@@ -53,3 +55,27 @@ class CopyrightReportAdmin(admin.ModelAdmin):
         queryset.update(status="dismissed")
 
     mark_as_dismissed.short_description = "Mark selected reports as dismissed"
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = (
+        "subject",
+        "recipient",
+        "template",
+        "status",
+        "attempts",
+        "created_at",
+        "sent_at",
+    )
+    list_filter = ("status", "template")
+    search_fields = ("recipient", "subject")
+    readonly_fields = ("created_at", "sent_at", "claimed_at", "last_error")
+    actions = ["retry_now"]
+
+    def retry_now(self, request, queryset):
+        queryset.exclude(status="sent").update(
+            status="pending", next_attempt_at=now(), attempts=0
+        )
+
+    retry_now.short_description = "Retry selected emails now"
@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Count, F, Q, Sum
+from django.utils.timezone import now
+
+from communications.models import OutboundEmail
+
+
+class Command(BaseCommand):
+    help = "Show per-template delivery metrics for the email outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours",
+            type=int,
+            default=24,
+            help="Only include emails queued in the last N hours (default: 24)",
+        )
+
+    def handle(self, *args, **options):
+        since = now() - timedelta(hours=options["hours"])
+        rows = (
+            OutboundEmail.objects.filter(created_at__gte=since)
+            .values("template")
+            .annotate(
+                total=Count("id"),
+                sent=Count("id", filter=Q(status="sent")),
+                queued=Count("id", filter=Q(status__in=["pending", "sending"])),
+                failed=Count("id", filter=Q(status="failed")),
+                attempts=Sum("attempts"),
+                latency=Avg(F("sent_at") - F("created_at"), filter=Q(status="sent")),
+            )
+            .order_by("-total")
+        )
+
+        self.stdout.write(
+            f"{'template':<45}{'sent':>7}{'queued':>8}{'failed':>8}"
+            f"{'retries':>9}{'avg delay':>11}"
+        )
+        for row in rows:
+            retries = (row["attempts"] or 0) - row["sent"] - row["failed"]
+            latency = (
+                f"{row['latency'].total_seconds():.1f}s" if row["latency"] else "-"
+            )
+            self.stdout.write(
+                f"{row['template'] or '(plain text)':<45}{row['sent']:>7}"
+                f"{row['queued']:>8}{row['failed']:>8}{max(retries, 0):>9}"
+                f"{latency:>11}"
+            )
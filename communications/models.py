@@ -1,6 +1,8 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.mail import EmailMultiAlternatives
 from django.db import models
+from django.utils.timezone import now
 
 from exampapers.models import Paper
 
@@ -76,3 +78,51 @@ class CopyrightReport(models.Model):
 
     def __str__(self):
         return f"Report on {self.paper.title} ({self.get_reason_display()})"
+
+
+class OutboundEmail(models.Model):
+    """A transactional email waiting in the outbox.
+
+    Emails are rendered and stored inside the request that triggers them
+    and delivered by ``communications.tasks.send_outbound_emails``, so a
+    slow mail server never holds up a request.
+    """
+
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("sending", "Sending"),
+        ("sent", "Sent"),
+        ("failed", "Failed"),
+    ]
+
+    template = models.CharField(max_length=255, blank=True, db_index=True)
+    subject = models.CharField(max_length=255)
+    from_email = models.CharField(max_length=255)
+    recipient = models.EmailField()
+    text_body = models.TextField()
+    html_body = models.TextField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.recipient} ({self.status})"
+
+    def as_message(self, connection=None):
+        msg = EmailMultiAlternatives(
+            self.subject,
+            self.text_body,
+            self.from_email,
+            [self.recipient],
+            connection=connection,
+        )
+        if self.html_body:
+            msg.attach_alternative(self.html_body, "text/html")
+        return msg
@@ -0,0 +1,34 @@
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.template.loader import render_to_string
+
+from .models import OutboundEmail
+from .tasks import send_outbound_emails
+
+logger = logging.getLogger(__name__)
+
+
+def queue_email(
+    recipient, subject, text_body, template_name=None, context=None, from_email=None
+):
+    """Render an email and put it in the outbox.
+
+    The email is only handed to the sender task once the surrounding
+    transaction commits, so emails about rolled back changes never go out.
+    """
+    email = OutboundEmail.objects.create(
+        template=template_name or "",
+        subject=subject,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipient=recipient,
+        text_body=text_body,
+        html_body=(
+            render_to_string(template_name, context or {}) if template_name else ""
+        ),
+    )
+    # Only a nudge: the email is saved and the beat schedule sends it anyway,
+    # so a broker outage must not fail the request that queued it.
+    transaction.on_commit(lambda: send_outbound_emails.delay(), robust=True)
+    return email
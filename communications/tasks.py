@@ -0,0 +1,109 @@
+import logging
+from datetime import timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils.timezone import now
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+# A batch claimed by a worker that died is picked up again after this long.
+STALE_CLAIM = timedelta(minutes=10)
+
+
+def _claim_batch(batch_size):
+    """Mark up to ``batch_size`` due emails as being sent by this worker."""
+    current = now()
+    with transaction.atomic():
+        ids = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status="pending", next_attempt_at__lte=current)
+                | Q(status="sending", claimed_at__lt=current - STALE_CLAIM)
+            )
+            .order_by("next_attempt_at")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        OutboundEmail.objects.filter(id__in=ids).update(
+            status="sending", claimed_at=current
+        )
+    return list(OutboundEmail.objects.filter(id__in=ids))
+
+
+def _record_failure(email, error):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        email.status = "failed"
+        logger.error(
+            f"Giving up on email {email.id} ({email.template or 'plain'}) "
+            f"after {email.attempts} attempts: {error}"
+        )
+    else:
+        email.status = "pending"
+        delay = settings.EMAIL_OUTBOX_RETRY_BASE_SECONDS * 2 ** (email.attempts - 1)
+        email.next_attempt_at = now() + timedelta(seconds=delay)
+        logger.warning(
+            f"Email {email.id} failed (attempt {email.attempts}), "
+            f"retrying in {delay}s: {error}"
+        )
+    email.save(update_fields=["attempts", "last_error", "status", "next_attempt_at"])
+
+
+def _send_batch(batch):
+    """Send a batch over a single mail server connection."""
+    sent = 0
+    try:
+        connection = get_connection()
+        connection.open()
+    except Exception as e:
+        for email in batch:
+            _record_failure(email, e)
+        return sent
+
+    try:
+        for email in batch:
+            try:
+                connection.send_messages([email.as_message(connection)])
+            except Exception as e:
+                _record_failure(email, e)
+                continue
+
+            email.status = "sent"
+            email.attempts += 1
+            email.last_error = ""
+            email.sent_at = now()
+            email.save(update_fields=["status", "attempts", "last_error", "sent_at"])
+            sent += 1
+    finally:
+        connection.close()
+    return sent
+
+
+@shared_task
+def send_outbound_emails(batch_size=None):
+    """Deliver due emails from the outbox, batch by batch.
+
+    Runs whenever an email is queued and periodically from beat, which
+    also picks up retries once their backoff has passed.
+    """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    sent = failed = 0
+    while True:
+        batch = _claim_batch(batch_size)
+        if not batch:
+            break
+        batch_sent = _send_batch(batch)
+        sent += batch_sent
+        failed += len(batch) - batch_sent
+        if len(batch) < batch_size:
+            break
+
+    if sent or failed:
+        logger.info(f"Outbox: sent {sent} emails, {failed} failed")
+    return sent
@@ -1,11 +1,10 @@
 from django.conf import settings
-from django.core.mail import EmailMultiAlternatives, send_mail
-from django.template.loader import render_to_string
 from rest_framework import generics, permissions, status
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
 from .models import ChatMessage, ContactMessage, CopyrightReport, EmailSubscriber
+from .outbox import queue_email
 from .serializers import (
     ChatMessageSerializer,
     ContactMessageSerializer,
@@ -25,15 +24,8 @@ class ContactMessageCreateView(generics.CreateAPIView):
         # Send email to admin
         subject = f"New Contact Message from {instance.name}"
         message = f"Name: {instance.name}\nEmail: {instance.email}\n\nMessage:\n{instance.message}"
-        admin_email = settings.DEFAULT_FROM_EMAIL
-
-        send_mail(
-            subject,
-            message,
-            from_email=admin_email,
-            recipient_list=[admin_email],
-            fail_silently=False,
-        )
+
+        queue_email(settings.DEFAULT_FROM_EMAIL, subject, message)
 
 
 class EmailSubscriberCreateView(generics.CreateAPIView):
@@ -43,20 +35,13 @@ class EmailSubscriberCreateView(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         instance = serializer.save()
-        subject = "🎉 Thank You for Subscribing to GradesWorld!"
-        recipient = instance.email
-        from_email = settings.DEFAULT_FROM_EMAIL
-
-        html_content = render_to_string(
-            "emails/subscription_email.html", {"email": recipient}
+        queue_email(
+            instance.email,
+            "🎉 Thank You for Subscribing to GradesWorld!",
+            "Thank you for subscribing to GradesWorld! Stay tuned for updates.",
+            template_name="emails/subscription_email.html",
+            context={"email": instance.email},
         )
-        text_content = (
-            "Thank you for subscribing to GradesWorld! Stay tuned for updates."
-        )
-
-        msg = EmailMultiAlternatives(subject, text_content, from_email, [recipient])
-        msg.attach_alternative(html_content, "text/html")
-        msg.send()
 
 
 class EmailUnsubscribeView(generics.DestroyAPIView):
@@ -74,16 +59,13 @@ class EmailUnsubscribeView(generics.DestroyAPIView):
             subscriber = EmailSubscriber.objects.get(email=email)
             subscriber.delete()
 
-            subject = "📭 You’ve Unsubscribed from GradesWorld"
-            from_email = settings.DEFAULT_FROM_EMAIL
-            html_content = render_to_string(
-                "emails/unsubscription_email.html", {"email": email}
+            queue_email(
+                email,
+                "📭 You’ve Unsubscribed from GradesWorld",
+                "You've been unsubscribed from GradesWorld.",
+                template_name="emails/unsubscription_email.html",
+                context={"email": email},
             )
-            text_content = "You've been unsubscribed from GradesWorld."
-
-            msg = EmailMultiAlternatives(subject, text_content, from_email, [email])
-            msg.attach_alternative(html_content, "text/html")
-            msg.send()
 
             return Response(
                 {"detail": "Unsubscribed successfully."},
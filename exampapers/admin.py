@@ -1,16 +1,16 @@
 from django.contrib import admin
 
-from exampapers.tasks import generate_paper_preview
-
 from .models import (
     Category,
     Course,
     Order,
     Paper,
+    PaperDailyStats,
     PaperDownload,
     Review,
     School,
     Statistics,
+    UploadSession,
     Wishlist,
 )
 
@@ -46,7 +46,9 @@ class PaperAdmin(admin.ModelAdmin):
         "price",
         "upload_date",
         "downloads",
+        "sold_count",
         "earnings",
+        "processing_state",
     )
     search_fields = (
         "title",
@@ -55,12 +57,32 @@ class PaperAdmin(admin.ModelAdmin):
         "category__name",
         "course__name",
     )
-    list_filter = ("upload_date", "category", "course", "earnings")
-    readonly_fields = ("downloads", "earnings")
+    list_filter = (
+        "upload_date",
+        "category",
+        "course",
+        "earnings",
+        "processing_state",
+    )
+    readonly_fields = (
+        "downloads",
+        "review_count",
+        "rating_sum",
+        "sold_count",
+        "revenue",
+        "earnings",
+        "source_file_name",
+        "source_sha256",
+        "processing_state",
+        "processing_error",
+    )
+    # Original uploads are in private storage and have no URL to link to.
+    exclude = ("source_file",)
 
-    def save_model(self, request, obj, form, change):
-        super().save_model(request, obj, form, change)
-        generate_paper_preview.delay(obj.id)
+    def source_file_name(self, obj):
+        return obj.source_file.name
+
+    source_file_name.short_description = "Source file"
 
 
 @admin.register(PaperDownload)
@@ -101,8 +123,33 @@ class StatisticsAdmin(admin.ModelAdmin):
         "date",
         "total_papers",
         "total_downloads",
+        "total_views",
         "total_earnings",
         "total_users",
     )
     list_filter = ("date",)
     ordering = ["-date"]
+
+
+@admin.register(PaperDailyStats)
+class PaperDailyStatsAdmin(admin.ModelAdmin):
+    list_display = (
+        "date",
+        "paper",
+        "seller",
+        "views",
+        "downloads",
+        "sales",
+        "revenue",
+    )
+    list_filter = ("date",)
+    raw_id_fields = ("paper", "seller")
+    ordering = ["-date"]
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "filename", "size", "status", "created_at")
+    list_filter = ("status", "created_at")
+    search_fields = ("user__email", "filename")
+    readonly_fields = ("received_parts", "paper")
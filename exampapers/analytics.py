@@ -0,0 +1,218 @@
+"""Daily activity per paper and seller, for sellers' trend charts.
+
+Each ``PaperDailyStats`` row holds one paper's views, downloads, sales,
+revenue and reviews on one day, with the paper's author as its seller.
+Rows are updated as events happen: views and downloads when
+exampapers.counters flushes them, sales and reviews from
+exampapers.paper_stats. Reading a seller's trend for any date range is
+then one range scan of the (seller, date) index, however long their
+history, and never touches downloads, orders or reviews.
+
+``backfill`` rebuilds days from downloads, completed orders and reviews.
+Views are only counted in aggregate, so past views can't be rebuilt.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import (
+    Case,
+    Count,
+    DateField,
+    DecimalField,
+    F,
+    IntegerField,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import TruncDate, TruncDay, TruncMonth, TruncWeek
+from django.utils.timezone import localdate
+
+from .models import Order, Paper, PaperDailyStats, PaperDownload, Review
+
+FIELDS = ("views", "downloads", "sales", "revenue", "review_count", "rating_sum")
+# The fields backfill can rebuild from the event tables.
+EVENT_FIELDS = ("downloads", "sales", "revenue", "review_count", "rating_sum")
+PERIODS = {"day": TruncDay, "week": TruncWeek, "month": TruncMonth}
+# Papers per statement.
+BATCH_SIZE = 500
+
+
+def _output_field(field):
+    if field == "revenue":
+        return DecimalField(max_digits=12, decimal_places=2)
+    return IntegerField()
+
+
+def _sellers(paper_ids):
+    return dict(Paper.objects.filter(pk__in=paper_ids).values_list("pk", "author_id"))
+
+
+def add(day, deltas):
+    """Add ``deltas``, as ``{field: {paper_id: delta}}``, to the papers'
+    rows of ``day``."""
+    deltas = {
+        field: {pk: delta for pk, delta in by_paper.items() if delta}
+        for field, by_paper in deltas.items()
+    }
+    paper_ids = sorted({pk for by_paper in deltas.values() for pk in by_paper})
+    for start in range(0, len(paper_ids), BATCH_SIZE):
+        batch = paper_ids[start : start + BATCH_SIZE]
+        PaperDailyStats.objects.bulk_create(
+            [
+                PaperDailyStats(paper_id=pk, seller_id=seller, date=day)
+                for pk, seller in _sellers(batch).items()
+            ],
+            ignore_conflicts=True,
+        )
+        updates = {}
+        for field, by_paper in deltas.items():
+            whens = [
+                When(paper_id=pk, then=Value(by_paper[pk]))
+                for pk in batch
+                if pk in by_paper
+            ]
+            if whens:
+                updates[field] = F(field) + Case(
+                    *whens, default=Value(0), output_field=_output_field(field)
+                )
+        PaperDailyStats.objects.filter(date=day, paper_id__in=batch).update(**updates)
+
+
+def record_review(paper_id, rating_delta, count_delta):
+    add(
+        localdate(),
+        {
+            "review_count": {paper_id: count_delta},
+            "rating_sum": {paper_id: rating_delta},
+        },
+    )
+
+
+def record_sale(paper_ids, delta=1):
+    """Count (or un-count) one sale of each paper today, at its current
+    price."""
+    prices = Paper.objects.filter(pk__in=paper_ids).values_list("pk", "price")
+    add(
+        localdate(),
+        {
+            "sales": {pk: delta for pk in paper_ids},
+            "revenue": {pk: price * delta for pk, price in prices},
+        },
+    )
+
+
+def _period_starts(start, end, period):
+    if period == "day":
+        current = start
+    elif period == "week":
+        current = start - timedelta(days=start.weekday())
+    else:
+        current = start.replace(day=1)
+    while current <= end:
+        yield current
+        if period == "day":
+            current += timedelta(days=1)
+        elif period == "week":
+            current += timedelta(days=7)
+        else:
+            current = (current + timedelta(days=32)).replace(day=1)
+
+
+def _point(values):
+    point = {field: values.get(field) or 0 for field in FIELDS}
+    point["average_rating"] = (
+        point["rating_sum"] / point["review_count"] if point["review_count"] else None
+    )
+    return point
+
+
+def series(seller, start, end, period="day", paper_id=None):
+    """The seller's activity from ``start`` to ``end`` (inclusive) in
+    ``period`` buckets, empty ones included, with the range's totals."""
+    rows = PaperDailyStats.objects.filter(seller=seller, date__range=(start, end))
+    if paper_id is not None:
+        rows = rows.filter(paper_id=paper_id)
+    buckets = {
+        row.pop("period"): row
+        for row in rows.annotate(
+            period=PERIODS[period]("date", output_field=DateField())
+        )
+        .values("period")
+        .annotate(**{field: Sum(field) for field in FIELDS})
+        .order_by("period")
+    }
+    points = [
+        {"date": day, **_point(buckets.get(day, {}))}
+        for day in _period_starts(start, end, period)
+    ]
+    totals = _point({field: sum(point[field] for point in points) for field in FIELDS})
+    return {
+        "period": period,
+        "start": start,
+        "end": end,
+        "totals": totals,
+        "series": points,
+    }
+
+
+def backfill(start, end):
+    """Rebuild the download, sale and review numbers of the days ``start`` to
+    ``end`` (inclusive) from the event tables, keeping the views. Sales
+    count on the day the order was placed. Returns the number of rows
+    written."""
+    rebuilt = defaultdict(lambda: dict.fromkeys(EVENT_FIELDS, 0))
+
+    downloads = (
+        PaperDownload.objects.annotate(day=TruncDate("downloaded_at"))
+        .filter(day__range=(start, end))
+        .values("paper", "day")
+        .annotate(downloads=Count("*"))
+        .order_by()
+    )
+    for row in downloads:
+        rebuilt[(row["paper"], row["day"])]["downloads"] = row["downloads"]
+
+    sales = (
+        Order.papers.through.objects.filter(order__status="completed")
+        .annotate(day=TruncDate("order__created_at"))
+        .filter(day__range=(start, end))
+        .values("paper", "day")
+        .annotate(sales=Count("*"), revenue=Sum("paper__price"))
+        .order_by()
+    )
+    for row in sales:
+        rebuilt[(row["paper"], row["day"])].update(
+            sales=row["sales"], revenue=row["revenue"]
+        )
+
+    reviews = (
+        Review.objects.annotate(day=TruncDate("created_at"))
+        .filter(day__range=(start, end))
+        .values("paper", "day")
+        .annotate(review_count=Count("*"), rating_sum=Sum("rating"))
+        .order_by()
+    )
+    for row in reviews:
+        rebuilt[(row["paper"], row["day"])].update(
+            review_count=row["review_count"], rating_sum=row["rating_sum"]
+        )
+
+    sellers = _sellers({pk for pk, _ in rebuilt})
+    with transaction.atomic():
+        PaperDailyStats.objects.filter(date__range=(start, end)).update(
+            **dict.fromkeys(EVENT_FIELDS, 0)
+        )
+        PaperDailyStats.objects.bulk_create(
+            [
+                PaperDailyStats(paper_id=pk, seller_id=sellers[pk], date=day, **values)
+                for (pk, day), values in rebuilt.items()
+            ],
+            batch_size=BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=["paper", "date"],
+            update_fields=EVENT_FIELDS,
+        )
+    return len(rebuilt)
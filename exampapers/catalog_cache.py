@@ -0,0 +1,222 @@
+"""Versioned, tag-based cache for the catalog data on the homepage.
+
+Each entry depends on a few tags ("papers", "reviews", "schools"...). Every
+tag has a version in the cache and an entry's key is built from the
+versions of its tags, so ``invalidate("papers")`` makes every entry that
+shows papers miss on its next read without knowing their keys. The
+signals bump tags when papers, reviews, courses, categories or schools
+change; counters updated in bulk (downloads, views) only show up once the
+entry expires after ``CATALOG_CACHE_TTL`` seconds.
+
+Recomputes are protected against stampedes. Only the worker holding an
+entry's lock recomputes it, while the others keep serving the last value
+computed. Entries are also refreshed early with a probability that grows
+as they near expiry (probabilistic early expiration, "XFetch"), so a hot
+entry is normally rebuilt by one request before it expires.
+"""
+
+import json
+import math
+import random
+import time
+
+from django.conf import settings
+from django.db.models import Avg, Count, FloatField, Prefetch, Q, Sum
+from django.db.models.functions import Cast, NullIf
+from rest_framework.utils.encoders import JSONEncoder
+
+from backend.cache import namespace
+
+from .models import Category, Course, Paper, School
+from .serializers import CategorySerializer, PaperListSerializer, SchoolSerializer
+
+# Seconds a worker may hold an entry's recompute lock.
+LOCK_TIMEOUT = 30
+# How long a worker without a previous value waits for another one's
+# recompute before doing it itself.
+WAIT_TIMEOUT = 2.0
+WAIT_INTERVAL = 0.05
+# Seconds the last computed value of each entry is kept to serve while it
+# is being recomputed.
+STALE_TTL = 24 * 60 * 60
+# Above 1 refreshes earlier, below 1 later.
+XFETCH_BETA = 1.0
+
+cache = namespace("catalog")
+
+_entries = {}
+
+
+def catalog_entry(name, tags):
+    """Register the function computing entry ``name``, which depends on
+    ``tags``. Its result must be JSON-serialisable."""
+
+    def register(compute):
+        _entries[name] = (tuple(tags), compute)
+        return compute
+
+    return register
+
+
+def _tag_key(tag):
+    return f"catalog:tag:{tag}"
+
+
+def _versions(tags):
+    keys = [_tag_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Start from the clock rather than 1 so a tag evicted from the
+            # cache never comes back at a version an old entry was built on.
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _entry_key(name, tags):
+    return f"catalog:{name}:" + ".".join(str(v) for v in _versions(tags))
+
+
+def _stale_key(name):
+    return f"catalog:{name}:last"
+
+
+def _expires_early(entry):
+    _, delta, expires_at = entry
+    # XFetch: recompute with a probability that rises towards expiry,
+    # scaled by how long the last recompute took.
+    jitter = -delta * XFETCH_BETA * math.log(1.0 - random.random())
+    return time.time() + jitter >= expires_at
+
+
+def _compute(name, key):
+    _, compute = _entries[name]
+    started = time.monotonic()
+    value = json.loads(json.dumps(compute(), cls=JSONEncoder))
+    ttl = settings.CATALOG_CACHE_TTL
+    entry = [value, time.monotonic() - started, time.time() + ttl]
+    cache.set(key, entry, ttl)
+    cache.set(_stale_key(name), entry, STALE_TTL)
+    return value
+
+
+def get(name):
+    """The value of entry ``name``, from cache when fresh."""
+    tags, _ = _entries[name]
+    key = _entry_key(name, tags)
+    entry = cache.get(key)
+    if entry is not None and not _expires_early(entry):
+        return entry[0]
+
+    lock = f"{key}:lock"
+    if cache.add(lock, 1, LOCK_TIMEOUT):
+        try:
+            return _compute(name, key)
+        finally:
+            cache.delete(lock)
+
+    # Someone else is recomputing it: serve what we have meanwhile.
+    previous = entry or cache.get(_stale_key(name))
+    if previous is not None:
+        return previous[0]
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+    return _compute(name, key)
+
+
+def invalidate(*tags):
+    """Make every entry depending on one of ``tags`` stale."""
+    cache.set_many({_tag_key(tag): time.time_ns() for tag in tags}, None)
+
+
+def warm(names=None):
+    """Recompute the given entries (all by default) unless another worker
+    already is. Returns the names recomputed."""
+    warmed = []
+    for name in names or list(_entries):
+        tags, _ = _entries[name]
+        key = _entry_key(name, tags)
+        lock = f"{key}:lock"
+        if not cache.add(lock, 1, LOCK_TIMEOUT):
+            continue
+        try:
+            _compute(name, key)
+            warmed.append(name)
+        finally:
+            cache.delete(lock)
+    return warmed
+
+
+@catalog_entry(
+    "latest_papers", tags=["papers", "reviews", "categories", "courses", "schools"]
+)
+def latest_papers():
+    papers = (
+        Paper.objects.filter(status="published")
+        .select_related("category", "course")
+        .prefetch_related(Prefetch("school", queryset=School.objects.with_stats()))
+        .with_listing_stats()
+        .order_by("-upload_date")[:8]
+    )
+    # Rendered without a request: whether the reader owns each paper is
+    # filled in per request.
+    return PaperListSerializer(papers, many=True).data
+
+
+def _published_aggregates():
+    # Ratings come from the papers' counters rather than a join on reviews,
+    # which would repeat each paper once per review in the count and price.
+    published = Q(papers__status="published")
+    return {
+        "paper_count": Count("papers", filter=published),
+        "average_price": Avg("papers__price", filter=published),
+        "average_rating": Cast(
+            Sum("papers__rating_sum", filter=published), FloatField()
+        )
+        / NullIf(Sum("papers__review_count", filter=published), 0),
+    }
+
+
+@catalog_entry("popular_courses", tags=["papers", "reviews", "courses"])
+def popular_courses():
+    courses = (
+        Course.objects.annotate(**_published_aggregates())
+        .filter(paper_count__gt=0)
+        .order_by("-paper_count")[:8]
+    )
+    return [
+        {
+            "id": course.id,
+            "name": course.name,
+            "paper_count": course.paper_count,
+            "average_price": course.average_price,
+            "average_rating": course.average_rating,
+        }
+        for course in courses
+    ]
+
+
+@catalog_entry("popular_categories", tags=["papers", "reviews", "categories"])
+def popular_categories():
+    categories = (
+        Category.objects.annotate(**_published_aggregates())
+        .filter(paper_count__gt=0)
+        .only("id", "name")
+        .order_by("-paper_count")[:8]
+    )
+    return CategorySerializer(categories, many=True).data
+
+
+@catalog_entry("popular_schools", tags=["papers", "reviews", "schools"])
+def popular_schools():
+    schools = (
+        School.objects.with_stats()
+        .filter(paper_count__gt=0)
+        .order_by("-paper_count")[:8]
+    )
+    return SchoolSerializer(schools, many=True).data
@@ -0,0 +1,239 @@
+"""Buffered ``views`` and ``downloads`` counters on ``Paper``.
+
+Counting a view or download no longer updates the paper's row, which made
+every request for a popular paper wait on the same row lock. Increments
+are added to a buffer and written in bulk every
+``PAPER_COUNTER_FLUSH_INTERVAL`` seconds, one multi-row UPDATE for all
+papers touched since the last flush.
+
+With ``CACHE_REDIS_URL`` set the buffer is a Redis hash per counter,
+shared by all workers and flushed by the ``flush_paper_counters`` beat
+task. Otherwise each process buffers in memory and flushes itself on the
+first increment after the interval (and at exit). A flush that fails
+leaves its increments to the next one: Redis hashes being flushed are only
+deleted once the database has committed them.
+
+Each flush also adds the counts to today's exampapers.analytics rows.
+
+Serializers add the unflushed increments to what they show
+(``merge_pending``), so counts look live.
+"""
+
+import atexit
+import logging
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+from django.utils.timezone import localdate
+
+from . import analytics
+from .models import Paper
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("views", "downloads")
+# Papers per UPDATE statement.
+FLUSH_BATCH_SIZE = 500
+# Seconds a flush may hold, or wait for, the Redis flush lock.
+FLUSH_LOCK_TIMEOUT = 5 * 60
+
+
+class MemoryBuffer:
+    """Pending increments of this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {field: Counter() for field in FIELDS}
+        self._last_flush = time.monotonic()
+
+    def add(self, field, paper_id, delta):
+        with self._lock:
+            self._pending[field][paper_id] += delta
+            due = (
+                time.monotonic() - self._last_flush
+                >= settings.PAPER_COUNTER_FLUSH_INTERVAL
+            )
+        if due:
+            flush()
+
+    def pending(self, field, paper_ids):
+        with self._lock:
+            counter = self._pending[field]
+            return {pk: counter[pk] for pk in paper_ids if counter.get(pk)}
+
+    @contextmanager
+    def draining(self):
+        """Take the pending increments for writing. They are put back if
+        the block raises."""
+        with self._lock:
+            drained = {
+                field: {pk: delta for pk, delta in counter.items() if delta}
+                for field, counter in self._pending.items()
+            }
+            self._pending = {field: Counter() for field in FIELDS}
+            self._last_flush = time.monotonic()
+        try:
+            yield drained
+        except BaseException:
+            with self._lock:
+                for field, deltas in drained.items():
+                    self._pending[field].update(deltas)
+            raise
+
+
+class RedisBuffer:
+    """Pending increments of every worker, in one Redis hash per counter."""
+
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url)
+
+    @staticmethod
+    def _key(field):
+        return f"paper_counters:{field}"
+
+    def add(self, field, paper_id, delta):
+        self.client.hincrby(self._key(field), paper_id, delta)
+
+    def pending(self, field, paper_ids):
+        paper_ids = list(paper_ids)
+        if not paper_ids:
+            return {}
+        values = self.client.hmget(self._key(field), paper_ids)
+        return {pk: int(value) for pk, value in zip(paper_ids, values) if value}
+
+    def _claim(self):
+        """The flushing hashes to write: the pending increments, moved
+        aside, and those left by flushes that didn't commit."""
+        keys = {}
+        for field in FIELDS:
+            # Renaming is atomic: increments arriving meanwhile start a new
+            # hash and wait for the next flush.
+            try:
+                self.client.rename(
+                    self._key(field), f"{self._key(field)}:flushing:{uuid.uuid4().hex}"
+                )
+            except redis.ResponseError:
+                pass  # Nothing pending.
+            keys[field] = list(
+                self.client.scan_iter(match=f"{self._key(field)}:flushing:*")
+            )
+        return keys
+
+    @contextmanager
+    def draining(self):
+        """Take the pending increments for writing. The flushing hashes are
+        only deleted once the block's transaction has committed, so counts
+        of a failed flush are written by the next one."""
+        # One flush at a time, or two would both write the leftovers.
+        with self.client.lock(
+            "paper_counters:flush-lock",
+            timeout=FLUSH_LOCK_TIMEOUT,
+            blocking_timeout=FLUSH_LOCK_TIMEOUT,
+        ):
+            keys = self._claim()
+            drained = {}
+            for field, field_keys in keys.items():
+                deltas = Counter()
+                for key in field_keys:
+                    for pk, delta in self.client.hgetall(key).items():
+                        deltas[int(pk)] += int(delta)
+                drained[field] = {pk: delta for pk, delta in deltas.items() if delta}
+            yield drained
+            flushed = [key for field_keys in keys.values() for key in field_keys]
+            if flushed:
+                transaction.on_commit(lambda: self.client.delete(*flushed))
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def _get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                if settings.CACHE_REDIS_URL:
+                    _buffer = RedisBuffer(settings.CACHE_REDIS_URL)
+                else:
+                    _buffer = MemoryBuffer()
+                    atexit.register(flush)
+    return _buffer
+
+
+def _write(field, paper_id, delta):
+    Paper.objects.filter(pk=paper_id).update(
+        **{field: Greatest(F(field) + delta, Value(0))}
+    )
+    analytics.add(localdate(), {field: {paper_id: delta}})
+
+
+def increment(field, paper_id, delta=1):
+    """Count ``delta`` more (or, if negative, fewer) ``field`` on the paper."""
+    try:
+        _get_buffer().add(field, paper_id, delta)
+    except redis.RedisError as e:
+        # Better a row lock than a lost count.
+        logger.warning(f"Writing {field} of paper {paper_id} directly: {e}")
+        _write(field, paper_id, delta)
+
+
+def merge_pending(papers):
+    """Add the unflushed increments to ``views``, ``downloads`` and the
+    ``download_count`` annotation of the given paper instances."""
+    papers = [paper for paper in papers if isinstance(paper, Paper)]
+    if not papers:
+        return
+    ids = {paper.pk for paper in papers}
+    try:
+        pending = {field: _get_buffer().pending(field, ids) for field in FIELDS}
+    except redis.RedisError as e:
+        logger.warning(f"Showing flushed paper counters only: {e}")
+        return
+    for paper in papers:
+        deferred = paper.get_deferred_fields()
+        for field, deltas in pending.items():
+            delta = deltas.get(paper.pk)
+            if not delta or field in deferred:
+                continue
+            setattr(paper, field, max(getattr(paper, field) + delta, 0))
+            if field == "downloads" and hasattr(paper, "download_count"):
+                paper.download_count = max(paper.download_count + delta, 0)
+
+
+def _apply(drained):
+    paper_ids = sorted({pk for deltas in drained.values() for pk in deltas})
+    for start in range(0, len(paper_ids), FLUSH_BATCH_SIZE):
+        batch = paper_ids[start : start + FLUSH_BATCH_SIZE]
+        updates = {}
+        for field, deltas in drained.items():
+            whens = [
+                When(pk=pk, then=Value(deltas[pk])) for pk in batch if pk in deltas
+            ]
+            if whens:
+                updates[field] = Greatest(
+                    F(field)
+                    + Case(*whens, default=Value(0), output_field=IntegerField()),
+                    Value(0),
+                )
+        Paper.objects.filter(pk__in=batch).update(**updates)
+    return len(paper_ids)
+
+
+def flush():
+    """Write the buffered increments to the database. Returns the number of
+    papers updated."""
+    with _get_buffer().draining() as drained:
+        if not any(drained.values()):
+            return 0
+        with transaction.atomic():
+            analytics.add(localdate(), drained)
+            return _apply(drained)
@@ -0,0 +1,284 @@
+"""The numbers behind ``DashboardStatsView``.
+
+Platform-wide numbers come from the daily ``Statistics`` snapshots rather
+than from aggregating over every paper, user and order on each dashboard
+load. ``rollup`` (the ``rollup_statistics`` beat task, just after
+midnight) stores the totals as of the end of the previous day. What
+happens during the day is counted as it happens in the "stats" cache
+namespace (``record``), and the dashboard adds those counts to the latest
+snapshot. If the nightly rollup hasn't run, dashboard reads queue it and
+serve the older snapshot meanwhile.
+
+The intraday counts are only right when every worker shares the cache,
+i.e. with ``CACHE_REDIS_URL`` set. With per-process local memory each
+worker shows its own counts until the next rollup.
+
+Intraday counts cover new users, papers and orders, completed orders,
+downloads and views. Totals that change any other way, e.g. an admin
+unpublishing a paper or editing its ``uploads`` or ``earnings``, show up
+after the next rollup.
+
+The signed-in user's own numbers are read live, in one query.
+"""
+
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import (
+    Count,
+    DecimalField,
+    IntegerField,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce
+from django.utils.timezone import localdate
+
+from backend.cache import namespace
+from payments.models import Wallet
+
+from .models import Order, Paper, PaperDownload, Review, Statistics, Wishlist
+
+SNAPSHOT_FIELDS = (
+    "total_papers",
+    "total_downloads",
+    "total_uploads",
+    "total_views",
+    "total_earnings",
+    "total_users",
+    "new_users_today",
+    "papers_uploaded_today",
+    "total_orders",
+    "completed_orders",
+)
+# Counted in the cache as events happen during the day.
+INTRADAY_FIELDS = (
+    "total_papers",
+    "total_downloads",
+    "total_views",
+    "total_users",
+    "new_users_today",
+    "papers_uploaded_today",
+    "total_orders",
+    "completed_orders",
+)
+# Numbers of the day itself rather than running totals.
+DAILY_FIELDS = ("new_users_today", "papers_uploaded_today")
+
+# The newest snapshot, with its date.
+LATEST_SNAPSHOT_KEY = "snapshot:latest"
+# Seconds a snapshot older than yesterday's is served before the database
+# is checked again for the rollup.
+STALE_SNAPSHOT_TTL = 60
+# Seconds between two rollups queued by dashboard reads.
+ROLLUP_QUEUE_INTERVAL = 10 * 60
+
+cache = namespace("stats")
+
+
+def _intraday_key(day, field):
+    return f"intraday:{day.isoformat()}:{field}"
+
+
+def record(field, delta=1):
+    """Count ``delta`` more (or, if negative, fewer) ``field`` today, once
+    the current transaction commits."""
+
+    def count():
+        key = _intraday_key(localdate(), field)
+        cache.add(key, 0)
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            # Evicted since the add; the next rollup catches up.
+            pass
+
+    transaction.on_commit(count)
+
+
+def intraday(day):
+    """The counts recorded on ``day`` so far, by field."""
+    keys = {field: _intraday_key(day, field) for field in INTRADAY_FIELDS}
+    found = cache.get_many(keys.values())
+    return {field: found.get(key, 0) for field, key in keys.items()}
+
+
+def _totals(day):
+    """The platform totals as they are now, with the new users and papers
+    of ``day``."""
+    published = Q(status="published")
+    values = Paper.objects.aggregate(
+        total_papers=Count("id", filter=published),
+        total_downloads=Coalesce(Sum("downloads", filter=published), 0),
+        total_uploads=Coalesce(Sum("uploads", filter=published), 0),
+        total_views=Coalesce(Sum("views", filter=published), 0),
+        total_earnings=Coalesce(
+            Sum("earnings", filter=published),
+            Value(0),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+        papers_uploaded_today=Count("id", filter=Q(upload_date__date=day)),
+    )
+    values.update(
+        get_user_model().objects.aggregate(
+            total_users=Count("id"),
+            new_users_today=Count("id", filter=Q(date_joined__date=day)),
+        )
+    )
+    values.update(
+        Order.objects.aggregate(
+            total_orders=Count("id"),
+            completed_orders=Count("id", filter=Q(status="completed")),
+        )
+    )
+    return values
+
+
+def rollup():
+    """Store yesterday's snapshot and return its values.
+
+    Totals are read as they are now, less what has been counted today, so
+    this is meant to run shortly after midnight.
+    """
+    today = localdate()
+    day = today - timedelta(days=1)
+    values = _totals(day)
+    for field, count in intraday(today).items():
+        if field not in DAILY_FIELDS:
+            values[field] = max(values[field] - count, 0)
+    Statistics.objects.update_or_create(date=day, defaults=values)
+    cache.set(LATEST_SNAPSHOT_KEY, {"date": day, **values})
+    return values
+
+
+def _queue_rollup():
+    if not cache.add("rollup:queued", 1, ROLLUP_QUEUE_INTERVAL):
+        return
+    from .tasks import rollup_statistics  # tasks imports this module.
+
+    transaction.on_commit(lambda: rollup_statistics.delay(), robust=True)
+
+
+def _latest_snapshot(yesterday):
+    """The newest stored snapshot. When it is older than yesterday's, the
+    rollup is queued and the old one served meanwhile."""
+    snapshot = cache.get(LATEST_SNAPSHOT_KEY)
+    if snapshot is not None and (
+        snapshot.get("stale") or snapshot["date"] >= yesterday
+    ):
+        return snapshot
+
+    snapshot = (
+        Statistics.objects.filter(date__lte=yesterday)
+        .order_by("-date")
+        .values("date", *SNAPSHOT_FIELDS)
+        .first()
+    )
+    if snapshot is not None and snapshot["date"] >= yesterday:
+        cache.set(LATEST_SNAPSHOT_KEY, snapshot)
+        return snapshot
+
+    _queue_rollup()
+    if snapshot is None:
+        # Nothing rolled up yet: today's counts only, until the task runs.
+        snapshot = {"date": None, **dict.fromkeys(SNAPSHOT_FIELDS, 0)}
+    cache.set(LATEST_SNAPSHOT_KEY, {**snapshot, "stale": True}, STALE_SNAPSHOT_TTL)
+    return snapshot
+
+
+def platform_numbers():
+    """The latest snapshot plus the counts since, by ``Statistics`` field.
+
+    Never aggregates over the platform's tables itself: a missing snapshot
+    is left to the queued ``rollup_statistics`` task.
+    """
+    today = localdate()
+    yesterday = today - timedelta(days=1)
+    snapshot = _latest_snapshot(yesterday)
+    numbers = {field: snapshot[field] for field in SNAPSHOT_FIELDS}
+
+    # Days after the snapshot whose counts are still in the cache.
+    days = [today]
+    if snapshot["date"] is None or snapshot["date"] < yesterday:
+        days.insert(0, yesterday)
+    for day in days:
+        for field, count in intraday(day).items():
+            if field in DAILY_FIELDS:
+                if day == today:
+                    numbers[field] = count
+            else:
+                numbers[field] = max(numbers[field] + count, 0)
+    return numbers
+
+
+def _per_user(queryset, field, expression, output_field=None):
+    """Correlated ``expression`` over the rows of ``queryset`` whose
+    ``field`` is the outer user, 0 when there are none."""
+    output_field = output_field or IntegerField()
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(total=expression)
+            .values("total")[:1],
+            output_field=output_field,
+        ),
+        Value(0),
+        output_field=output_field,
+    )
+
+
+def user_numbers(user):
+    """The dashboard's numbers for ``user``, including their wallet."""
+    money = DecimalField(max_digits=12, decimal_places=2)
+    wallet = Wallet.objects.filter(user=OuterRef("pk"))
+    papers = Paper.objects.all()
+    orders = Order.objects.all()
+    numbers = (
+        get_user_model()
+        .objects.filter(pk=user.pk)
+        .annotate(
+            papers_uploaded=_per_user(papers, "author", Count("*")),
+            paper_views=_per_user(papers, "author", Sum("views")),
+            paper_earnings=_per_user(papers, "author", Sum("earnings"), money),
+            download_count=_per_user(PaperDownload.objects.all(), "user", Count("*")),
+            order_count=_per_user(orders, "user", Count("*")),
+            completed_order_count=_per_user(
+                orders.filter(status="completed"), "user", Count("*")
+            ),
+            review_count=_per_user(Review.objects.all(), "user", Count("*")),
+            wishlist_count=_per_user(Wishlist.objects.all(), "user", Count("*")),
+            wallet_id=Subquery(wallet.values("pk")[:1]),
+            wallet_total_earned=Subquery(wallet.values("total_earned")[:1]),
+            wallet_total_withdrawn=Subquery(wallet.values("total_withdrawn")[:1]),
+            wallet_available_balance=Subquery(wallet.values("available_balance")[:1]),
+        )
+        .values(
+            "papers_uploaded",
+            "paper_views",
+            "paper_earnings",
+            "download_count",
+            "order_count",
+            "completed_order_count",
+            "review_count",
+            "wishlist_count",
+            "wallet_id",
+            "wallet_total_earned",
+            "wallet_total_withdrawn",
+            "wallet_available_balance",
+        )
+        .get()
+    )
+    if numbers["wallet_id"] is None:
+        wallet, _ = Wallet.objects.get_or_create(user=user)
+        numbers.update(
+            wallet_total_earned=wallet.total_earned,
+            wallet_total_withdrawn=wallet.total_withdrawn,
+            wallet_available_balance=wallet.available_balance,
+        )
+    return numbers
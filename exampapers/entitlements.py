@@ -0,0 +1,62 @@
+from backend.cache import namespace
+
+from .models import Order
+
+cache = namespace("entitlements")
+
+# Attribute the owned ids are memoised under on the current request.
+_REQUEST_ATTR = "_owned_paper_ids"
+
+
+def _owned_key(user_id):
+    return f"entitlements:owned:{user_id}"
+
+
+def owned_paper_ids(user, request=None):
+    """Ids of the papers ``user`` has bought through a completed order.
+
+    The set is looked up at most once per request when ``request`` is
+    given, and cached per user until one of their orders changes.
+    """
+    if user is None or not user.is_authenticated:
+        return frozenset()
+
+    if request is not None:
+        cached = getattr(request, _REQUEST_ATTR, None)
+        if cached is not None and cached[0] == user.pk:
+            return cached[1]
+
+    key = _owned_key(user.pk)
+    owned = cache.get(key)
+    if owned is None:
+        owned = list(
+            Order.papers.through.objects.filter(
+                order__user_id=user.pk, order__status="completed"
+            ).values_list("paper_id", flat=True)
+        )
+        cache.set(key, owned)
+    owned = frozenset(owned)
+
+    if request is not None:
+        setattr(request, _REQUEST_ATTR, (user.pk, owned))
+    return owned
+
+
+def is_owned(user, paper, request=None):
+    """Whether ``user`` has bought ``paper`` (a Paper or its id)."""
+    paper_id = getattr(paper, "pk", paper)
+    return paper_id in owned_paper_ids(user, request)
+
+
+def can_access_document(user, paper, request=None):
+    """Whether ``user`` may get the full document of ``paper``: it is free,
+    they wrote it or they bought it."""
+    if paper.is_free:
+        return True
+    if user is None or not user.is_authenticated:
+        return False
+    return paper.author_id == user.pk or is_owned(user, paper, request)
+
+
+def invalidate_entitlements(user_id):
+    cache.delete(_owned_key(user_id))
@@ -0,0 +1,101 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from exampapers.models import Paper
+from exampapers.utils.paper_helpers import file_sha256
+
+
+def _paper_files(paper):
+    """The paper's stored files, as ``(storage, name)`` pairs."""
+    files = {
+        (field.storage, field.name)
+        for field in (
+            paper.file,
+            paper.source_file,
+            paper.preview_file,
+            paper.preview_image,
+        )
+    }
+    storage = paper.preview_image.storage
+    for formats in (paper.preview_thumbnails or {}).values():
+        files.update((storage, name) for name in formats.values())
+    return {(storage, name) for storage, name in files if name}
+
+
+def _size(storage, name):
+    try:
+        return storage.size(name)
+    except Exception:
+        return 0
+
+
+class Command(BaseCommand):
+    help = (
+        "Hash the original upload of papers that predate content-addressed "
+        "storage and report how much storage duplicate uploads take up."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Compute hashes without saving them",
+        )
+
+    def handle(self, *args, **options):
+        papers = (
+            Paper.objects.filter(file__isnull=False)
+            .exclude(file="")
+            .only(
+                "id",
+                "file",
+                "source_file",
+                "source_sha256",
+                "preview_file",
+                "preview_image",
+                "preview_thumbnails",
+            )
+        )
+
+        hashed = missing = 0
+        groups = defaultdict(list)
+        for paper in papers.iterator():
+            if not paper.source_sha256:
+                source = paper.source_file or paper.file
+                if not source.storage.exists(source.name):
+                    self.stderr.write(f"Paper {paper.id}: {source.name} not in storage")
+                    missing += 1
+                    continue
+                with source.open("rb") as f:
+                    paper.source_sha256 = file_sha256(f)
+                if not options["dry_run"]:
+                    Paper.objects.filter(pk=paper.pk).update(
+                        source_sha256=paper.source_sha256
+                    )
+                hashed += 1
+            groups[paper.source_sha256].append(paper)
+
+        self.stdout.write(f"Hashed {hashed} papers, {missing} files missing.")
+
+        duplicates = {sha: group for sha, group in groups.items() if len(group) > 1}
+        stored = reclaimable = 0
+        for group in duplicates.values():
+            # Only one copy of each artifact is needed per source. Files that
+            # are already shared are counted once.
+            files = set().union(*(_paper_files(paper) for paper in group))
+            total = sum(_size(*file) for file in files)
+            kept = max(
+                sum(_size(*file) for file in _paper_files(paper)) for paper in group
+            )
+            stored += total
+            reclaimable += total - kept
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(duplicates)} uploads are shared by "
+                f"{sum(len(group) for group in duplicates.values())} papers, "
+                f"using {stored / 1024 / 1024:.1f} MB; deduplicating them would "
+                f"save {reclaimable / 1024 / 1024:.1f} MB."
+            )
+        )
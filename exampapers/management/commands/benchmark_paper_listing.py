@@ -0,0 +1,215 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Avg, Count
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+
+from exampapers.models import Category, Course, Paper, PaperDownload, Review, School
+from exampapers.views import AllPapersView
+
+BATCH_SIZE = 5000
+
+# AllPapersView's queryset before it moved to subquery annotations, kept to
+# compare against. Its review count is annotated under another name now that
+# Paper has a review_count column; the query it runs is unchanged.
+LEGACY_QUERYSET = (
+    Paper.objects.select_related("category", "course", "school", "author")
+    .prefetch_related(
+        "reviews",
+        "paperdownload_set",
+        "author__papers",
+        "author__papers__reviews",
+    )
+    .annotate(
+        download_count=Count("paperdownload", distinct=True),
+        average_rating=Avg("reviews__rating"),
+        legacy_review_count=Count("reviews", distinct=True),
+    )
+    .only(
+        "id",
+        "title",
+        "description",
+        "file",
+        "preview_file",
+        "preview_image",
+        "preview_thumbnails",
+        "price",
+        "status",
+        "category_id",
+        "course_id",
+        "school_id",
+        "page_count",
+        "views",
+        "downloads",
+        "upload_date",
+        "author_id",
+        "is_free",
+        "year",
+    )
+)
+
+
+class LegacyAllPapersView(AllPapersView):
+    queryset = LEGACY_QUERYSET
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _percentile(timings, pct):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a paper catalogue and compare AllPapersView's p50/p95 latency and "
+        "query count against its previous queryset. Seeded data is rolled back "
+        "unless --keep is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--papers", type=int, default=100_000)
+        parser.add_argument("--reviews", type=int, default=1_000_000)
+        parser.add_argument("--downloads", type=int, default=1_000_000)
+        parser.add_argument("--users", type=int, default=1_000)
+        parser.add_argument("--requests", type=int, default=50)
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Commit the seeded data instead of rolling it back",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._seed(options)
+                self._benchmark(options["requests"])
+                if not options["keep"]:
+                    raise _Rollback
+        except _Rollback:
+            pass
+
+    def _bulk(self, model, rows):
+        for start in range(0, len(rows), BATCH_SIZE):
+            model.objects.bulk_create(rows[start : start + BATCH_SIZE])
+
+    def _seed(self, options):
+        rng = random.Random(42)
+        started = time.perf_counter()
+        User = get_user_model()
+        self._bulk(
+            User,
+            [
+                User(username=f"bench-user-{i}", email=f"bench-user-{i}@example.com")
+                for i in range(options["users"])
+            ],
+        )
+        user_ids = list(
+            User.objects.filter(username__startswith="bench-user-").values_list(
+                "id", flat=True
+            )
+        )
+
+        categories = [
+            Category.objects.create(
+                name=f"Bench category {i}", slug=f"bench-category-{i}"
+            )
+            for i in range(20)
+        ]
+        courses = [Course.objects.create(name=f"Bench course {i}") for i in range(200)]
+        schools = [
+            School.objects.create(name=f"Bench school {i}", country="KE")
+            for i in range(100)
+        ]
+
+        # bulk_create skips Paper.save(), so no upload is stored or processed.
+        self._bulk(
+            Paper,
+            [
+                Paper(
+                    title=f"Bench paper {i}",
+                    description="Seeded for benchmarking.",
+                    author_id=rng.choice(user_ids),
+                    file=f"papers/bench_{i}.pdf",
+                    category=rng.choice(categories),
+                    course=rng.choice(courses),
+                    school=rng.choice(schools),
+                    price=Decimal(rng.randint(1, 50)),
+                    processing_state="ready",
+                )
+                for i in range(options["papers"])
+            ],
+        )
+        paper_ids = list(
+            Paper.objects.filter(title__startswith="Bench paper ").values_list(
+                "id", flat=True
+            )
+        )
+
+        self._bulk(
+            Review,
+            [
+                Review(
+                    paper_id=rng.choice(paper_ids),
+                    user_id=rng.choice(user_ids),
+                    rating=rng.randint(1, 5),
+                )
+                for _ in range(options["reviews"])
+            ],
+        )
+        self._bulk(
+            PaperDownload,
+            [
+                PaperDownload(
+                    paper_id=rng.choice(paper_ids), user_id=rng.choice(user_ids)
+                )
+                for _ in range(options["downloads"])
+            ],
+        )
+        self.stdout.write(
+            f"Seeded {options['papers']} papers, {options['reviews']} reviews and "
+            f"{options['downloads']} downloads in {time.perf_counter() - started:.1f}s"
+        )
+
+    def _benchmark(self, request_count):
+        rng = random.Random(7)
+        factory = APIRequestFactory()
+        orderings = ["-upload_date", "title", "-price", "-downloads"]
+        requests = [
+            {"page": rng.randint(1, 20), "ordering": rng.choice(orderings)}
+            for _ in range(request_count)
+        ]
+
+        self.stdout.write(
+            f"{'queryset':<10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}"
+            f"{'queries':>10}"
+        )
+        for label, view_class in (
+            ("before", LegacyAllPapersView),
+            ("after", AllPapersView),
+        ):
+            view = view_class.as_view()
+            timings = []
+            query_counts = []
+            for params in requests:
+                request = factory.get("/", params)
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    response = view(request)
+                    response.render()
+                    timings.append((time.perf_counter() - start) * 1000)
+                query_counts.append(len(queries))
+
+            self.stdout.write(
+                f"{label:<10}{_percentile(timings, 50):>10.1f}"
+                f"{_percentile(timings, 95):>10.1f}{max(timings):>10.1f}"
+                f"{statistics.mean(query_counts):>10.1f}"
+            )
@@ -0,0 +1,106 @@
+import glob
+import os
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from exampapers.utils.paper_helpers import PaperDocument
+
+
+def process_per_step(data, with_image):
+    """Mirror the old upload path: every step parses its own input."""
+    parses = 0
+
+    count_doc = PaperDocument(data)
+    count_doc.page_count
+    parses += count_doc.parse_count
+
+    watermark_doc = PaperDocument(data)
+    watermarked = watermark_doc.watermarked_pdf().getvalue()
+    parses += watermark_doc.parse_count
+
+    preview_doc = PaperDocument(watermarked, watermark_text=None)
+    preview = preview_doc.preview_pdf()
+    parses += preview_doc.parse_count
+
+    if with_image:
+        image_doc = PaperDocument(
+            preview.getvalue() if preview else watermarked, watermark_text=None
+        )
+        image_doc.first_page_thumbnails()
+        parses += image_doc.parse_count
+
+    return parses
+
+
+def process_single_parse(data, with_image):
+    document = PaperDocument(data)
+    document.page_count
+    document.watermarked_pdf()
+    document.preview_pdf()
+    if with_image:
+        document.first_page_thumbnails()
+    return document.parse_count
+
+
+class Command(BaseCommand):
+    help = "Compare PDF parse counts and wall time per upload for paper processing"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "paths",
+            nargs="*",
+            help="PDF files to process (defaults to MEDIA_ROOT/papers/*.pdf)",
+        )
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument(
+            "--with-image",
+            action="store_true",
+            help="Include first-page thumbnail rendering (requires poppler)",
+        )
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or sorted(
+            glob.glob(os.path.join(settings.MEDIA_ROOT, "papers", "*.pdf"))
+        )
+        if not paths:
+            raise CommandError("No PDF files to benchmark.")
+
+        uploads = []
+        for path in paths:
+            with open(path, "rb") as f:
+                uploads.append((os.path.basename(path), f.read()))
+
+        modes = [("per-step", process_per_step), ("single-parse", process_single_parse)]
+        self.stdout.write(
+            f"{len(uploads)} files x {options['runs']} runs "
+            f"(image rendering {'on' if options['with_image'] else 'off'})"
+        )
+        self.stdout.write(
+            f"{'mode':<14}{'parses/upload':>15}{'mean ms':>10}{'p50 ms':>10}"
+            f"{'max ms':>10}"
+        )
+
+        for label, process in modes:
+            timings = []
+            parses = []
+            for _ in range(options["runs"]):
+                for name, data in uploads:
+                    start = time.perf_counter()
+                    try:
+                        parses.append(process(data, options["with_image"]))
+                    except Exception as e:
+                        self.stderr.write(f"Skipping {name}: {e}")
+                        continue
+                    timings.append((time.perf_counter() - start) * 1000)
+
+            if not timings:
+                continue
+
+            self.stdout.write(
+                f"{label:<14}{statistics.mean(parses):>15.1f}"
+                f"{statistics.mean(timings):>10.1f}"
+                f"{statistics.median(timings):>10.1f}{max(timings):>10.1f}"
+            )
@@ -0,0 +1,59 @@
+import glob
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from exampapers.utils.paper_helpers import add_watermark_to_pdf, get_watermark_overlay
+
+
+class Command(BaseCommand):
+    help = "Compare watermark throughput with and without the overlay cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "paths",
+            nargs="*",
+            help="PDF files to watermark (defaults to MEDIA_ROOT/papers/*.pdf)",
+        )
+        parser.add_argument("--iterations", type=int, default=20)
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or sorted(
+            glob.glob(os.path.join(settings.MEDIA_ROOT, "papers", "*.pdf"))
+        )
+        if not paths:
+            raise CommandError("No PDF files to benchmark.")
+
+        pdfs = []
+        for path in paths:
+            with open(path, "rb") as f:
+                pdfs.append(f.read())
+
+        results = {}
+        for label, cached in (("uncached", False), ("cached", True)):
+            get_watermark_overlay.cache_clear()
+            done = 0
+            start = time.perf_counter()
+            for _ in range(options["iterations"]):
+                for data in pdfs:
+                    if not cached:
+                        get_watermark_overlay.cache_clear()
+                    try:
+                        add_watermark_to_pdf(data)
+                    except Exception:
+                        continue
+                    done += 1
+            elapsed = time.perf_counter() - start
+            results[label] = done / elapsed if elapsed else 0
+            self.stdout.write(
+                f"{label:<10}{done:>6} PDFs in {elapsed:>7.2f}s "
+                f"({results[label]:.1f} PDFs/s)"
+            )
+
+        if results["uncached"]:
+            self.stdout.write(
+                f"Speed-up: {results['cached'] / results['uncached']:.2f}x "
+                f"({get_watermark_overlay.cache_info().currsize} overlays cached)"
+            )
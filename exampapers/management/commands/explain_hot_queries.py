@@ -0,0 +1,148 @@
+import re
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils.timezone import localdate
+
+from exampapers.models import Order, Paper, PaperDailyStats, PaperDownload, Review
+from exampapers.views import _with_card_data, _with_list_data
+from payments.models import Payment
+
+PAGE_SIZE = 12
+
+# Plan lines that read a whole table. SQLite reports "SCAN <table>" for
+# full scans and "SCAN <table> USING [COVERING] INDEX" for index scans.
+SEQUENTIAL_SCAN = {
+    "postgresql": re.compile(r"Seq Scan on (\w+)"),
+    "sqlite": re.compile(r"SCAN (?:TABLE )?(\w+)\b(?! USING)"),
+}
+
+
+def hot_queries(sample):
+    """The querysets behind the busiest views, as (label, queryset)."""
+    published = Paper.objects.filter(status="published")
+    today = localdate()
+    return [
+        (
+            "all papers, newest first",
+            _with_list_data(Paper.objects.all()).order_by("-upload_date", "-id")[
+                :PAGE_SIZE
+            ],
+        ),
+        (
+            "published papers, most downloaded",
+            published.order_by("-downloads", "-id")[:PAGE_SIZE],
+        ),
+        ("published papers, most viewed", published.order_by("-views")[:PAGE_SIZE]),
+        (
+            "school papers",
+            _with_card_data(published.filter(school_id=sample["school"])).order_by(
+                "-upload_date"
+            )[:PAGE_SIZE],
+        ),
+        (
+            "course papers",
+            _with_card_data(published.filter(course_id=sample["course"])).order_by(
+                "-upload_date"
+            )[:PAGE_SIZE],
+        ),
+        (
+            "category papers",
+            _with_card_data(published.filter(category_id=sample["category"])).order_by(
+                "-upload_date"
+            )[:PAGE_SIZE],
+        ),
+        (
+            "author papers",
+            published.filter(author_id=sample["author"]).order_by("-upload_date")[
+                :PAGE_SIZE
+            ],
+        ),
+        (
+            "user downloads",
+            PaperDownload.objects.filter(
+                user_id=sample["user"], paper_id=sample["paper"]
+            ),
+        ),
+        (
+            "user completed orders",
+            Order.objects.filter(user_id=sample["user"], status="completed"),
+        ),
+        (
+            "paper reviews",
+            Review.objects.filter(paper_id=sample["paper"]).order_by("-created_at"),
+        ),
+        (
+            "order payment",
+            Payment.objects.filter(order_id=sample["order"], gateway="paypal"),
+        ),
+        (
+            "seller analytics, last 30 days",
+            PaperDailyStats.objects.filter(
+                seller_id=sample["author"],
+                date__range=(today - timedelta(days=29), today),
+            ),
+        ),
+    ]
+
+
+def _first_id(queryset, field="pk"):
+    return queryset.order_by().values_list(field, flat=True).first() or 0
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN on the querysets behind the main paper views and flag "
+        "sequential scans"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verbose-plans",
+            action="store_true",
+            help="Print every plan, not only those with sequential scans",
+        )
+        parser.add_argument(
+            "--fail-on-scan",
+            action="store_true",
+            help="Exit with an error when any query scans a whole table",
+        )
+
+    def handle(self, *args, **options):
+        pattern = SEQUENTIAL_SCAN.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f"Can't read {connection.vendor} query plans.")
+
+        sample = {
+            "school": _first_id(Paper.objects.all(), "school_id"),
+            "course": _first_id(Paper.objects.all(), "course_id"),
+            "category": _first_id(Paper.objects.all(), "category_id"),
+            "author": _first_id(Paper.objects.all(), "author_id"),
+            "paper": _first_id(Paper.objects.all()),
+            "user": _first_id(get_user_model().objects.all()),
+            "order": _first_id(Order.objects.all()),
+        }
+
+        flagged = []
+        for label, queryset in hot_queries(sample):
+            plan = queryset.explain()
+            scans = sorted(set(pattern.findall(plan)))
+            if scans:
+                flagged.append(label)
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"{label}: sequential scan of {', '.join(scans)}"
+                    )
+                )
+            else:
+                self.stdout.write(f"{label}: ok")
+            if scans or options["verbose_plans"]:
+                self.stdout.write(f"    {plan}".replace("\n", "\n    "))
+
+        if flagged and options["fail_on_scan"]:
+            raise CommandError(f"{len(flagged)} queries scan whole tables.")
+        self.stdout.write(
+            f"{len(flagged)} of {len(hot_queries(sample))} queries scan whole tables."
+        )
@@ -1,7 +1,7 @@
 from django.core.management.base import BaseCommand
 
 from exampapers.models import Paper
-from exampapers.tasks import generate_paper_preview
+from exampapers.tasks import start_paper_processing
 
 
 class Command(BaseCommand):
@@ -12,5 +12,5 @@ class Command(BaseCommand):
         self.stdout.write(f"Found {papers.count()} papers without preview.")
 
         for paper in papers:
-            generate_paper_preview.delay(paper.id)
+            start_paper_processing(paper.id, from_stage="document")
             self.stdout.write(f"Dispatched preview task for paper: {paper.title}")
@@ -0,0 +1,51 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from exampapers.models import Paper
+from exampapers.storage import private_storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the original uploads of papers from public media to private "
+        "storage. Run regenerate_watermarks afterwards, so previews and "
+        "watermarked papers move off paths that contain the upload's hash."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would be moved without moving it",
+        )
+
+    def handle(self, *args, **options):
+        names = (
+            Paper.objects.exclude(Q(source_file="") | Q(source_file__isnull=True))
+            .values_list("source_file", flat=True)
+            .distinct()
+        )
+
+        moved = missing = 0
+        for name in names:
+            if not default_storage.exists(name):
+                if not private_storage.exists(name):
+                    self.stderr.write(f"{name} is in neither storage")
+                    missing += 1
+                continue
+            moved += 1
+            if options["dry_run"]:
+                continue
+
+            if not private_storage.exists(name):
+                with default_storage.open(name, "rb") as f:
+                    private_storage.save(name, f)
+            # Papers not processed yet pointed their public file at the upload.
+            Paper.objects.filter(file=name).update(file="")
+            default_storage.delete(name)
+
+        verb = "Would move" if options["dry_run"] else "Moved"
+        self.stdout.write(
+            self.style.SUCCESS(f"{verb} {moved} uploads, {missing} missing.")
+        )
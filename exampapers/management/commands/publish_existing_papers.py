@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 
+from exampapers import catalog_cache
 from exampapers.models import Paper
 
 
@@ -11,4 +12,5 @@ class Command(BaseCommand):
         total = papers.count()
 
         papers.update(status="published")
+        catalog_cache.invalidate("papers")
         self.stdout.write(self.style.SUCCESS(f"✅ Published {total} papers"))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from exampapers.models import Paper
+from exampapers.search import index_papers
+
+
+class Command(BaseCommand):
+    help = "Build the full-text search entries of every paper"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        paper_ids = list(Paper.objects.order_by("pk").values_list("pk", flat=True))
+        batch_size = options["batch_size"]
+        for start in range(0, len(paper_ids), batch_size):
+            index_papers(paper_ids[start : start + batch_size])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {len(paper_ids)} papers."))
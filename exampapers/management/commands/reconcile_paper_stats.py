@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from exampapers import counters
+from exampapers.models import Paper
+from exampapers.paper_stats import STAT_FIELDS, expected_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute each paper's review, rating, download and sales counters "
+        "from reviews, downloads and completed orders, and report and fix "
+        "any drift."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report drift without fixing it",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        # Buffered downloads would otherwise look like drift.
+        counters.flush()
+        papers = expected_stats(Paper.objects.order_by("pk")).only("pk", *STAT_FIELDS)
+
+        checked = 0
+        drifted = {field: 0 for field in STAT_FIELDS}
+        fixes = []
+        for paper in papers.iterator(chunk_size=options["batch_size"]):
+            checked += 1
+            changed = False
+            for field in STAT_FIELDS:
+                expected = getattr(paper, f"expected_{field}")
+                if getattr(paper, field) != expected:
+                    drifted[field] += 1
+                    setattr(paper, field, expected)
+                    changed = True
+            if changed:
+                fixes.append(paper)
+
+        for field, count in drifted.items():
+            self.stdout.write(f"{field:<14}{count:>8} papers drifted")
+
+        if options["dry_run"] or not fixes:
+            self.stdout.write(f"Checked {checked} papers, {len(fixes)} out of date.")
+            return
+
+        with transaction.atomic():
+            Paper.objects.bulk_update(
+                fixes, STAT_FIELDS, batch_size=options["batch_size"]
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"Checked {checked} papers, fixed {len(fixes)}.")
+        )
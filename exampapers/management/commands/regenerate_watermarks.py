@@ -1,49 +1,192 @@
+import multiprocessing
 import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-from django.core.files.base import ContentFile
-from django.core.management.base import BaseCommand
+from celery import group
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
 
 from exampapers.models import Paper
-from exampapers.utils.paper_helpers import add_watermark_to_pdf
+from exampapers.tasks import (
+    REWATERMARK_PROGRESS_TTL,
+    progress_cache,
+    rewatermark_paper,
+    rewatermark_papers,
+    rewatermark_run_key,
+)
 
 
-class Command(BaseCommand):
-    help = "Regenerate watermark for all existing papers"
+def _rewatermark(paper_id, force):
+    try:
+        return paper_id, rewatermark_paper(paper_id, force=force), None
+    except Exception as e:
+        return paper_id, "failed", str(e)
 
-    def handle(self, *args, **kwargs):
-        papers = Paper.objects.filter(file__isnull=False)
 
-        for paper in papers:
-            self.stdout.write(f"Processing: {paper.title}")
+class Command(BaseCommand):
+    help = (
+        "Regenerate watermark for all existing papers. Papers already carrying "
+        "the current watermark template are skipped, so an interrupted run can "
+        "simply be restarted."
+    )
 
-            # Check for missing files
-            if not paper.file.storage.exists(paper.file.name):
-                self.stderr.write(
-                    f"Skipping {paper.title}: file not found at {paper.file.path}"
-                )
-                continue
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of worker processes (default: run in this process)",
+        )
+        parser.add_argument(
+            "--celery",
+            action="store_true",
+            help="Queue the work on Celery instead of processing it locally",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=20,
+            help="Papers per Celery task when using --celery",
+        )
+        parser.add_argument(
+            "--status",
+            metavar="RUN_ID",
+            help="Report the progress of a --celery run and exit",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Re-watermark papers even if they carry the current template",
+        )
+
+    def handle(self, *args, **options):
+        if options["status"]:
+            self.report_status(options["status"])
+            return
 
-            # Check file extension
-            ext = os.path.splitext(paper.file.name)[1].lower()
+        paper_ids = []
+        for paper in (
+            Paper.objects.filter(file__isnull=False)
+            .exclude(file="")
+            .only("id", "title", "file", "source_file")
+        ):
+            name = paper.source_file.name if paper.source_file else paper.file.name
+            ext = os.path.splitext(name)[1].lower()
             if ext != ".pdf":
                 self.stderr.write(
                     f"Skipping {paper.title}: unsupported file type '{ext}'"
                 )
                 continue
+            paper_ids.append(paper.id)
+
+        self.stdout.write(f"Found {len(paper_ids)} papers to check.")
+
+        if options["celery"]:
+            self.queue_on_celery(paper_ids, options)
+            return
+
+        self.process_locally(paper_ids, options)
+
+    def queue_on_celery(self, paper_ids, options):
+        chunk_size = max(1, options["chunk_size"])
+        chunks = [
+            paper_ids[start : start + chunk_size]
+            for start in range(0, len(paper_ids), chunk_size)
+        ]
+        run_id = uuid.uuid4().hex[:12]
+        progress_cache.set(
+            rewatermark_run_key(run_id),
+            {"papers": len(paper_ids), "chunks": len(chunks), "queued_at": time.time()},
+            REWATERMARK_PROGRESS_TTL,
+        )
+        group(
+            rewatermark_papers.si(run_id, number, chunk, options["force"])
+            for number, chunk in enumerate(chunks)
+        ).apply_async()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Queued {len(paper_ids)} papers in {len(chunks)} tasks as run "
+                f"{run_id}. Check its progress with --status {run_id}."
+            )
+        )
+
+    def report_status(self, run_id):
+        run = progress_cache.get(rewatermark_run_key(run_id))
+        if run is None:
+            raise CommandError(f"No run {run_id} (or it expired).")
+        finished = progress_cache.get_many(
+            [rewatermark_run_key(run_id, chunk) for chunk in range(run["chunks"])]
+        ).values()
+
+        counts = {"done": 0, "skipped": 0, "no-source": 0, "failed": 0}
+        failures = []
+        for chunk in finished:
+            for result, count in chunk["counts"].items():
+                counts[result] += count
+            failures += chunk["failures"]
+        processed = sum(counts.values())
+        elapsed = (
+            max(chunk["finished_at"] for chunk in finished) - run["queued_at"]
+            if finished
+            else 0
+        )
 
-            try:
-                with paper.file.open("rb") as f:
-                    buf = add_watermark_to_pdf(f)
+        message = (
+            f"Run {run_id}: {processed} of {run['papers']} papers in "
+            f"{len(finished)} of {run['chunks']} tasks. Watermarked "
+            f"{counts['done']}, skipped {counts['skipped']} (current template), "
+            f"{counts['no-source']} without an original upload, "
+            f"{counts['failed']} failed "
+            f"({processed / elapsed if elapsed else 0:.2f} papers/s)."
+        )
+        if len(finished) == run["chunks"]:
+            message = self.style.SUCCESS(message)
+        self.stdout.write(message)
+        for paper_id, error in failures:
+            self.stderr.write(f"  paper {paper_id}: {error}")
 
-                original_name = os.path.basename(paper.file.name)
+    def process_locally(self, paper_ids, options):
+        counts = {"done": 0, "skipped": 0, "no-source": 0, "failed": 0}
+        failures = []
+        start = time.perf_counter()
 
-                if not original_name.startswith("watermarked_"):
-                    new_name = f"watermarked_{original_name}"
-                else:
-                    new_name = original_name
+        def record(paper_id, result, error):
+            counts[result] += 1
+            if error:
+                failures.append((paper_id, error))
+                self.stderr.write(f"Error processing paper {paper_id}: {error}")
+            elif result == "done":
+                self.stdout.write(f"Watermark added to paper {paper_id}")
 
-                paper.file.save(new_name, ContentFile(buf.getvalue()), save=True)
-                self.stdout.write(f"Watermark added to {paper.title}")
+        workers = max(1, options["workers"])
+        if workers == 1:
+            for paper_id in paper_ids:
+                record(*_rewatermark(paper_id, options["force"]))
+        else:
+            # Forked workers must open their own database connections.
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("fork"),
+            ) as executor:
+                futures = [
+                    executor.submit(_rewatermark, paper_id, options["force"])
+                    for paper_id in paper_ids
+                ]
+                for future in as_completed(futures):
+                    record(*future.result())
 
-            except Exception as e:
-                self.stderr.write(f"Error processing {paper.title}: {str(e)}")
+        elapsed = time.perf_counter() - start
+        processed = counts["done"] + counts["failed"]
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Watermarked {counts['done']}, skipped {counts['skipped']} "
+                f"(current template), {counts['no-source']} without an original "
+                f"upload, {counts['failed']} failed in {elapsed:.1f}s "
+                f"({processed / elapsed if elapsed else 0:.2f} papers/s)."
+            )
+        )
+        for paper_id, error in failures:
+            self.stderr.write(f"  paper {paper_id}: {error}")
@@ -0,0 +1,63 @@
+# Generated by Django 5.1.7 on 2026-10-16 22:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        (
+            "exampapers",
+            "0016_remove_course_category_remove_course_description_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="paper",
+            name="processing_error",
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name="paper",
+            name="processing_state",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("ingesting", "Ingesting"),
+                    ("counting", "Counting pages"),
+                    ("watermarking", "Watermarking"),
+                    ("previewing", "Generating preview"),
+                    ("rendering", "Rendering preview image"),
+                    ("ready", "Ready"),
+                    ("failed", "Failed"),
+                ],
+                default="ready",
+                max_length=20,
+            ),
+        ),
+        # Papers uploaded before the pipeline existed were processed inline.
+        migrations.AlterField(
+            model_name="paper",
+            name="processing_state",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("ingesting", "Ingesting"),
+                    ("counting", "Counting pages"),
+                    ("watermarking", "Watermarking"),
+                    ("previewing", "Generating preview"),
+                    ("rendering", "Rendering preview image"),
+                    ("ready", "Ready"),
+                    ("failed", "Failed"),
+                ],
+                default="pending",
+                max_length=20,
+            ),
+        ),
+        migrations.AddField(
+            model_name="paper",
+            name="source_file",
+            field=models.FileField(blank=True, null=True, upload_to="papers/"),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-16 22:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exampapers", "0017_paper_processing_state"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="paper",
+            name="watermark_signature",
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
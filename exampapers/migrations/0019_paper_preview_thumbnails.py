@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-16 22:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exampapers", "0018_paper_watermark_signature"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="paper",
+            name="preview_thumbnails",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
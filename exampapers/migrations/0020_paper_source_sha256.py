@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-16 22:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exampapers", "0019_paper_preview_thumbnails"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="paper",
+            name="source_sha256",
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:20
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_paper_stats(apps, schema_editor):
+    Paper = apps.get_model("exampapers", "Paper")
+    Review = apps.get_model("exampapers", "Review")
+    Order = apps.get_model("exampapers", "Order")
+
+    def aggregate(queryset, expression, output_field):
+        return Coalesce(
+            Subquery(
+                queryset.order_by()
+                .values("paper")
+                .annotate(total=expression)
+                .values("total")[:1],
+                output_field=output_field,
+            ),
+            0,
+            output_field=output_field,
+        )
+
+    reviews = Review.objects.filter(paper=OuterRef("pk"))
+    sales = Order.papers.through.objects.filter(
+        paper=OuterRef("pk"), order__status="completed"
+    )
+    money = DecimalField(max_digits=12, decimal_places=2)
+    Paper.objects.update(
+        review_count=aggregate(reviews, Count("*"), IntegerField()),
+        rating_sum=aggregate(reviews, Sum("rating"), IntegerField()),
+        sold_count=aggregate(sales, Count("*"), IntegerField()),
+        revenue=aggregate(sales, Sum("paper__price"), money),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exampapers", "0021_uploadsession"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="paper",
+            name="rating_sum",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="paper",
+            name="revenue",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name="paper",
+            name="review_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="paper",
+            name="sold_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="paper",
+            index=models.Index(
+                fields=["status", "-downloads"], name="exampapers__status_6eb0f6_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="paper",
+            index=models.Index(
+                fields=["status", "-review_count"], name="exampapers__status_9dde62_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="paper",
+            index=models.Index(
+                fields=["status", "-sold_count"], name="exampapers__status_489c39_idx"
+            ),
+        ),
+        migrations.RunPython(backfill_paper_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:22
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# The search indexes depend on the database: GIN indexes on PostgreSQL and
+# an FTS5 table on SQLite (see exampapers.search).
+POSTGRESQL_FORWARD = [
+    "CREATE INDEX IF NOT EXISTS exampapers_paper_search_vector_gin "
+    "ON exampapers_paper USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS exampapers_paper_title_trgm "
+    "ON exampapers_paper USING gin (title gin_trgm_ops)",
+]
+POSTGRESQL_REVERSE = [
+    "DROP INDEX IF EXISTS exampapers_paper_search_vector_gin",
+    "DROP INDEX IF EXISTS exampapers_paper_title_trgm",
+]
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS exampapers_paper_fts "
+    "USING fts5(title, description, meta, tokenize='porter unicode61')",
+]
+SQLITE_REVERSE = ["DROP TABLE IF EXISTS exampapers_paper_fts"]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for sql in statements.get(vendor, []):
+            schema_editor.execute(sql)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exampapers", "0022_paper_stats"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name="paper",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(
+            _run({"postgresql": POSTGRESQL_FORWARD, "sqlite": SQLITE_FORWARD}),
+            _run({"postgresql": POSTGRESQL_REVERSE, "sqlite": SQLITE_REVERSE}),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exampapers", "0023_paper_search"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["user", "status"], name="exampapers__user_id_16a358_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="paper",
+            index=models.Index(fields=["-upload_date", "-id"], name="paper_recent_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="paper",
+            index=models.Index(
+                condition=models.Q(("status", "published")),
+                fields=["-views"],
+                name="paper_published_views_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="paper",
+            index=models.Index(
+                condition=models.Q(("status", "published")),
+                fields=["school", "-upload_date"],
+                name="paper_published_school_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="paper",
+            index=models.Index(
+                condition=models.Q(("status", "published")),
+                fields=["course", "-upload_date"],
+                name="paper_published_course_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="paper",
+            index=models.Index(
+                condition=models.Q(("status", "published")),
+                fields=["category", "-upload_date"],
+                name="paper_published_category_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="paper",
+            index=models.Index(
+                condition=models.Q(("status", "published")),
+                fields=["author", "-upload_date"],
+                name="paper_published_author_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="paperdownload",
+            index=models.Index(
+                fields=["user", "paper"], name="exampapers__user_id_e1f4f4_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["paper", "-created_at"], name="exampapers__paper_i_7318f2_idx"
+            ),
+        ),
+    ]
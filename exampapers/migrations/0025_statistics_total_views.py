@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exampapers", "0024_hot_query_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="statistics",
+            name="total_views",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
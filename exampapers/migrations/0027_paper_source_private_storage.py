@@ -0,0 +1,25 @@
+# Generated by Django 5.1.7 on 2026-10-17 00:12
+
+from django.db import migrations, models
+
+import exampapers.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exampapers", "0026_paper_daily_stats"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="paper",
+            name="source_file",
+            field=models.FileField(
+                blank=True,
+                null=True,
+                storage=exampapers.storage.PrivateStorage(),
+                upload_to="papers/",
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-17 00:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exampapers", "0027_paper_source_private_storage"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="paper",
+            index=models.Index(
+                condition=models.Q(("processing_state", "pending")),
+                fields=["updated_at"],
+                name="paper_pending_idx",
+            ),
+        ),
+    ]
@@ -1,18 +1,28 @@
 import logging
 import os
-from io import BytesIO
+import uuid
 
 from django.conf import settings
-from django.core.files.base import ContentFile
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.db.models import (
+    Case,
+    Count,
+    F,
+    FloatField,
+    IntegerField,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Cast, Coalesce, NullIf
 from django.utils.text import slugify
 from django.utils.timezone import now
-from pdf2image import convert_from_bytes
-from pypdf import PdfReader, PdfWriter
 
-from exampapers.utils.paper_helpers import add_watermark_to_pdf
+from exampapers.storage import private_storage
+from exampapers.utils.paper_helpers import file_sha256, source_storage_name
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +35,59 @@ class Category(models.Model):
         return self.name
 
 
+def _count_subquery(queryset, field):
+    """Correlated COUNT(*) of ``queryset`` grouped on ``field``, 0 when empty."""
+    return Coalesce(
+        Subquery(
+            queryset.order_by()
+            .values(field)
+            .annotate(count=Count("*"))
+            .values("count")[:1],
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )
+
+
+class SchoolQuerySet(models.QuerySet):
+    def with_stats(self):
+        """Annotate the aggregates ``SchoolSerializer`` shows for each school."""
+        published = Paper.objects.filter(school=OuterRef("pk"), status="published")
+        return self.annotate(
+            paper_count=_count_subquery(published, "school"),
+            course_count=Coalesce(
+                Subquery(
+                    published.order_by()
+                    .values("school")
+                    .annotate(count=Count("course", distinct=True))
+                    .values("count")[:1],
+                    output_field=IntegerField(),
+                ),
+                Value(0),
+            ),
+            average_rating=Subquery(
+                published.order_by()
+                .values("school")
+                .annotate(
+                    avg=Cast(Sum("rating_sum"), FloatField())
+                    / NullIf(Sum("review_count"), 0)
+                )
+                .values("avg")[:1],
+                output_field=FloatField(),
+            ),
+            total_downloads=Coalesce(
+                Subquery(
+                    published.order_by()
+                    .values("school")
+                    .annotate(total=Sum("downloads"))
+                    .values("total")[:1],
+                    output_field=IntegerField(),
+                ),
+                Value(0),
+            ),
+        )
+
+
 class School(models.Model):
     name = models.CharField(max_length=255, unique=True)
     slug = models.SlugField(max_length=255, unique=True)
@@ -32,6 +95,8 @@ class School(models.Model):
     website = models.URLField(blank=True, null=True)
     is_active = models.BooleanField(default=True)
 
+    objects = SchoolQuerySet.as_manager()
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
@@ -57,6 +122,39 @@ class Course(models.Model):
         return self.name
 
 
+class PaperQuerySet(models.QuerySet):
+    def with_listing_stats(self):
+        """Annotate the download and rating figures shown on paper cards.
+
+        They are read from the paper's own counters, so listings can sort on
+        them without touching reviews or downloads.
+        """
+        return self.annotate(
+            download_count=F("downloads"),
+            average_rating=Case(
+                When(
+                    review_count__gt=0,
+                    then=Cast("rating_sum", FloatField())
+                    / Cast("review_count", FloatField()),
+                ),
+                default=None,
+                output_field=FloatField(),
+            ),
+        )
+
+    def with_stats(self):
+        """Annotate every per-paper figure ``PaperSerializer`` shows."""
+        author_published = Paper.objects.filter(
+            author=OuterRef("author_id"), status="published"
+        )
+        return self.with_listing_stats().annotate(
+            author_papers_count=_count_subquery(author_published, "author"),
+            author_papers_sold=_count_subquery(
+                author_published.exclude(is_free=True), "author"
+            ),
+        )
+
+
 class Paper(models.Model):
     STATUS_CHOICES = [
         ("draft", "Draft"),
@@ -64,16 +162,32 @@ class Paper(models.Model):
         ("archived", "Archived"),
     ]
 
+    PROCESSING_STATE_CHOICES = [
+        ("pending", "Pending"),
+        ("ingesting", "Ingesting"),
+        ("counting", "Counting pages"),
+        ("watermarking", "Watermarking"),
+        ("previewing", "Generating preview"),
+        ("rendering", "Rendering preview image"),
+        ("ready", "Ready"),
+        ("failed", "Failed"),
+    ]
+
     title = models.CharField(max_length=255)
     author = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="papers"
     )
     description = models.TextField(blank=True)
     file = models.FileField(upload_to="papers/")
+    source_file = models.FileField(
+        upload_to="papers/", storage=private_storage, blank=True, null=True
+    )
+    source_sha256 = models.CharField(max_length=64, blank=True, db_index=True)
     preview_file = models.FileField(upload_to="previews/", blank=True, null=True)
     preview_image = models.ImageField(
         upload_to="preview_images/", blank=True, null=True
     )
+    preview_thumbnails = models.JSONField(default=dict, blank=True)
     category = models.ForeignKey(
         Category,
         on_delete=models.SET_NULL,
@@ -90,6 +204,11 @@ class Paper(models.Model):
     upload_date = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     downloads = models.PositiveIntegerField(default=0)
+    # Kept up to date by exampapers.paper_stats as events happen.
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    sold_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     uploads = models.PositiveIntegerField(default=0)
     views = models.PositiveIntegerField(default=0)
     earnings = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
@@ -106,6 +225,13 @@ class Paper(models.Model):
         max_length=10, choices=STATUS_CHOICES, default="published"
     )
     page_count = models.IntegerField(null=True, blank=True)
+    processing_state = models.CharField(
+        max_length=20, choices=PROCESSING_STATE_CHOICES, default="pending"
+    )
+    processing_error = models.TextField(blank=True)
+    watermark_signature = models.CharField(max_length=64, blank=True)
+    # Maintained by exampapers.search; only populated on PostgreSQL.
+    search_vector = SearchVectorField(null=True, editable=False)
 
     year = models.CharField(
         max_length=9,
@@ -114,175 +240,98 @@ class Paper(models.Model):
         help_text="Academic year format: YYYY/YYYY (e.g., 2023/2024)",
     )
 
-    def __str__(self):
-        return self.title
-
-    def increment_downloads(self):
-        """Increase download count"""
-        self.downloads += 1
-        self.save(update_fields=["downloads"])
-
-    def increment_views(self):
-        """Increase view count"""
-        self.views += 1
-        self.save(update_fields=["views"])
+    objects = PaperQuerySet.as_manager()
 
-    def set_page_count(self) -> None:
-        """Set the number of pages for this Paper."""
-        if not self.file:
-            return
-
-        try:
-            with self.file.open("rb") as f:
-                reader = PdfReader(f)
-                self.page_count = len(reader.pages)
-        except Exception as e:
-            raise RuntimeError(f"Failed to set page count: {e}")
-
-    def generate_preview(self) -> None:
-        """Generate preview PDF and image for this Paper."""
-
-        if self.preview_file and self.preview_file.storage.exists(
-            self.preview_file.name
-        ):
-            logger.info(f"Preview already exists for paper {self.id}, skipping.")
-            return
-        if not self.file:
-            logger.warning(
-                f"No file found for paper {self.id}, skipping preview generation"
-            )
-            return
-
-        try:
-            # Ensure the file exists in storage
-            if not self.file.storage.exists(self.file.name):
-                logger.error(f"File {self.file.name} doesn't exist in storage")
-                return
-
-            with self.file.open("rb") as f:
-                try:
-                    reader = PdfReader(f)
-                    total_pages = len(reader.pages)
-                except Exception as e:
-                    logger.error(f"Invalid PDF file for paper {self.id}: {str(e)}")
-                    return
-
-                if total_pages < 1:
-                    logger.info(f"Paper {self.id} has no pages, skipping preview")
-                    return
-
-                # Determine how many preview pages to generate
-                if total_pages > 21:
-                    preview_pages = min(4, total_pages)
-                elif total_pages < 20:
-                    preview_pages = min(2, total_pages)
-                else:
-                    preview_pages = 0
-
-                if preview_pages == 0:
-                    logger.info(
-                        f"Paper {self.id} has less than 5 pages, skipping PDF preview generation"
-                    )
-                    f.seek(0)
-                    self._generate_preview_image(BytesIO(f.read()))
-                    return
-
-                writer = PdfWriter()
-
-                for i in range(preview_pages):
-                    page = reader.pages[i]
-                    orig_width = float(page.mediabox.width)
-                    orig_height = float(page.mediabox.height)
-                    scale = min((595 - 40) / orig_width, (842 - 40) / orig_height)
-
-                    writer.add_blank_page(width=595, height=842)
-                    new_page = writer.pages[-1]
-
-                    new_page.merge_transformed_page(
-                        page,
-                        (
-                            scale,
-                            0,
-                            0,
-                            scale,
-                            (595 - orig_width * scale) / 2,
-                            (842 - orig_height * scale) / 2,
-                        ),
-                    )
-
-                pdf_buffer = BytesIO()
-                writer.write(pdf_buffer)
-                pdf_buffer.seek(0)
-
-                preview_name = f"previews/{self.id}_{os.path.basename(self.file.name)}"
-                self.preview_file.save(
-                    preview_name, ContentFile(pdf_buffer.getvalue()), save=False
-                )
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "-downloads"]),
+            models.Index(fields=["status", "-review_count"]),
+            models.Index(fields=["status", "-sold_count"]),
+            # The all-papers listing, newest first, then published listings
+            # by views and per school, course, category and author.
+            models.Index(fields=["-upload_date", "-id"], name="paper_recent_idx"),
+            models.Index(
+                fields=["-views"],
+                condition=models.Q(status="published"),
+                name="paper_published_views_idx",
+            ),
+            models.Index(
+                fields=["school", "-upload_date"],
+                condition=models.Q(status="published"),
+                name="paper_published_school_idx",
+            ),
+            models.Index(
+                fields=["course", "-upload_date"],
+                condition=models.Q(status="published"),
+                name="paper_published_course_idx",
+            ),
+            models.Index(
+                fields=["category", "-upload_date"],
+                condition=models.Q(status="published"),
+                name="paper_published_category_idx",
+            ),
+            models.Index(
+                fields=["author", "-upload_date"],
+                condition=models.Q(status="published"),
+                name="paper_published_author_idx",
+            ),
+            # Uploads the processing pipeline hasn't picked up.
+            models.Index(
+                fields=["updated_at"],
+                condition=models.Q(processing_state="pending"),
+                name="paper_pending_idx",
+            ),
+        ]
 
-                # Generate image from the first page
-                self._generate_preview_image(pdf_buffer)
+    def __str__(self):
+        return self.title
 
-        except Exception as e:
-            logger.error(
-                f"Failed to generate preview for paper {self.id}: {str(e)}",
-                exc_info=True,
-            )
-            raise
-
-    def _generate_preview_image(self, pdf_buffer: BytesIO):
-        if self.preview_image and self.preview_image.storage.exists(
-            self.preview_image.name
-        ):
-            logger.info(f"Preview image already exists for paper {self.id}, skipping.")
-            return
-        try:
-            images = convert_from_bytes(
-                pdf_buffer.getvalue(), dpi=300, first_page=1, last_page=1, fmt="jpeg"
-            )
-            if images:
-                img_buffer = BytesIO()
-                images[0].save(img_buffer, format="JPEG", quality=95)
-                img_buffer.seek(0)
-                preview_image_name = f"{os.path.splitext(os.path.basename(self.file.name))[0]}_preview.jpg"
-                self.preview_image.save(
-                    preview_image_name, ContentFile(img_buffer.getvalue()), save=False
-                )
-        except Exception as e:
-            logger.warning(f"Couldn't generate image preview for {self.id}: {e}")
+    @property
+    def rating_average(self):
+        return self.rating_sum / self.review_count if self.review_count else None
 
     def save(self, *args, **kwargs):
-        if self.file:
-            try:
-                original_file = Paper.objects.get(pk=self.pk).file if self.pk else None
-            except Paper.DoesNotExist:
-                original_file = None
-
-            if not original_file or original_file.name != self.file.name:
-                watermarked_buffer = add_watermark_to_pdf(self.file.open("rb"))
-                original_name = os.path.basename(self.file.name)
-                if not original_name.startswith("watermarked_"):
-                    original_name = f"watermarked_{original_name}"
-                self.file.save(
-                    original_name,
-                    ContentFile(watermarked_buffer.getvalue()),
-                    save=False,
-                )
+        # A newly assigned upload is stored as-is in private storage, under
+        # its content hash so identical uploads share one file, and handed to
+        # the processing pipeline once the transaction commits (see
+        # exampapers.signals). ``file`` stays empty until the pipeline has
+        # written the watermarked copy.
+        if self.file and not self.file._committed:
+            upload = self.file.file
+            self.source_sha256 = file_sha256(upload)
+            name = source_storage_name(self.source_sha256, self.file.name)
+            storage = self.source_file.storage
+            if not storage.exists(name):
+                name = storage.save(name, upload)
+            self.file = ""
+            self.source_file = name
+            self.preview_file = None
+            self.preview_image = None
+            self.preview_thumbnails = {}
+            self.page_count = None
+            self.processing_state = "pending"
+            self.processing_error = ""
+            self.watermark_signature = ""
+            self._needs_processing = True
+
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None:
+                kwargs["update_fields"] = set(update_fields) | {
+                    "file",
+                    "source_file",
+                    "source_sha256",
+                    "preview_file",
+                    "preview_image",
+                    "preview_thumbnails",
+                    "page_count",
+                    "processing_state",
+                    "processing_error",
+                    "watermark_signature",
+                }
 
         super().save(*args, **kwargs)
 
 
-@receiver(post_save, sender=Paper)
-def handle_paper_save(sender, instance, created, **kwargs):
-    """Automatically generate previews and set page count."""
-    try:
-        if created or not instance.preview_file:
-            instance.set_page_count()
-            instance.generate_preview()
-            instance.save()
-    except Exception as e:
-        logger.error(f"Failed to process paper {instance.id}: {str(e)}")
-
-
 class Review(models.Model):
     paper = models.ForeignKey(Paper, on_delete=models.CASCADE, related_name="reviews")
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -290,6 +339,9 @@ class Review(models.Model):
     comment = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["paper", "-created_at"])]
+
     def __str__(self):
         return f"{self.user} - {self.rating}"
 
@@ -309,6 +361,9 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     credited = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [models.Index(fields=["user", "status"])]
+
     def __str__(self):
         return f"Order {self.id} - {self.user}"
 
@@ -321,6 +376,9 @@ class PaperDownload(models.Model):
     downloaded_at = models.DateTimeField(auto_now_add=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["user", "paper"])]
+
     def __str__(self):
         return f"{self.user} downloaded {self.paper.title} on {self.downloaded_at}"
 
@@ -339,12 +397,14 @@ class Wishlist(models.Model):
 
 
 class Statistics(models.Model):
-    """Model to track platform-wide statistics"""
+    """Platform-wide totals at the end of each day, filled in nightly by
+    exampapers.dashboard_stats."""
 
     date = models.DateField(default=now, unique=True)
     total_papers = models.PositiveIntegerField(default=0)
     total_downloads = models.PositiveIntegerField(default=0)
     total_uploads = models.PositiveIntegerField(default=0)
+    total_views = models.PositiveIntegerField(default=0)
     total_earnings = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
     total_users = models.PositiveIntegerField(default=0)
     new_users_today = models.PositiveIntegerField(default=0)
@@ -357,3 +417,100 @@ class Statistics(models.Model):
 
     def __str__(self):
         return f"Stats for {self.date}"
+
+
+class PaperDailyStats(models.Model):
+    """One paper's activity on one day, for sellers' trends.
+
+    Kept up to date by exampapers.analytics as events happen. Changes count
+    on the day they happen, so a review removed or a sale undone later
+    lowers that later day, which can go negative.
+    """
+
+    paper = models.ForeignKey(
+        Paper, on_delete=models.CASCADE, related_name="daily_stats"
+    )
+    # The paper's author, copied so a seller's series is one index range.
+    seller = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="paper_daily_stats",
+    )
+    date = models.DateField()
+    views = models.IntegerField(default=0)
+    downloads = models.IntegerField(default=0)
+    sales = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    review_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Paper daily stats"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["paper", "date"], name="paper_daily_stats_paper_date"
+            )
+        ]
+        indexes = [models.Index(fields=["seller", "date"])]
+
+    def __str__(self):
+        return f"{self.paper_id} on {self.date}"
+
+
+class UploadSession(models.Model):
+    """A resumable, chunked upload of a paper file.
+
+    Parts are written straight into a file under
+    ``settings.PAPER_UPLOAD_TEMP_DIR`` at their offset, so they can arrive in
+    any order and be retried. Once every part is in and the checksum
+    matches, the file becomes a Paper and goes through the usual pipeline.
+    """
+
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("completed", "Completed"),
+        ("expired", "Expired"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="upload_sessions",
+    )
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    chunk_size = models.PositiveIntegerField()
+    received_parts = models.JSONField(default=list, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    paper = models.ForeignKey(Paper, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Upload {self.id} ({self.filename}) - {self.status}"
+
+    @property
+    def part_count(self):
+        return max(1, -(-self.size // self.chunk_size))
+
+    @property
+    def temp_path(self):
+        return os.path.join(settings.PAPER_UPLOAD_TEMP_DIR, f"{self.id}.part")
+
+    def part_size(self, part):
+        """Expected length of a (zero-based) part; only the last is short."""
+        if part == self.part_count - 1:
+            return self.size - part * self.chunk_size
+        return self.chunk_size
+
+    @property
+    def is_complete(self):
+        return len(set(self.received_parts)) == self.part_count
+
+    def discard_temp_file(self):
+        try:
+            os.remove(self.temp_path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,151 @@
+import base64
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from backend.cache import namespace
+
+# Orderings that can be paged by keyset, mapped to the column they sort on.
+# Ties are broken on the primary key.
+KEYSET_FIELDS = {
+    "upload_date": "upload_date",
+    "downloads": "downloads",
+    "download_count": "downloads",
+    "price": "price",
+}
+
+
+cache = namespace("catalog")
+
+
+class KeysetPagination(PageNumberPagination):
+    """Cursor pagination over ``(sort column, id)`` for the big paper listings.
+
+    Each page continues from the last row of the previous one instead of
+    using OFFSET, so deep pages cost the same as the first. Cursors are
+    opaque and carried in the ``next``/``previous`` links; ``count`` is
+    approximate, cached for ``PAPER_LISTING_COUNT_CACHE_TTL`` seconds.
+
+    Requests with ``?page=``, or ordered by a column without a keyset (e.g.
+    title) or by several columns, are paged by page number as before, with
+    the same response shape.
+    """
+
+    page_size = 12
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        # The ordering the view's filters applied, i.e. ?ordering= once
+        # checked against the view's ordering_fields.
+        terms = list(queryset.query.order_by) or ["-upload_date"]
+        ordering = terms[0] if len(terms) == 1 else None
+        field = (
+            KEYSET_FIELDS.get(ordering.lstrip("-"))
+            if isinstance(ordering, str)
+            else None
+        )
+        if field is None or self.page_query_param in request.query_params:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.keyset = (field, ordering.startswith("-"))
+        self.page_size = self.get_page_size(request)
+        self.count = self._approximate_count(queryset)
+
+        cursor = self._decode_cursor(request, queryset.model)
+        backwards = cursor is not None and cursor["previous"]
+        descending = self.keyset[1] != backwards
+        prefix = "-" if descending else ""
+        queryset = queryset.order_by(f"{prefix}{field}", f"{prefix}pk")
+
+        if cursor is not None:
+            op = "lt" if descending else "gt"
+            queryset = queryset.filter(
+                Q(**{f"{field}__{op}": cursor["value"]})
+                | Q(**{field: cursor["value"], f"pk__{op}": cursor["pk"]})
+            )
+
+        rows = list(queryset[: self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if backwards:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.rows = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        if self.keyset is None:
+            return super().get_paginated_response(data)
+        return Response(
+            {
+                "count": self.count,
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_next_link(self):
+        if self.keyset is None:
+            return super().get_next_link()
+        if not self.has_next or not self.rows:
+            return None
+        return self._link(self.rows[-1], previous=False)
+
+    def get_previous_link(self):
+        if self.keyset is None:
+            return super().get_previous_link()
+        if not self.has_previous or not self.rows:
+            return None
+        return self._link(self.rows[0], previous=True)
+
+    def _link(self, row, previous):
+        field = self.keyset[0]
+        value = row._meta.get_field(field).value_to_string(row)
+        payload = json.dumps({"v": value, "pk": row.pk, "p": previous})
+        cursor = base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def _decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + "=" * (-len(encoded) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            field = model._meta.get_field(self.keyset[0])
+            return {
+                "value": field.to_python(payload["v"]),
+                "pk": int(payload["pk"]),
+                "previous": bool(payload["p"]),
+            }
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound("Invalid cursor")
+
+    def _approximate_count(self, queryset):
+        try:
+            sql, params = queryset.order_by().query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        digest = hashlib.sha256(f"{sql}{params!r}".encode()).hexdigest()
+        key = f"listing:count:{digest}"
+        count = cache.get(key)
+        if count is None:
+            count = queryset.order_by().count()
+            cache.set(key, count, settings.PAPER_LISTING_COUNT_CACHE_TTL)
+        return count
@@ -0,0 +1,108 @@
+"""Incremental upkeep of the denormalised counters on ``Paper``.
+
+``review_count``, ``rating_sum``, ``downloads``, ``sold_count`` and
+``revenue`` are adjusted as reviews, downloads and completed orders come
+and go (see exampapers.signals), so listings can sort on them without
+touching the event tables. Downloads go through the buffered counters in
+exampapers.counters, the rest are single UPDATEs. Reviews and sales also
+go into the day's exampapers.analytics rows. ``reconcile_paper_stats``
+rebuilds the counters from scratch when they drift.
+"""
+
+from django.db import transaction
+from django.db.models import (
+    Count,
+    DecimalField,
+    F,
+    IntegerField,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce, Greatest
+
+from . import analytics, counters
+from .models import Order, Paper, PaperDownload, Review
+
+STAT_FIELDS = ("review_count", "rating_sum", "downloads", "sold_count", "revenue")
+
+
+def _bump(field, delta):
+    if delta >= 0:
+        return F(field) + delta
+    # Never go below zero when an event is undone twice.
+    return Greatest(F(field) + delta, 0)
+
+
+def record_review(paper_id, rating_delta, count_delta):
+    Paper.objects.filter(pk=paper_id).update(
+        review_count=_bump("review_count", count_delta),
+        rating_sum=_bump("rating_sum", rating_delta),
+    )
+    analytics.record_review(paper_id, rating_delta, count_delta)
+
+
+def record_download(paper_id, delta=1):
+    transaction.on_commit(lambda: counters.increment("downloads", paper_id, delta))
+
+
+def record_sale(paper_ids, delta=1):
+    """Count (or, with ``delta=-1``, un-count) one sale of each paper.
+
+    Revenue moves by the paper's current price, which is what the order
+    was charged unless the price changed since.
+    """
+    if not paper_ids:
+        return
+    if delta > 0:
+        revenue = F("revenue") + F("price") * delta
+    else:
+        revenue = Greatest(F("revenue") + F("price") * delta, Value(0))
+    Paper.objects.filter(pk__in=paper_ids).update(
+        sold_count=_bump("sold_count", delta), revenue=revenue
+    )
+    analytics.record_sale(paper_ids, delta)
+
+
+def _aggregate_subquery(queryset, group, expression, output_field):
+    return Coalesce(
+        Subquery(
+            queryset.order_by()
+            .values(group)
+            .annotate(total=expression)
+            .values("total")[:1],
+            output_field=output_field,
+        ),
+        Value(0),
+        output_field=output_field,
+    )
+
+
+def expected_stats(queryset):
+    """Annotate ``queryset`` with each stat recomputed from the event tables,
+    as ``expected_<field>``."""
+    integer = IntegerField()
+    money = DecimalField(max_digits=12, decimal_places=2)
+    reviews = Review.objects.filter(paper=OuterRef("pk"))
+    sales = Order.papers.through.objects.filter(
+        paper=OuterRef("pk"), order__status="completed"
+    )
+    return queryset.annotate(
+        expected_review_count=_aggregate_subquery(
+            reviews, "paper", Count("*"), integer
+        ),
+        expected_rating_sum=_aggregate_subquery(
+            reviews, "paper", Sum("rating"), integer
+        ),
+        expected_downloads=_aggregate_subquery(
+            PaperDownload.objects.filter(paper=OuterRef("pk")),
+            "paper",
+            Count("*"),
+            integer,
+        ),
+        expected_sold_count=_aggregate_subquery(sales, "paper", Count("*"), integer),
+        expected_revenue=_aggregate_subquery(
+            sales, "paper", Sum("paper__price"), money
+        ),
+    )
@@ -0,0 +1,268 @@
+"""Full-text search over papers.
+
+On PostgreSQL each paper keeps a weighted ``search_vector`` (title, then
+description, then author, category, course, school and year) behind a GIN
+index, queried with prefix matching and ranked with ``ts_rank``. Titles
+are also matched by trigram similarity so small typos still find a paper.
+
+SQLite, for local development, keeps the same text in an FTS5 table
+(``exampapers_paper_fts``) ranked with bm25, without typo tolerance. Other
+databases fall back to ``icontains`` matching.
+"""
+
+import hashlib
+import json
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramWordSimilarity,
+)
+from django.db import connection
+from django.db.models import Case, CharField, Count, F, FloatField, Q, Value, When
+
+from backend.cache import namespace
+
+from .models import Paper
+
+SEARCH_CONFIG = "english"
+FTS_TABLE = "exampapers_paper_fts"
+# SQLite matches are handed to the ORM as a list of ids, so cap how many.
+MAX_FTS_MATCHES = 1000
+# Trigram matches rank below most full-text matches.
+TRIGRAM_WEIGHT = 0.3
+
+FACETS = ("category", "course", "school", "year", "price_bucket", "is_free")
+# (label, lower bound, upper bound) of paid papers' prices; free papers are
+# bucketed as "free".
+PRICE_BUCKETS = (
+    ("under_5", 0, 5),
+    ("5_to_10", 5, 10),
+    ("10_to_20", 10, 20),
+    ("20_plus", 20, None),
+)
+
+cache = namespace("catalog")
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def search_terms(query):
+    return _TERM_RE.findall((query or "").lower())[:10]
+
+
+def _document(paper):
+    meta = [
+        paper.author.username if paper.author_id else "",
+        paper.category.name if paper.category_id else "",
+        paper.course.name if paper.course_id else "",
+        paper.school.name if paper.school_id else "",
+        paper.year or "",
+    ]
+    return {
+        "title": paper.title or "",
+        "description": paper.description or "",
+        "meta": " ".join(part for part in meta if part),
+    }
+
+
+def index_papers(paper_ids):
+    """(Re)build the search entries of the given papers."""
+    papers = Paper.objects.filter(pk__in=list(paper_ids)).select_related(
+        "author", "category", "course", "school"
+    )
+    vendor = connection.vendor
+    for paper in papers:
+        document = _document(paper)
+        if vendor == "postgresql":
+            Paper.objects.filter(pk=paper.pk).update(
+                search_vector=SearchVector(
+                    Value(document["title"]), weight="A", config=SEARCH_CONFIG
+                )
+                + SearchVector(
+                    Value(document["description"]), weight="B", config=SEARCH_CONFIG
+                )
+                + SearchVector(
+                    Value(document["meta"]), weight="C", config=SEARCH_CONFIG
+                )
+            )
+        elif vendor == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [paper.pk])
+                cursor.execute(
+                    f"INSERT INTO {FTS_TABLE} (rowid, title, description, meta) "
+                    "VALUES (%s, %s, %s, %s)",
+                    [
+                        paper.pk,
+                        document["title"],
+                        document["description"],
+                        document["meta"],
+                    ],
+                )
+
+
+def remove_from_index(paper_id):
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [paper_id])
+
+
+def _search_postgresql(queryset, terms, query):
+    tsquery = SearchQuery(
+        " & ".join(f"{term}:*" for term in terms),
+        search_type="raw",
+        config=SEARCH_CONFIG,
+    )
+    return (
+        queryset.annotate(
+            search_rank=SearchRank(F("search_vector"), tsquery)
+            + TrigramWordSimilarity(query, "title") * TRIGRAM_WEIGHT
+        )
+        .filter(Q(search_vector=tsquery) | Q(title__trigram_word_similar=query))
+        .order_by("-search_rank", "-upload_date")
+    )
+
+
+def _search_sqlite(queryset, terms):
+    match = " ".join(f'"{term}"*' for term in terms)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, bm25({FTS_TABLE}, 10.0, 4.0, 1.0) AS score "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            "ORDER BY score LIMIT %s",
+            [match, MAX_FTS_MATCHES],
+        )
+        scores = {paper_id: -score for paper_id, score in cursor.fetchall()}
+    if not scores:
+        return queryset.none()
+    return (
+        queryset.filter(pk__in=scores)
+        .annotate(
+            search_rank=Case(
+                *(When(pk=pk, then=Value(score)) for pk, score in scores.items()),
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+        )
+        .order_by("-search_rank", "-upload_date")
+    )
+
+
+def _search_icontains(queryset, terms):
+    for term in terms:
+        queryset = queryset.filter(
+            Q(title__icontains=term) | Q(description__icontains=term)
+        )
+    return queryset.annotate(search_rank=Value(0.0)).order_by("-upload_date")
+
+
+def search_papers(queryset, query):
+    """Narrow ``queryset`` to papers matching ``query``, best match first.
+
+    Matches are annotated with ``search_rank``.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset.none()
+
+    vendor = connection.vendor
+    if vendor == "postgresql":
+        return _search_postgresql(queryset, terms, " ".join(terms))
+    if vendor == "sqlite":
+        return _search_sqlite(queryset, terms)
+    return _search_icontains(queryset, terms)
+
+
+def _price_bucket():
+    whens = [When(is_free=True, then=Value("free"))]
+    for label, low, high in PRICE_BUCKETS:
+        condition = Q(price__gte=low) if high is None else Q(price__lt=high)
+        whens.append(When(condition, then=Value(label)))
+    return Case(*whens, default=Value("free"), output_field=CharField())
+
+
+def filter_price_bucket(queryset, bucket):
+    """Narrow ``queryset`` to one of the ``PRICE_BUCKETS`` labels (or "free")."""
+    return queryset.alias(price_bucket=_price_bucket()).filter(price_bucket=bucket)
+
+
+def search_facets(queryset):
+    """Counts of ``queryset`` by category, course, school, year, price bucket
+    and free or paid, most common first.
+
+    All of them come from one query grouped on every facet at once, rolled
+    up per facet here.
+    """
+    rows = (
+        queryset.order_by()
+        .annotate(price_bucket=_price_bucket())
+        .values(
+            "category",
+            "category__name",
+            "course",
+            "course__name",
+            "school",
+            "school__name",
+            "year",
+            "price_bucket",
+            "is_free",
+        )
+        .annotate(count=Count("pk"))
+    )
+
+    counters = {facet: Counter() for facet in FACETS}
+    names = {facet: {} for facet in ("category", "course", "school")}
+    for row in rows:
+        for facet in ("category", "course", "school"):
+            if row[facet] is not None:
+                counters[facet][row[facet]] += row["count"]
+                names[facet][row[facet]] = row[f"{facet}__name"]
+        if row["year"]:
+            counters["year"][row["year"]] += row["count"]
+        counters["price_bucket"][row["price_bucket"]] += row["count"]
+        counters["is_free"][row["is_free"]] += row["count"]
+
+    facets = {}
+    for facet in ("category", "course", "school"):
+        facets[facet] = [
+            {"id": pk, "name": names[facet][pk], "count": count}
+            for pk, count in sorted(
+                counters[facet].items(),
+                key=lambda item: (-item[1], names[facet][item[0]]),
+            )
+        ]
+    facets["year"] = [
+        {"value": year, "count": count}
+        for year, count in sorted(counters["year"].items(), reverse=True)
+    ]
+    bucket_order = ["free"] + [label for label, _, _ in PRICE_BUCKETS]
+    facets["price_bucket"] = [
+        {"value": bucket, "count": counters["price_bucket"][bucket]}
+        for bucket in bucket_order
+        if counters["price_bucket"][bucket]
+    ]
+    facets["is_free"] = [
+        {"value": value, "count": count}
+        for value, count in sorted(counters["is_free"].items())
+    ]
+    return facets
+
+
+def cached_search_facets(queryset, query, filters):
+    """``search_facets`` for a search, cached per normalised query and filters
+    for ``PAPER_SEARCH_FACET_CACHE_TTL`` seconds."""
+    normalised = {
+        "terms": sorted(set(search_terms(query))),
+        "filters": sorted((key, str(value)) for key, value in filters.items()),
+    }
+    digest = hashlib.sha256(json.dumps(normalised, sort_keys=True).encode()).hexdigest()
+    key = f"search:facets:{digest}"
+    facets = cache.get(key)
+    if facets is None:
+        facets = search_facets(queryset)
+        cache.set(key, facets, settings.PAPER_SEARCH_FACET_CACHE_TTL)
+    return facets
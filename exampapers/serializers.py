@@ -1,9 +1,17 @@
 import logging
-
-from django.db.models import Avg, Count
+import os
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models
+from django.db.models import Avg, Count, Sum
+from django.utils.timezone import localdate
 from rest_framework import serializers
 
-from .models import Category, Course, Order, Paper, Review, School
+from . import counters
+from .entitlements import can_access_document, is_owned
+from .models import Category, Course, Order, Paper, Review, School, UploadSession
 
 logger = logging.getLogger(__name__)
 
@@ -69,30 +77,39 @@ class SchoolSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ["slug"]
 
+    # Each count is read from ``School.objects.with_stats()`` annotations
+    # when present and queried per school otherwise.
+
     def get_paper_count(self, obj):
         # Count of published papers for this school
+        if hasattr(obj, "paper_count"):
+            return obj.paper_count
         return obj.papers.filter(status="published").count()
 
     def get_course_count(self, obj):
         # Count of distinct courses with papers from this school
+        if hasattr(obj, "course_count"):
+            return obj.course_count
         return obj.papers.filter(status="published").values("course").distinct().count()
 
     def get_average_rating(self, obj):
         # Average rating of all papers from this school
-        from django.db.models import Avg
-
-        avg_rating = obj.papers.filter(status="published").aggregate(
-            avg_rating=Avg("reviews__rating")
-        )["avg_rating"]
+        if hasattr(obj, "average_rating"):
+            avg_rating = obj.average_rating
+        else:
+            avg_rating = obj.papers.filter(status="published").aggregate(
+                avg_rating=Avg("reviews__rating")
+            )["avg_rating"]
         return round(avg_rating, 1) if avg_rating is not None else None
 
     def get_total_downloads(self, obj):
         # Sum of all downloads from papers in this school
-        from django.db.models import Sum
-
-        total = obj.papers.filter(status="published").aggregate(
-            total_downloads=Sum("downloads")
-        )["total_downloads"]
+        if hasattr(obj, "total_downloads"):
+            total = obj.total_downloads
+        else:
+            total = obj.papers.filter(status="published").aggregate(
+                total_downloads=Sum("downloads")
+            )["total_downloads"]
         return total if total is not None else 0
 
 
@@ -120,19 +137,30 @@ class PaperReviewSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class LiveCountersListSerializer(serializers.ListSerializer):
+    """Shows a page of papers with their not yet flushed views and downloads."""
+
+    def to_representation(self, data):
+        papers = list(data.all() if isinstance(data, models.Manager) else data)
+        counters.merge_pending(papers)
+        return super().to_representation(papers)
+
+
 class PaperSerializer(serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     course = CourseSerializer(read_only=True)
     school = SchoolSerializer(read_only=True)
     document_url = serializers.SerializerMethodField()
+    is_owned = serializers.SerializerMethodField()
     author_info = serializers.SerializerMethodField()
     pages = serializers.SerializerMethodField()
     total_papers_sold = serializers.SerializerMethodField(read_only=True)
     reviews = PaperReviewSerializer(many=True, read_only=True)
     average_rating = serializers.SerializerMethodField(read_only=True)
-    review_count = serializers.IntegerField(source="reviews.count", read_only=True)
+    review_count = serializers.IntegerField(read_only=True)
     preview_url = serializers.SerializerMethodField()
     preview_image = serializers.SerializerMethodField()
+    preview_srcset = serializers.SerializerMethodField()
     download_count = serializers.SerializerMethodField(read_only=True)
     can_edit = serializers.SerializerMethodField()
     can_delete = serializers.SerializerMethodField()
@@ -154,6 +182,7 @@ class PaperSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Paper
+        list_serializer_class = LiveCountersListSerializer
         fields = [
             "id",
             "title",
@@ -162,6 +191,7 @@ class PaperSerializer(serializers.ModelSerializer):
             "preview_file",
             "preview_url",
             "preview_image",
+            "preview_srcset",
             "price",
             "status",
             "category",
@@ -178,6 +208,7 @@ class PaperSerializer(serializers.ModelSerializer):
             "author",
             "author_info",
             "document_url",
+            "is_owned",
             "pages",
             "total_papers_sold",
             "reviews",
@@ -187,6 +218,7 @@ class PaperSerializer(serializers.ModelSerializer):
             "can_edit",
             "can_delete",
             "year",
+            "processing_state",
         ]
         read_only_fields = [
             "id",
@@ -195,6 +227,7 @@ class PaperSerializer(serializers.ModelSerializer):
             "downloads",
             "upload_date",
             "page_count",
+            "processing_state",
             "document_url",
             "preview_url",
             "preview_file",
@@ -208,28 +241,25 @@ class PaperSerializer(serializers.ModelSerializer):
         if not request:
             return None
 
+        if obj.processing_state != "ready":
+            return None
+
         try:
             user = request.user
-            if obj.is_free:
+            if can_access_document(user, obj, request):
                 if obj.file and hasattr(obj.file, "url"):
                     return request.build_absolute_uri(obj.file.url)
-                return None
-
-            if user.is_authenticated:
-                has_bought = Order.objects.filter(
-                    user=user, papers=obj, status="completed"
-                ).exists()
-                if (
-                    (has_bought or obj.author == user)
-                    and obj.file
-                    and hasattr(obj.file, "url")
-                ):
-                    return request.build_absolute_uri(obj.file.url)
         except Exception as e:
             logger.error(f"Error generating document URL for paper {obj.id}: {str(e)}")
             return None
         return None
 
+    def get_is_owned(self, obj):
+        request = self.context.get("request")
+        if not request:
+            return False
+        return is_owned(request.user, obj, request)
+
     def get_preview_url(self, obj):
         request = self.context.get("request")
         if not request:
@@ -264,17 +294,46 @@ class PaperSerializer(serializers.ModelSerializer):
             )
         return None
 
+    def get_preview_srcset(self, obj):
+        """Preview thumbnails per format, smallest first.
+
+        ``{"webp": {"srcset": "<url> 320w, ...", "widths": {"320": "<url>"}}}``
+        alongside a "jpeg" entry every client can fall back to.
+        """
+        request = self.context.get("request")
+        if not request or not obj.preview_thumbnails:
+            return None
+
+        storage = obj.preview_image.storage
+        srcset = {}
+        try:
+            for width in sorted(obj.preview_thumbnails, key=int):
+                for fmt, name in obj.preview_thumbnails[width].items():
+                    url = storage.url(name)
+                    if not url.startswith(("http://", "https://")):
+                        url = request.build_absolute_uri(url)
+                    entry = srcset.setdefault(fmt, {"srcset": [], "widths": {}})
+                    entry["srcset"].append(f"{url} {width}w")
+                    entry["widths"][width] = url
+        except Exception as e:
+            logger.error(f"Error generating preview srcset for paper {obj.id}: {e}")
+            return None
+
+        for entry in srcset.values():
+            entry["srcset"] = ", ".join(entry["srcset"])
+        return srcset
+
     def get_pages(self, obj):
         return obj.page_count
 
     def get_total_papers_sold(self, obj):
-        return Order.objects.filter(papers=obj, status="completed").count()
+        return obj.sold_count
 
     def get_download_count(self, obj):
-        return obj.paperdownload_set.count()
+        return obj.downloads
 
     def get_average_rating(self, obj):
-        return obj.reviews.aggregate(avg=Avg("rating"))["avg"] or 0
+        return obj.rating_average or 0
 
     def get_author_info(self, obj):
         request = self.context.get("request")
@@ -290,15 +349,17 @@ class PaperSerializer(serializers.ModelSerializer):
             "name": user.username,
             "email": user.email if request.user == user else None,
             "avatar": avatar_url,
-            "papers_count": getattr(
-                obj,
-                "author_papers_count",
-                user.papers.filter(status="published").count(),
+            "papers_count": (
+                obj.author_papers_count
+                if hasattr(obj, "author_papers_count")
+                else user.papers.filter(status="published").count()
             ),
-            "papers_sold": getattr(
-                obj,
-                "author_papers_sold",
-                user.papers.filter(status="published").exclude(is_free=True).count(),
+            "papers_sold": (
+                obj.author_papers_sold
+                if hasattr(obj, "author_papers_sold")
+                else user.papers.filter(status="published")
+                .exclude(is_free=True)
+                .count()
             ),
         }
 
@@ -318,26 +379,16 @@ class PaperSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         validated_data["author"] = self.context["request"].user
-        paper = super().create(validated_data)
-
-        if paper.file:
-            paper.set_page_count()
-            paper.generate_preview()
-            paper.save(update_fields=["page_count", "preview_file", "preview_image"])
-
-        return paper
+        return super().create(validated_data)
 
     def update(self, instance, validated_data):
         file = validated_data.pop("file", None)
         instance = super().update(instance, validated_data)
 
+        # Assigning a new file queues it for processing on save.
         if file is not None:
             instance.file = file
-            instance.set_page_count()
-            instance.generate_preview()
-            instance.save(
-                update_fields=["file", "page_count", "preview_file", "preview_image"]
-            )
+            instance.save(update_fields=["file"])
 
         return instance
 
@@ -367,12 +418,14 @@ class PaperListSerializer(serializers.ModelSerializer):
     course = CourseSerializer(read_only=True)
     school = SchoolSerializer(read_only=True)
 
-    download_count = serializers.IntegerField(read_only=True)
-    average_rating = serializers.FloatField(read_only=True)
+    download_count = serializers.IntegerField(source="downloads", read_only=True)
+    average_rating = serializers.FloatField(source="rating_average", read_only=True)
     review_count = serializers.IntegerField(read_only=True)
+    is_owned = serializers.SerializerMethodField()
 
     class Meta:
         model = Paper
+        list_serializer_class = LiveCountersListSerializer
         fields = [
             "id",
             "title",
@@ -385,8 +438,15 @@ class PaperListSerializer(serializers.ModelSerializer):
             "download_count",
             "average_rating",
             "review_count",
+            "is_owned",
         ]
 
+    def get_is_owned(self, obj):
+        request = self.context.get("request")
+        if not request:
+            return False
+        return is_owned(request.user, obj, request)
+
 
 class SchoolDetailSerializer(serializers.ModelSerializer):
     papers = PaperSerializer(many=True, read_only=True)
@@ -421,9 +481,103 @@ class SchoolDetailSerializer(serializers.ModelSerializer):
         return CourseSerializer(courses, many=True).data
 
 
+class PaperProcessingStatusSerializer(serializers.ModelSerializer):
+    ready = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Paper
+        fields = ["id", "processing_state", "processing_error", "page_count", "ready"]
+
+    def get_ready(self, obj):
+        return obj.processing_state == "ready"
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    part_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = [
+            "id",
+            "filename",
+            "size",
+            "sha256",
+            "chunk_size",
+            "part_count",
+            "received_parts",
+            "status",
+            "paper",
+            "created_at",
+        ]
+        read_only_fields = [
+            "id",
+            "chunk_size",
+            "received_parts",
+            "status",
+            "paper",
+            "created_at",
+        ]
+
+    def validate_filename(self, filename):
+        filename = os.path.basename(filename.replace("\\", "/")).strip()
+        if not filename:
+            raise serializers.ValidationError("A file name is required.")
+        return filename
+
+    def validate_size(self, size):
+        if size < 1:
+            raise serializers.ValidationError("File is empty.")
+        max_size = settings.PAPER_UPLOAD_MAX_SIZE
+        if size > max_size:
+            raise serializers.ValidationError(
+                f"File size exceeds {max_size // (1024 * 1024)}MB limit."
+            )
+        return size
+
+    def validate_sha256(self, sha256):
+        sha256 = sha256.lower()
+        if not re.fullmatch(r"[0-9a-f]{64}", sha256):
+            raise serializers.ValidationError("Expected a hex-encoded SHA-256.")
+        return sha256
+
+    def create(self, validated_data):
+        validated_data["user"] = self.context["request"].user
+        validated_data["chunk_size"] = settings.PAPER_UPLOAD_CHUNK_SIZE
+        return super().create(validated_data)
+
+
 class OrderSerializer(serializers.ModelSerializer):
     papers = PaperSerializer(read_only=True)
 
     class Meta:
         model = Order
         fields = ["id", "papers", "price", "status", "created_at"]
+
+
+class SellerAnalyticsQuerySerializer(serializers.Serializer):
+    """Query parameters of ``SellerAnalyticsView``. The range defaults to
+    the last 30 days, 12 weeks or 12 months, ending today."""
+
+    DEFAULT_SPANS = {"day": 29, "week": 7 * 12 - 1, "month": 365}
+    MAX_BUCKETS = 366
+
+    period = serializers.ChoiceField(choices=["day", "week", "month"], default="day")
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    paper = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, data):
+        end = data.get("end") or localdate()
+        start = data.get("start") or end - timedelta(
+            days=self.DEFAULT_SPANS[data["period"]]
+        )
+        if start > end:
+            raise serializers.ValidationError("start must not be after end.")
+        days = (end - start).days + 1
+        buckets = {"day": days, "week": days / 7, "month": days / 30}[data["period"]]
+        if buckets > self.MAX_BUCKETS:
+            raise serializers.ValidationError(
+                f"At most {self.MAX_BUCKETS} {data['period']}s per request."
+            )
+        data.update(start=start, end=end)
+        return data
@@ -1,12 +1,278 @@
-# papers/signals.py
-from django.db.models.signals import post_save
+import logging
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
 from django.dispatch import receiver
 
-from .models import Paper
-from .tasks import generate_paper_preview
+from . import catalog_cache, dashboard_stats, paper_stats
+from .entitlements import invalidate_entitlements
+from .models import Category, Course, Order, Paper, PaperDownload, Review, School
+from .search import index_papers, remove_from_index
+from .tasks import start_paper_processing, update_search_index
+
+logger = logging.getLogger(__name__)
+
+# Paper fields that go into its search entry.
+SEARCH_FIELDS = {
+    "title",
+    "description",
+    "author",
+    "category",
+    "course",
+    "school",
+    "year",
+}
 
 
 @receiver(post_save, sender=Paper)
-def generate_preview_after_upload(sender, instance, created, **kwargs):
+def queue_paper_processing(sender, instance, created, **kwargs):
+    """Start the processing pipeline once a new upload has been committed."""
+    if not getattr(instance, "_needs_processing", False):
+        return
+
+    instance._needs_processing = False
+    paper_id = instance.pk
+
+    def start():
+        try:
+            start_paper_processing(paper_id)
+        except Exception as e:
+            logger.error(f"Couldn't queue processing of paper {paper_id}: {e}")
+            raise
+
+    # The upload is saved either way, so a broker outage mustn't fail it;
+    # requeue_pending_papers retries papers left pending.
+    transaction.on_commit(start, robust=True)
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_order_entitlements(sender, instance, **kwargs):
+    """Drop the buyer's cached owned papers when one of their orders changes."""
+    if instance.user_id is None:
+        return
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_entitlements(user_id))
+
+
+@receiver(m2m_changed, sender=Order.papers.through)
+def invalidate_order_papers_entitlements(sender, instance, action, **kwargs):
+    if not action.startswith("post_") or not isinstance(instance, Order):
+        return
+    invalidate_order_entitlements(sender, instance)
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_rating(sender, instance, **kwargs):
+    instance._previous = (
+        Review.objects.filter(pk=instance.pk).values("paper_id", "rating").first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=Review)
+def count_review(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous", None)
+    if created or previous is None:
+        paper_stats.record_review(instance.paper_id, instance.rating, 1)
+    elif previous["paper_id"] != instance.paper_id:
+        paper_stats.record_review(previous["paper_id"], -previous["rating"], -1)
+        paper_stats.record_review(instance.paper_id, instance.rating, 1)
+    elif previous["rating"] != instance.rating:
+        paper_stats.record_review(
+            instance.paper_id, instance.rating - previous["rating"], 0
+        )
+
+
+@receiver(post_delete, sender=Review)
+def uncount_review(sender, instance, **kwargs):
+    paper_stats.record_review(instance.paper_id, -instance.rating, -1)
+
+
+@receiver(post_save, sender=PaperDownload)
+def count_download(sender, instance, created, **kwargs):
     if created:
-        generate_paper_preview.delay(instance.id)
+        paper_stats.record_download(instance.paper_id)
+        dashboard_stats.record("total_downloads")
+
+
+@receiver(post_delete, sender=PaperDownload)
+def uncount_download(sender, instance, **kwargs):
+    paper_stats.record_download(instance.paper_id, -1)
+    dashboard_stats.record("total_downloads", -1)
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_status(sender, instance, **kwargs):
+    instance._previous_status = (
+        Order.objects.filter(pk=instance.pk).values_list("status", flat=True).first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=Order)
+def count_order_sales(sender, instance, **kwargs):
+    """Count the order's papers as sold when it becomes completed, and
+    uncount them if it stops being completed."""
+    was_completed = getattr(instance, "_previous_status", None) == "completed"
+    is_completed = instance.status == "completed"
+    if was_completed == is_completed:
+        return
+    paper_ids = list(instance.papers.values_list("pk", flat=True))
+    paper_stats.record_sale(paper_ids, 1 if is_completed else -1)
+    dashboard_stats.record("completed_orders", 1 if is_completed else -1)
+
+
+@receiver(pre_delete, sender=Order)
+def uncount_deleted_order_sales(sender, instance, **kwargs):
+    if instance.status == "completed":
+        paper_ids = list(instance.papers.values_list("pk", flat=True))
+        paper_stats.record_sale(paper_ids, -1)
+        dashboard_stats.record("completed_orders", -1)
+
+
+@receiver(m2m_changed, sender=Order.papers.through)
+def count_order_papers_sales(sender, instance, action, reverse, pk_set, **kwargs):
+    """Papers added to or removed from an already completed order."""
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    delta = 1 if action == "post_add" else -1
+
+    if not reverse:
+        if instance.status != "completed":
+            return
+        if action == "pre_clear":
+            pk_set = instance.papers.values_list("pk", flat=True)
+        paper_stats.record_sale(list(pk_set), delta)
+        return
+
+    # paper.order_set.add(...) and friends: pk_set holds order ids.
+    orders = Order.objects.filter(status="completed")
+    if action == "pre_clear":
+        orders = orders.filter(papers=instance)
+    else:
+        orders = orders.filter(pk__in=pk_set)
+    completed = orders.count()
+    if completed:
+        paper_stats.record_sale([instance.pk], delta * completed)
+
+
+@receiver(post_save, sender=Paper)
+def index_paper_for_search(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not SEARCH_FIELDS & set(update_fields):
+        return
+    paper_id = instance.pk
+    transaction.on_commit(lambda: index_papers([paper_id]))
+
+
+@receiver(post_delete, sender=Paper)
+def remove_paper_from_search(sender, instance, **kwargs):
+    paper_id = instance.pk
+    transaction.on_commit(lambda: remove_from_index(paper_id))
+
+
+def _indexed_name_field(sender):
+    return "username" if sender is get_user_model() else "name"
+
+
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=Course)
+@receiver(pre_save, sender=School)
+@receiver(pre_save, sender=get_user_model())
+def remember_indexed_name(sender, instance, update_fields=None, **kwargs):
+    field = _indexed_name_field(sender)
+    if not instance.pk or (update_fields is not None and field not in update_fields):
+        instance._previous_indexed_name = None
+        return
+    instance._previous_indexed_name = (
+        sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=School)
+@receiver(post_save, sender=get_user_model())
+def reindex_related_papers(sender, instance, created, **kwargs):
+    """Names of authors, categories, courses and schools are searchable, so
+    their papers are re-indexed when the name actually changes."""
+    previous = getattr(instance, "_previous_indexed_name", None)
+    if created or previous is None:
+        return
+    if previous == getattr(instance, _indexed_name_field(sender)):
+        return
+    field = "author" if sender is get_user_model() else sender._meta.model_name
+    pk = instance.pk
+    # The papers keep their old entry until the next re-index; a broker
+    # outage shouldn't fail the save.
+    transaction.on_commit(lambda: update_search_index.delay(**{field: pk}), robust=True)
+
+
+@receiver(post_save, sender=Paper)
+@receiver(post_delete, sender=Paper)
+def invalidate_catalog_papers(sender, instance, **kwargs):
+    transaction.on_commit(lambda: catalog_cache.invalidate("papers"))
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_catalog_reviews(sender, instance, **kwargs):
+    transaction.on_commit(lambda: catalog_cache.invalidate("reviews"))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=School)
+@receiver(post_delete, sender=School)
+def invalidate_catalog_names(sender, instance, **kwargs):
+    tag = {Category: "categories", Course: "courses", School: "schools"}[sender]
+    transaction.on_commit(lambda: catalog_cache.invalidate(tag))
+
+
+@receiver(post_save, sender=Paper)
+def count_new_paper(sender, instance, created, **kwargs):
+    if not created:
+        return
+    dashboard_stats.record("papers_uploaded_today")
+    if instance.status == "published":
+        dashboard_stats.record("total_papers")
+
+
+@receiver(post_delete, sender=Paper)
+def uncount_deleted_paper(sender, instance, **kwargs):
+    if instance.status == "published":
+        dashboard_stats.record("total_papers", -1)
+
+
+@receiver(post_save, sender=get_user_model())
+def count_new_user(sender, instance, created, **kwargs):
+    if created:
+        dashboard_stats.record("total_users")
+        dashboard_stats.record("new_users_today")
+
+
+@receiver(post_delete, sender=get_user_model())
+def uncount_deleted_user(sender, instance, **kwargs):
+    dashboard_stats.record("total_users", -1)
+
+
+@receiver(post_save, sender=Order)
+def count_new_order(sender, instance, created, **kwargs):
+    if created:
+        dashboard_stats.record("total_orders")
+
+
+@receiver(post_delete, sender=Order)
+def uncount_deleted_order(sender, instance, **kwargs):
+    dashboard_stats.record("total_orders", -1)
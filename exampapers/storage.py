@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+from django.utils.functional import cached_property
+
+
+@deconstructible(path="exampapers.storage.PrivateStorage")
+class PrivateStorage(FileSystemStorage):
+    """Files under ``PRIVATE_MEDIA_ROOT``, which is never served.
+
+    Original uploads live here: they are unwatermarked, so only the
+    processing pipeline reads them. The files have no URL.
+    """
+
+    @cached_property
+    def base_location(self):
+        return self._value_or_setting(self._location, settings.PRIVATE_MEDIA_ROOT)
+
+    @cached_property
+    def base_url(self):
+        return None
+
+
+private_storage = PrivateStorage()
@@ -1,57 +1,457 @@
+import hashlib
+import logging
 import os
-from io import BytesIO
-from random import sample
+import time
+from datetime import timedelta
 
-from celery import shared_task
+from celery import chain, shared_task
+from django.conf import settings
 from django.core.files.base import ContentFile
-from PyPDF2 import PdfReader, PdfWriter
+from django.db.models import Q
+from django.utils.timezone import now
 
-from .models import Paper
+from backend.cache import namespace
+from exampapers.utils.paper_helpers import (
+    DEFAULT_WATERMARK_TEXT,
+    THUMBNAIL_EXTENSIONS,
+    PaperDocument,
+    derived_storage_prefix,
+    document_storage_name,
+    file_sha256,
+    is_pdf,
+    preview_page_count,
+    source_storage_name,
+    watermark_signature,
+)
 
+from . import catalog_cache, counters, dashboard_stats
+from .models import Paper, UploadSession
+from .search import index_papers
 
-@shared_task
-def generate_paper_preview(paper_id):
+logger = logging.getLogger(__name__)
+
+PIPELINE_STAGES = ("ingest", "document", "image")
+# Seconds the progress of a regenerate_watermarks --celery run is kept.
+REWATERMARK_PROGRESS_TTL = 7 * 24 * 60 * 60
+
+progress_cache = namespace("default")
+
+
+class PaperProcessingError(Exception):
+    """Raised by a pipeline stage to stop processing a paper."""
+
+
+def _set_state(paper_id, state, **fields):
+    Paper.objects.filter(pk=paper_id).update(processing_state=state, **fields)
+
+
+def _source(paper):
+    """The original, un-watermarked upload (for legacy papers, the only
+    copy kept)."""
+    return paper.source_file if paper.source_file else paper.file
+
+
+def _run_stage(paper_id, state, stage):
+    """Load the paper, mark it as being in ``state`` and run ``stage`` on it.
+
+    Any failure marks the paper as failed and is re-raised so the rest of the
+    chain is not executed.
+    """
+    try:
+        paper = Paper.objects.get(pk=paper_id)
+    except Paper.DoesNotExist:
+        raise PaperProcessingError(f"Paper {paper_id} no longer exists")
 
+    _set_state(paper_id, state)
     try:
-        paper = Paper.objects.get(id=paper_id)
+        stage(paper)
+    except Exception as e:
+        logger.error(
+            f"Processing stage '{state}' failed for paper {paper_id}: {e}",
+            exc_info=True,
+        )
+        _set_state(paper_id, "failed", processing_error=f"{state}: {e}")
+        raise
+
+
+def _save_derived(storage, name, data, overwrite=False):
+    """Store a derived artifact under its content-addressed name.
+
+    Duplicate uploads map to the same name, so an existing file is reused
+    unless ``overwrite`` is set.
+    """
+    if storage.exists(name):
+        if not overwrite:
+            return name
+        storage.delete(name)
+    return storage.save(name, ContentFile(data))
+
+
+def delete_unreferenced_files(storage, names):
+    """Delete stored files that no paper refers to any more.
+
+    Sources and derived artifacts are shared between duplicate uploads, so
+    a file may only go once the last paper using it has let go of it.
+    """
+    for name in names:
+        if not name or not storage.exists(name):
+            continue
+        if Paper.objects.filter(
+            Q(file=name)
+            | Q(source_file=name)
+            | Q(preview_file=name)
+            | Q(preview_image=name)
+            | Q(preview_thumbnails__icontains=name)
+        ).exists():
+            continue
+        storage.delete(name)
+
+
+def start_paper_processing(paper_id, from_stage="ingest"):
+    """Queue the processing pipeline for a paper.
+
+    Stages run as a Celery chain: ingest -> document (page count, watermark
+    and preview PDF from a single parse) -> image. ``from_stage`` lets
+    callers re-run only the tail of the pipeline.
+    """
+    tasks = {
+        "ingest": ingest_paper,
+        "document": process_paper_document,
+        "image": generate_paper_preview_image,
+    }
+    stages = PIPELINE_STAGES[PIPELINE_STAGES.index(from_stage) :]
+    return chain(*(tasks[name].si(paper_id) for name in stages)).apply_async()
+
 
-        if not paper.file:
+@shared_task
+def ingest_paper(paper_id):
+    def stage(paper):
+        source = _source(paper)
+        name, storage = source.name, source.storage
+        if not name or not storage.exists(name):
+            raise PaperProcessingError(f"File {name} doesn't exist in storage")
+
+        with storage.open(name, "rb") as f:
+            if not is_pdf(f):
+                ext = os.path.splitext(name)[1].lower()
+                raise PaperProcessingError(f"Unsupported file type '{ext}'")
+            if not paper.source_sha256:
+                # Papers uploaded before uploads were hashed.
+                Paper.objects.filter(pk=paper.pk).update(source_sha256=file_sha256(f))
+
+    _run_stage(paper_id, "ingesting", stage)
+
+
+def _keep_source(paper, data):
+    """Name of the paper's original upload in private storage. Papers from
+    before uploads were kept privately have it in ``file``, from where it
+    is copied."""
+    if paper.source_file:
+        return paper.source_file.name
+    name = source_storage_name(paper.source_sha256, paper.file.name)
+    return _save_derived(paper.source_file.storage, name, data)
+
+
+def _is_legacy_watermarked(paper):
+    """Papers uploaded before source files were kept only have the
+    watermarked copy, which must not be watermarked a second time."""
+    return not paper.source_file and os.path.basename(paper.file.name).startswith(
+        "watermarked_"
+    )
+
+
+def _find_duplicate(paper):
+    """A ready paper processed from the same upload by the current pipeline,
+    whose artifacts can be shared instead of being generated again."""
+    if not paper.source_sha256:
+        return None
+    return (
+        Paper.objects.filter(
+            source_sha256=paper.source_sha256,
+            processing_state="ready",
+            file=document_storage_name(paper.source_sha256),
+        )
+        .exclude(pk=paper.pk)
+        .first()
+    )
+
+
+@shared_task
+def process_paper_document(paper_id):
+    def stage(paper):
+        duplicate = _find_duplicate(paper)
+        if duplicate is not None:
+            logger.info(f"Paper {paper.id} reuses the files of paper {duplicate.id}")
+            Paper.objects.filter(pk=paper.pk).update(
+                page_count=duplicate.page_count,
+                file=duplicate.file.name,
+                source_file=paper.source_file.name or duplicate.source_file.name,
+                watermark_signature=duplicate.watermark_signature,
+                preview_file=duplicate.preview_file.name,
+                preview_image=duplicate.preview_image.name,
+                preview_thumbnails=duplicate.preview_thumbnails,
+            )
+            if not paper.source_file:
+                delete_unreferenced_files(paper.file.storage, [paper.file.name])
             return
 
-        with paper.file.open("rb") as f:
-            reader = PdfReader(f)
-            total_pages = len(reader.pages)
-            paper.page_count = total_pages
+        storage = paper.preview_file.storage
+        legacy = _is_legacy_watermarked(paper)
+        with _source(paper).open("rb") as f:
+            document = PaperDocument(
+                f, watermark_text=None if legacy else DEFAULT_WATERMARK_TEXT
+            )
+        sha256 = paper.source_sha256 or hashlib.sha256(document.data).hexdigest()
+        prefix = derived_storage_prefix(sha256)
+
+        page_count = document.page_count
+        Paper.objects.filter(pk=paper.pk).update(
+            page_count=page_count, source_sha256=sha256
+        )
 
-            if total_pages < 6:
-                default_preview_path = os.path.join(
-                    "media", "previews", "no_preview.pdf"
+        _set_state(paper.pk, "watermarking")
+        if legacy:
+            logger.info(f"Paper {paper.id} is already watermarked, skipping.")
+        else:
+            paper.source_sha256 = sha256
+            source_name = _keep_source(paper, document.data)
+            name = document_storage_name(sha256)
+            if not paper.file.storage.exists(name):
+                name = _save_derived(
+                    paper.file.storage, name, document.watermarked_pdf().getvalue()
                 )
-                if os.path.exists(default_preview_path):
-                    with open(default_preview_path, "rb") as default_file:
-                        content = default_file.read()
-                    paper.preview_file.save(
-                        "no_preview.pdf", ContentFile(content), save=False
-                    )
-                paper.save(update_fields=["page_count", "preview_file"])
-                return
-
-            writer = PdfWriter()
-            indices = sorted(sample(range(total_pages), min(4, total_pages)))
-            for i in indices:
-                writer.add_page(reader.pages[i])
-
-            buffer = BytesIO()
-            writer.write(buffer)
-            buffer.seek(0)
-
-            preview_name = (
-                os.path.splitext(os.path.basename(paper.file.name))[0] + "_preview.pdf"
+            Paper.objects.filter(pk=paper.pk).update(
+                file=name,
+                source_file=source_name,
+                watermark_signature=watermark_signature(document.data),
             )
-            paper.preview_file.save(
-                preview_name, ContentFile(buffer.read()), save=False
+            if not paper.source_file and paper.file.name != name:
+                delete_unreferenced_files(paper.file.storage, [paper.file.name])
+
+        _set_state(paper.pk, "previewing")
+        if preview_page_count(page_count) == 0:
+            logger.info(f"Paper {paper.id} gets no PDF preview, skipping.")
+            return
+
+        name = f"{prefix}preview.pdf"
+        if not storage.exists(name):
+            name = _save_derived(storage, name, document.preview_pdf().getvalue())
+        Paper.objects.filter(pk=paper.pk).update(preview_file=name)
+
+    _run_stage(paper_id, "counting", stage)
+
+
+def _save_thumbnails(paper, thumbnails, overwrite=False):
+    """Store rendered preview thumbnails next to the paper's other derived
+    artifacts.
+
+    Returns the paper fields to update: the ``preview_thumbnails`` map of
+    ``{width: {format: name}}`` and ``preview_image``, which points at the
+    largest JPEG for clients that don't use the srcset.
+    """
+    storage = paper.preview_image.storage
+    prefix = derived_storage_prefix(paper.source_sha256)
+    names = {}
+    for width, encoded in thumbnails.items():
+        names[str(width)] = {
+            fmt: _save_derived(
+                storage,
+                f"{prefix}thumb_{width}w.{THUMBNAIL_EXTENSIONS[fmt]}",
+                data,
+                overwrite=overwrite,
             )
-            paper.save()
+            for fmt, data in encoded.items()
+        }
+    return {
+        "preview_thumbnails": names,
+        "preview_image": names[str(max(thumbnails))]["jpeg"],
+    }
 
-    except Paper.DoesNotExist:
-        pass
+
+def _thumbnail_names(paper):
+    return {
+        name
+        for formats in (paper.preview_thumbnails or {}).values()
+        for name in formats.values()
+    }
+
+
+@shared_task
+def generate_paper_preview_image(paper_id):
+    def stage(paper):
+        prefix = derived_storage_prefix(paper.source_sha256)
+        if paper.preview_thumbnails and all(
+            name.startswith(prefix) for name in _thumbnail_names(paper)
+        ):
+            # Already rendered for this source, e.g. shared from a duplicate
+            # upload by the document stage.
+            return
+
+        # Rasterise the (small) preview PDF when there is one, otherwise the
+        # first page of the watermarked paper itself.
+        source = paper.preview_file if paper.preview_file else paper.file
+        try:
+            with source.open("rb") as f:
+                thumbnails = PaperDocument(
+                    f, watermark_text=None
+                ).first_page_thumbnails()
+        except Exception as e:
+            logger.warning(f"Couldn't generate image preview for {paper.id}: {e}")
+            return
+
+        if not thumbnails:
+            return
+
+        Paper.objects.filter(pk=paper.pk).update(**_save_thumbnails(paper, thumbnails))
+
+    _run_stage(paper_id, "rendering", stage)
+    _set_state(paper_id, "ready", processing_error="")
+
+
+@shared_task
+def rewatermark_paper(paper_id, force=False):
+    """Re-apply the current watermark template to a paper's original upload.
+
+    The watermarked file, preview PDF and preview image are regenerated from
+    a single parse and swapped in together; processing_state is left alone
+    so the paper stays downloadable throughout. Returns "done", "skipped"
+    when the paper already carries the current template, or "no-source" for
+    legacy papers whose original upload was not kept.
+    """
+    paper = Paper.objects.get(pk=paper_id)
+    if _is_legacy_watermarked(paper):
+        return "no-source"
+
+    storage = paper.file.storage
+    with _source(paper).open("rb") as f:
+        document = PaperDocument(f)
+
+    paper.source_sha256 = (
+        paper.source_sha256 or hashlib.sha256(document.data).hexdigest()
+    )
+    signature = watermark_signature(document.data)
+    document_name = document_storage_name(paper.source_sha256)
+    if (
+        not force
+        and paper.watermark_signature == signature
+        and paper.file.name == document_name
+    ):
+        return "skipped"
+
+    old_names = {paper.file.name, paper.preview_file.name, paper.preview_image.name}
+    old_names |= _thumbnail_names(paper)
+
+    prefix = derived_storage_prefix(paper.source_sha256)
+    fields = {
+        "source_file": _keep_source(paper, document.data),
+        "source_sha256": paper.source_sha256,
+        "file": _save_derived(
+            storage,
+            document_name,
+            document.watermarked_pdf().getvalue(),
+            overwrite=force,
+        ),
+        "watermark_signature": signature,
+    }
+    pdf_buffer = document.preview_pdf()
+    if pdf_buffer is not None:
+        fields["preview_file"] = _save_derived(
+            storage, f"{prefix}preview.pdf", pdf_buffer.getvalue(), overwrite=force
+        )
+
+    try:
+        thumbnails = document.first_page_thumbnails()
+        if thumbnails:
+            fields.update(_save_thumbnails(paper, thumbnails, overwrite=force))
+    except Exception as e:
+        logger.warning(f"Couldn't regenerate image preview for {paper.id}: {e}")
+
+    Paper.objects.filter(pk=paper.pk).update(**fields)
+    delete_unreferenced_files(storage, old_names)
+
+    return "done"
+
+
+def rewatermark_run_key(run_id, chunk=None):
+    key = f"rewatermark:{run_id}"
+    return key if chunk is None else f"{key}:{chunk}"
+
+
+@shared_task
+def rewatermark_papers(run_id, chunk, paper_ids, force=False):
+    """Re-watermark one chunk of a ``regenerate_watermarks --celery`` run.
+
+    Papers are handled one by one, so a failure doesn't stop the rest of
+    the chunk. The chunk's tally and failures are stored in the cache for
+    ``regenerate_watermarks --status``.
+    """
+    counts = {"done": 0, "skipped": 0, "no-source": 0, "failed": 0}
+    failures = []
+    for paper_id in paper_ids:
+        try:
+            counts[rewatermark_paper(paper_id, force=force)] += 1
+        except Exception as e:
+            logger.error(f"Couldn't re-watermark paper {paper_id}: {e}", exc_info=True)
+            counts["failed"] += 1
+            failures.append([paper_id, str(e)])
+    progress_cache.set(
+        rewatermark_run_key(run_id, chunk),
+        {"counts": counts, "failures": failures, "finished_at": time.time()},
+        REWATERMARK_PROGRESS_TTL,
+    )
+    return counts
+
+
+@shared_task
+def expire_upload_sessions():
+    """Discard chunked uploads that were abandoned before completion."""
+    cutoff = now() - timedelta(hours=settings.PAPER_UPLOAD_SESSION_TTL_HOURS)
+    sessions = UploadSession.objects.filter(status="pending", updated_at__lt=cutoff)
+    for session in sessions:
+        session.discard_temp_file()
+    return sessions.update(status="expired")
+
+
+@shared_task
+def requeue_pending_papers():
+    """Queue the processing pipeline again for uploads it never picked up,
+    e.g. because the broker was down when they were saved."""
+    cutoff = now() - timedelta(minutes=settings.PAPER_PROCESSING_REQUEUE_MINUTES)
+    paper_ids = list(
+        Paper.objects.filter(
+            processing_state="pending", updated_at__lt=cutoff
+        ).values_list("pk", flat=True)
+    )
+    for paper_id in paper_ids:
+        # Not again before another interval, even if the queue is backed up.
+        Paper.objects.filter(pk=paper_id).update(updated_at=now())
+        logger.warning(f"Paper {paper_id} is still pending, queueing it again.")
+        start_paper_processing(paper_id)
+    return len(paper_ids)
+
+
+@shared_task
+def update_search_index(**filters):
+    """Re-index the papers matching ``filters``, e.g. after their school was
+    renamed."""
+    paper_ids = list(Paper.objects.filter(**filters).values_list("pk", flat=True))
+    index_papers(paper_ids)
+    return len(paper_ids)
+
+
+@shared_task
+def warm_catalog_cache():
+    """Recompute the homepage catalog entries so readers rarely miss."""
+    return catalog_cache.warm()
+
+
+@shared_task
+def flush_paper_counters():
+    """Write the buffered view and download counts to the papers."""
+    return counters.flush()
+
+
+@shared_task
+def rollup_statistics():
+    """Store yesterday's platform totals for the dashboard."""
+    dashboard_stats.rollup()
@@ -1,3 +1,110 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from exampapers.models import (
+    Category,
+    Course,
+    Order,
+    Paper,
+    PaperDownload,
+    Review,
+    School,
+)
+
+PAGE_SIZE = 12
+
+
+# Budgets raise instead of logging, and listing totals are counted on every
+# request, like a first one.
+@override_settings(QUERY_BUDGET_RAISE=True, PAPER_LISTING_COUNT_CACHE_TTL=0)
+class PaperQueryCountTests(TestCase):
+    """Views rendering papers with ``PaperSerializer`` run a fixed number of
+    queries, however many papers they show, within their query_budget."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        author = User.objects.create(username="author", email="author@example.com")
+        cls.buyer = User.objects.create(username="buyer", email="buyer@example.com")
+        cls.reader = User.objects.create(username="reader", email="reader@example.com")
+        cls.category = Category.objects.create(name="Category", slug="category")
+        cls.course = Course.objects.create(name="Course")
+        cls.school = School.objects.create(name="School", country="KE")
+        cls.small_school = School.objects.create(name="Small school", country="KE")
+
+        papers = [
+            Paper.objects.create(
+                title=f"Paper {i}",
+                author=author,
+                category=cls.category,
+                course=cls.course,
+                school=cls.school,
+                file=f"papers/paper_{i}.pdf",
+                price=Decimal("5.00"),
+                is_free=i % 3 == 0,
+                status="published",
+                processing_state="ready",
+            )
+            for i in range(PAGE_SIZE * 2)
+        ]
+        papers[-1].school = cls.small_school
+        papers[-1].save(update_fields=["school"])
+
+        order = Order.objects.create(
+            user=cls.buyer, price=Decimal("10.00"), status="completed"
+        )
+        order.papers.set(papers[:4])
+        for paper in papers[:PAGE_SIZE]:
+            Review.objects.create(paper=paper, user=cls.buyer, rating=4, comment="ok")
+            PaperDownload.objects.create(paper=paper, user=cls.buyer)
+        PaperDownload.objects.create(paper=papers[0], user=cls.reader)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def get(self, queries, url, params=None, user=None):
+        # Nothing cached, whether listings, totals or purchases.
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        self.client.force_authenticate(user)
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_listings(self):
+        listings = [
+            (reverse("courses-papers"), {"course": self.course.id}),
+            (reverse("categories-papers"), {"category": self.category.id}),
+            (reverse("school-papers", args=[self.school.id]), {}),
+        ]
+        # Count, papers, schools and reviews, plus the buyer's purchases.
+        for user, queries in ((None, 4), (self.buyer, 5)):
+            for url, params in listings:
+                for page_size in (1, PAGE_SIZE):
+                    with self.subTest(url=url, user=user, page_size=page_size):
+                        data = self.get(
+                            queries, url, {**params, "page_size": page_size}, user
+                        )
+                        self.assertEqual(len(data["results"]), page_size)
+
+    def test_user_downloads(self):
+        for user, count in ((self.reader, 1), (self.buyer, PAGE_SIZE)):
+            with self.subTest(downloads=count):
+                data = self.get(5, reverse("user-downloads"), user=user)
+                self.assertEqual(len(data), count)
+
+    def test_school_detail(self):
+        for user, queries in ((None, 5), (self.buyer, 6)):
+            for school, count in ((self.small_school, 1), (self.school, 23)):
+                with self.subTest(user=user, papers=count):
+                    data = self.get(
+                        queries, reverse("school-detail", args=[school.id]), user=user
+                    )
+                    self.assertEqual(len(data["papers"]), count)
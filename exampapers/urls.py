@@ -16,8 +16,10 @@ from .views import (
     PaperDeleteView,
     PaperDetailView,
     PaperDownloadView,
+    PaperProcessingStatusView,
     PaperReviewCreateAPIView,
     PapersByAuthorView,
+    PaperSearchView,
     PaperUpdateView,
     PaperUploadView,
     PopularCategoriesView,
@@ -28,7 +30,12 @@ from .views import (
     SchoolDetailView,
     SchoolListView,
     SchoolPapersView,
+    SellerAnalyticsView,
     UploadCourseListView,
+    UploadSessionCompleteView,
+    UploadSessionCreateView,
+    UploadSessionDetailView,
+    UploadSessionPartView,
     UserDownloadsView,
     UserOrderListView,
     UserUploadSchoolListView,
@@ -37,6 +44,22 @@ from .views import (
 
 urlpatterns = [
     path("upload/", PaperUploadView.as_view(), name="upload"),
+    path("uploads/", UploadSessionCreateView.as_view(), name="upload-session-create"),
+    path(
+        "uploads/<uuid:pk>/",
+        UploadSessionDetailView.as_view(),
+        name="upload-session-detail",
+    ),
+    path(
+        "uploads/<uuid:pk>/parts/<int:part>/",
+        UploadSessionPartView.as_view(),
+        name="upload-session-part",
+    ),
+    path(
+        "uploads/<uuid:pk>/complete/",
+        UploadSessionCompleteView.as_view(),
+        name="upload-session-complete",
+    ),
     path("categories/", CategoryListView.as_view(), name="category-list"),
     path(
         "categories/category-papers/",
@@ -60,6 +83,7 @@ urlpatterns = [
     path("create-order/", CreateOrderView.as_view(), name="order-create"),
     path("orders/<int:pk>/", OrderDetailView.as_view(), name="order-detail"),
     path("papers/", AllPapersView.as_view(), name="all-papers"),
+    path("papers/search/", PaperSearchView.as_view(), name="paper-search"),
     path("papers/<int:pk>/", PaperDetailView.as_view(), name="paper-detail"),
     path(
         "papers/author/<int:author_id>/",
@@ -69,6 +93,11 @@ urlpatterns = [
     path(
         "papers/<int:pk>/download/", PaperDownloadView.as_view(), name="paper-download"
     ),
+    path(
+        "papers/<int:pk>/processing/",
+        PaperProcessingStatusView.as_view(),
+        name="paper-processing-status",
+    ),
     path("papers/most-viewed/", MostViewedPapersView.as_view(), name="most-viewed"),
     path("papers/latest-papers/", LatestPapersView.as_view(), name="latest-papers"),
     path("dashboard/latest-papers/", LatestUserPapersView.as_view()),
@@ -77,6 +106,7 @@ urlpatterns = [
     path("papers/update/<int:pk>/", PaperUpdateView.as_view(), name="paper-update"),
     path("papers/<int:pk>/delete/", PaperDeleteView.as_view(), name="paper-delete"),
     path("dashboard-stats/", DashboardStatsView.as_view(), name="dashboard-stats"),
+    path("analytics/", SellerAnalyticsView.as_view(), name="seller-analytics"),
     path("schools/", SchoolListView.as_view(), name="school-list"),
     path("schools/<int:pk>/", SchoolDetailView.as_view(), name="school-detail"),
     path("schools/<int:pk>/papers/", SchoolPapersView.as_view(), name="school-papers"),
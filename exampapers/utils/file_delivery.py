@@ -0,0 +1,178 @@
+import logging
+import re
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import (
+    FileResponse,
+    HttpResponse,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
+from django.utils.http import content_disposition_header
+
+logger = logging.getLogger(__name__)
+
+DELIVERY_BACKENDS = ("stream", "x_accel", "x_sendfile", "signed_url")
+STREAM_BLOCK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single-range ``Range`` header into an inclusive byte range.
+
+    Returns None when the whole file should be sent: no header, a
+    malformed one or a multi-range request. Raises ValueError when the
+    range cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # Suffix range: the last N bytes.
+        length = int(end)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, size - length), size - 1
+
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or end < start:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+def is_initial_request(request) -> bool:
+    """Whether a download request starts from the first byte.
+
+    Resumed downloads send a ``Range`` further into the file and should not
+    be counted as a new download.
+    """
+    header = request.headers.get("Range")
+    if not header:
+        return True
+    match = _RANGE_RE.match(header.strip())
+    return not match or match.group(1) == "0"
+
+
+def _file_range(file, start, length):
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(STREAM_BLOCK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def stream_file(request, field_file, filename, content_type="application/pdf"):
+    """Stream a file through Django, honouring single byte-range requests."""
+    size = field_file.size
+    disposition = content_disposition_header(True, filename)
+
+    try:
+        byte_range = parse_range(request.headers.get("Range"), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    if byte_range is None:
+        response = FileResponse(
+            field_file.open("rb"), content_type=content_type, as_attachment=True
+        )
+        response["Content-Disposition"] = disposition
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            _file_range(field_file.open("rb"), start, length),
+            status=206,
+            content_type=content_type,
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = str(length)
+        response["Content-Disposition"] = disposition
+
+    response["Accept-Ranges"] = "bytes"
+    return response
+
+
+def _x_accel(request, field_file, filename, content_type):
+    # nginx serves the file (including Range requests) from an internal
+    # location mapped onto MEDIA_ROOT.
+    response = HttpResponse(content_type=content_type)
+    response["X-Accel-Redirect"] = settings.PAPER_DELIVERY_X_ACCEL_PREFIX + quote(
+        field_file.name
+    )
+    response["Content-Disposition"] = content_disposition_header(True, filename)
+    return response
+
+
+def _x_sendfile(request, field_file, filename, content_type):
+    try:
+        path = field_file.path
+    except NotImplementedError:
+        logger.warning("X-Sendfile needs local file storage, streaming instead.")
+        return stream_file(request, field_file, filename, content_type)
+
+    response = HttpResponse(content_type=content_type)
+    response["X-Sendfile"] = path
+    response["Content-Disposition"] = content_disposition_header(True, filename)
+    return response
+
+
+def _signed_url(request, field_file, filename, content_type):
+    # Object storages (e.g. django-storages' S3 backend) sign URLs with an
+    # expiry and can be told which Content-Disposition to serve.
+    try:
+        url = field_file.storage.url(
+            field_file.name,
+            parameters={
+                "ResponseContentDisposition": content_disposition_header(
+                    True, filename
+                ),
+                "ResponseContentType": content_type,
+            },
+            expire=settings.PAPER_DELIVERY_SIGNED_URL_TTL,
+        )
+    except TypeError:
+        logger.warning("Storage can't sign URLs, streaming the file instead.")
+        return stream_file(request, field_file, filename, content_type)
+    return HttpResponseRedirect(url)
+
+
+_BACKENDS = {
+    "stream": stream_file,
+    "x_accel": _x_accel,
+    "x_sendfile": _x_sendfile,
+    "signed_url": _signed_url,
+}
+
+
+def deliver_file(request, field_file, filename, content_type="application/pdf"):
+    """Hand a stored file to the client using ``settings.PAPER_DELIVERY_BACKEND``.
+
+    "x_accel" and "x_sendfile" let the web server send the file, "signed_url"
+    redirects to a short-lived storage URL and "stream" (the default) sends
+    it from this process.
+    """
+    backend = _BACKENDS.get(settings.PAPER_DELIVERY_BACKEND)
+    if backend is None:
+        logger.error(
+            f"Unknown PAPER_DELIVERY_BACKEND '{settings.PAPER_DELIVERY_BACKEND}', "
+            f"expected one of {', '.join(DELIVERY_BACKENDS)}."
+        )
+        backend = stream_file
+    return backend(request, field_file, filename, content_type)
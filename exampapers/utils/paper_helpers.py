@@ -1,156 +1,367 @@
+import hashlib
 import logging
 import os
+from functools import lru_cache
 from io import BytesIO
-from typing import BinaryIO, Optional, Union
+from typing import BinaryIO, Dict, Iterable, Optional, Tuple, Union
 
-from django.core.files.base import ContentFile
+from django.utils.crypto import salted_hmac
 from pdf2image import convert_from_bytes
-from pypdf import PdfReader, PdfWriter
+from PIL import Image, features
+from pypdf import PageObject, PdfReader, PdfWriter, Transformation
 from reportlab.lib.pagesizes import letter
+from reportlab.pdfbase.pdfmetrics import stringWidth
 from reportlab.pdfgen import canvas
 
 logger = logging.getLogger(__name__)
 DEFAULT_WATERMARK_TEXT = "Gradesworld.com"
 
+WATERMARK_FONT = "Helvetica"
+WATERMARK_FONT_SIZE = 60
+WATERMARK_BOTTOM_OFFSET = 30
+WATERMARK_OVERLAY_CACHE_SIZE = 64
+# Bump whenever create_watermark() changes how the watermark looks.
+WATERMARK_TEMPLATE_VERSION = 1
 
-def set_page_count(paper) -> None:
-    """Set the number of pages for a Paper.
+# Bump whenever the preview PDF or thumbnails change. Derived artifacts are
+# stored per source, version and watermark template, so duplicate uploads
+# only reuse artifacts produced by the current pipeline.
+PIPELINE_VERSION = 1
 
-    Args:
-        paper: The Paper model instance to update.
+PREVIEW_PAGE_WIDTH = 595
+PREVIEW_PAGE_HEIGHT = 842
+PREVIEW_PAGE_MARGIN = 40
 
-    Raises:
-        RuntimeError: If the page count cannot be determined.
+# Preview thumbnails are served through a srcset, so clients can fetch the
+# smallest one that fits; the largest also backs Paper.preview_image.
+THUMBNAIL_WIDTHS = (320, 640, 1280)
+THUMBNAIL_MODERN_FORMATS = ("avif", "webp")
+THUMBNAIL_EXTENSIONS = {"avif": "avif", "webp": "webp", "jpeg": "jpg"}
+THUMBNAIL_SAVE_OPTIONS = {
+    "avif": {"quality": 60},
+    "webp": {"quality": 80, "method": 4},
+    "jpeg": {"quality": 82, "optimize": True, "progressive": True},
+}
+
+
+def is_pdf(input_file: Union[BinaryIO, BytesIO]) -> bool:
+    """Return True if the stream starts with a PDF header."""
+    position = input_file.tell()
+    header = input_file.read(1024)
+    input_file.seek(position)
+    return b"%PDF" in header
+
+
+def file_sha256(file) -> str:
+    """SHA-256 of a Django ``File``, read in chunks rather than all at once."""
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def _watermark_template(text: str) -> str:
+    return (
+        f"{WATERMARK_TEMPLATE_VERSION}:{text}:{WATERMARK_FONT}:"
+        f"{WATERMARK_FONT_SIZE}:{WATERMARK_BOTTOM_OFFSET}"
+    )
+
+
+def source_storage_name(sha256: str, original_name: str) -> str:
+    """Content-addressed name for an original upload, in private storage."""
+    ext = os.path.splitext(original_name)[1].lower()
+    return f"papers/sources/{sha256[:2]}/{sha256}{ext}"
+
+
+def _template_id(text: str) -> str:
+    return hashlib.sha256(_watermark_template(text).encode()).hexdigest()[:16]
+
+
+def _public_key(sha256: str, purpose: str) -> str:
+    # Public names must not reveal the source hash (nor each other), or a
+    # preview URL would lead to the paid file.
+    digest = salted_hmac(f"exampapers.{purpose}", sha256, algorithm="sha256")
+    return digest.hexdigest()[:32]
+
+
+def derived_storage_prefix(sha256: str, text: str = DEFAULT_WATERMARK_TEXT) -> str:
+    """Public storage directory for the previews generated from a given
+    source with the given watermark.
+
+    The directory is keyed on the whole watermark template (text, font and
+    placement too), so changing any of them writes new artifacts instead of
+    reusing ones that carry the old watermark.
     """
-    if not paper.file:
-        return
-
-    try:
-        with paper.file.open("rb") as f:
-            reader = PdfReader(f)
-            paper.page_count = len(reader.pages)
-            paper.save(update_fields=["page_count"])
-    except Exception as e:
-        raise RuntimeError(f"Failed to set page count: {e}")
-
-
-def generate_preview(self) -> None:
-    """Generate a responsive preview PDF optimized for all devices using pypdf."""
-    if not self.file:
-        logger.warning(
-            f"No file found for paper {self.id}, skipping preview generation"
-        )
-        return
-
-    try:
-        with self.file.open("rb") as f:
-            reader = PdfReader(f)
-            total_pages = len(reader.pages)
-
-            if total_pages < 6:
-                logger.info(
-                    f"Paper {self.id} has only {total_pages} pages, skipping preview"
-                )
-                return
-
-            preview_pages = 1 if total_pages < 10 else (2 if total_pages < 50 else 3)
-
-            writer = PdfWriter()
-
-            for i in range(min(preview_pages, total_pages)):
-                page = reader.pages[i]
-                orig_width = float(page.mediabox.width)
-                orig_height = float(page.mediabox.height)
-                scale = min((595 - 40) / orig_width, (842 - 40) / orig_height)
-
-                # Create new blank page
-                writer.add_blank_page(width=595, height=842)
-                # Get the last added page
-                new_page = writer.pages[-1]
-
-                # Merge with transformation
-                new_page.merge_transformed_page(
-                    page,
-                    (
-                        scale,
-                        0,
-                        0,
-                        scale,
-                        (595 - orig_width * scale) / 2,
-                        (842 - orig_height * scale) / 2,
-                    ),
-                )
-
-            # Save preview to BytesIO buffer first
-            pdf_buffer = BytesIO()
-            writer.write(pdf_buffer)
-            pdf_buffer.seek(0)
-
-            # Save to model field
-            preview_name = f"previews/{self.id}_{os.path.basename(self.file.name)}"
-            self.preview_file.save(
-                preview_name, ContentFile(pdf_buffer.getvalue()), save=False
-            )
+    return (
+        f"derived/{_public_key(sha256, 'preview')}/"
+        f"v{PIPELINE_VERSION}-w{_template_id(text)}/"
+    )
 
-            # Generate preview image from the buffer
-            self._generate_preview_image(pdf_buffer)
 
-            self.save(update_fields=["preview_file", "preview_image"])
+def document_storage_name(sha256: str, text: str = DEFAULT_WATERMARK_TEXT) -> str:
+    """Storage name of the watermarked paper generated from a given source,
+    kept apart from its previews."""
+    return (
+        f"papers/{_public_key(sha256, 'document')}/"
+        f"v{PIPELINE_VERSION}-w{_template_id(text)}/watermarked.pdf"
+    )
 
-    except Exception as e:
-        logger.error(f"Failed to generate preview for paper {self.id}: {str(e)}")
-        raise
 
+def preview_page_count(total_pages: int) -> int:
+    """Number of leading pages to include in a paper's preview PDF."""
+    if total_pages > 21:
+        return min(4, total_pages)
+    elif total_pages < 20:
+        return min(2, total_pages)
+    return 0
 
-def _generate_preview_image(self, pdf_buffer: BytesIO) -> None:
-    """Generate a fallback image preview for mobile devices."""
-    try:
-        # Convert first page to image
-        images = convert_from_bytes(
-            pdf_buffer.getvalue(), dpi=100, first_page=1, last_page=1, fmt="jpeg"
-        )
 
-        if images:
-            img_buffer = BytesIO()
-            images[0].save(img_buffer, format="JPEG", quality=85)
-            img_buffer.seek(0)
+def thumbnail_formats() -> Tuple[str, ...]:
+    """Formats to encode thumbnails in: the best modern format Pillow can
+    write here (if any), always followed by the JPEG fallback."""
+    for modern in THUMBNAIL_MODERN_FORMATS:
+        if features.check(modern):
+            return (modern, "jpeg")
+    return ("jpeg",)
 
-            preview_image_name = (
-                os.path.splitext(os.path.basename(self.file.name))[0] + "_preview.jpg"
-            )
-            self.preview_image.save(
-                preview_image_name, ContentFile(img_buffer.getvalue()), save=False
-            )
-    except Exception as e:
-        logger.warning(f"Couldn't generate image preview: {str(e)}")
 
+def render_first_page_thumbnails(
+    pdf_bytes: bytes, widths: Iterable[int] = THUMBNAIL_WIDTHS
+) -> Dict[int, Dict[str, bytes]]:
+    """Rasterise the first page of a PDF into a set of thumbnails.
+
+    The page is rendered once, straight at the largest requested width, and
+    downsampled for the smaller ones. Returns ``{width: {format: bytes}}``.
+    """
+    widths = sorted(set(widths), reverse=True)
+    images = convert_from_bytes(
+        pdf_bytes, first_page=1, last_page=1, size=(widths[0], None)
+    )
+    if not images:
+        return {}
+
+    page = images[0].convert("RGB")
+    formats = thumbnail_formats()
+    thumbnails = {}
+    for width in widths:
+        if page.width > width:
+            height = round(page.height * width / page.width)
+            image = page.resize((width, height), Image.Resampling.LANCZOS)
+        else:
+            image = page
+
+        thumbnails[width] = {}
+        for fmt in formats:
+            buffer = BytesIO()
+            image.save(buffer, format=fmt.upper(), **THUMBNAIL_SAVE_OPTIONS[fmt])
+            thumbnails[width][fmt] = buffer.getvalue()
+
+    return thumbnails
+
+
+def create_watermark(
+    text: str = DEFAULT_WATERMARK_TEXT,
+    width: float = letter[0],
+    height: float = letter[1],
+    rotation: int = 0,
+) -> PdfReader:
+    """Draw a watermark overlay for a page of the given size and rotation.
+
+    The text is centred along the bottom edge of the page as it is
+    displayed, i.e. after its ``/Rotate`` is applied, and shrunk to fit
+    narrow pages.
+    """
+    rotation %= 360
+    visible_width = height if rotation in (90, 270) else width
+    font_size = min(
+        WATERMARK_FONT_SIZE,
+        visible_width * 0.9 / stringWidth(text, WATERMARK_FONT, 1),
+    )
 
-def create_watermark(text: str = DEFAULT_WATERMARK_TEXT) -> PdfReader:
     packet = BytesIO()
-    can = canvas.Canvas(packet, pagesize=letter)
+    can = canvas.Canvas(packet, pagesize=(width, height))
     can.setFillAlpha(0.2)
-    can.setFont("Helvetica", 60)
+    can.setFont(WATERMARK_FONT, font_size)
     can.setFillColorRGB(0.3, 0.3, 0.3)
-    width, height = letter
-    can.drawCentredString(width / 2, 30, text)
+
+    # /Rotate turns the page clockwise, so the displayed bottom edge is the
+    # bottom, right, top or left edge of the unrotated page respectively.
+    origin = {
+        0: (width / 2, WATERMARK_BOTTOM_OFFSET),
+        90: (width - WATERMARK_BOTTOM_OFFSET, height / 2),
+        180: (width / 2, height - WATERMARK_BOTTOM_OFFSET),
+        270: (WATERMARK_BOTTOM_OFFSET, height / 2),
+    }[rotation]
+    can.translate(*origin)
+    can.rotate(rotation)
+    can.drawCentredString(0, 0, text)
     can.save()
     packet.seek(0)
     return PdfReader(packet)
 
 
+@lru_cache(maxsize=WATERMARK_OVERLAY_CACHE_SIZE)
+def get_watermark_overlay(
+    text: str, width: float, height: float, rotation: int
+) -> PageObject:
+    """Process-wide cache of rendered overlays, see ``create_watermark``."""
+    return create_watermark(text, width, height, rotation).pages[0]
+
+
+def apply_watermark(page: PageObject, text: str = DEFAULT_WATERMARK_TEXT) -> None:
+    """Merge a watermark fitted to ``page``'s size and rotation into it."""
+    box = page.mediabox
+    overlay = get_watermark_overlay(
+        text,
+        round(float(box.width), 1),
+        round(float(box.height), 1),
+        page.rotation % 360,
+    )
+
+    left, bottom = float(box.left), float(box.bottom)
+    if left or bottom:
+        page.merge_transformed_page(overlay, Transformation().translate(left, bottom))
+    else:
+        page.merge_page(overlay)
+
+
+def watermark_signature(source: bytes, text: str = DEFAULT_WATERMARK_TEXT) -> str:
+    """Identify a watermarked file by its source content and template.
+
+    Two papers with the same signature were watermarked from identical
+    uploads with the same watermark text and template version.
+    """
+    digest = hashlib.sha256(_watermark_template(text).encode())
+    digest.update(hashlib.sha256(source).digest())
+    return digest.hexdigest()
+
+
 def add_watermark_to_pdf(
     input_file: Union[BinaryIO, BytesIO], output_stream: Optional[BytesIO] = None
 ) -> BytesIO:
-    output_stream = output_stream or BytesIO()
-    watermark = create_watermark()
-    reader = PdfReader(input_file)
-    writer = PdfWriter()
-
-    for i, page in enumerate(reader.pages):
-        if i == 0:  # only watermark first page
-            page.merge_page(watermark.pages[0])
-        writer.add_page(page)
-
-    writer.write(output_stream)
-    output_stream.seek(0)
-    return output_stream
+    return PaperDocument(input_file).watermarked_pdf(output_stream=output_stream)
+
+
+class PaperDocument:
+    """An uploaded PDF parsed once and reused for every derived artifact.
+
+    Page count, the watermarked file, the preview PDF and the first-page
+    raster are all produced from the same ``PdfReader``. ``parse_count``
+    records how many times the source was actually parsed. Pass
+    ``watermark_text=None`` for sources that are already watermarked.
+    """
+
+    def __init__(
+        self,
+        source: Union[bytes, BinaryIO, BytesIO],
+        watermark_text: Optional[str] = DEFAULT_WATERMARK_TEXT,
+    ):
+        self.data = source if isinstance(source, bytes) else source.read()
+        self.watermark_text = watermark_text
+        self.parse_count = 0
+        self._reader = None
+        self._watermarked = False
+
+    @property
+    def reader(self) -> PdfReader:
+        if self._reader is None:
+            self._reader = PdfReader(BytesIO(self.data))
+            self.parse_count += 1
+        return self._reader
+
+    @property
+    def page_count(self) -> int:
+        """Number of pages in the document.
+
+        Raises:
+            RuntimeError: If the page count cannot be determined.
+        """
+        try:
+            return len(self.reader.pages)
+        except Exception as e:
+            raise RuntimeError(f"Failed to set page count: {e}")
+
+    def _apply_watermark(self) -> None:
+        # Only the first page is watermarked. The page is modified in place so
+        # the preview built afterwards carries the same watermark.
+        if self._watermarked:
+            return
+        if self.watermark_text and self.reader.pages:
+            apply_watermark(self.reader.pages[0], self.watermark_text)
+        self._watermarked = True
+
+    def watermarked_pdf(self, output_stream: Optional[BytesIO] = None) -> BytesIO:
+        """Write the full document, with its first page watermarked."""
+        self._apply_watermark()
+        output_stream = output_stream or BytesIO()
+        writer = PdfWriter()
+        for page in self.reader.pages:
+            writer.add_page(page)
+
+        writer.write(output_stream)
+        output_stream.seek(0)
+        return output_stream
+
+    def preview_pdf(self) -> Optional[BytesIO]:
+        """Build an A4 preview PDF from the first (watermarked) pages.
+
+        Returns None when the paper is too short (or the wrong length) to get
+        a preview PDF; callers fall back to rendering the first page.
+        """
+        preview_pages = preview_page_count(self.page_count)
+        if preview_pages == 0:
+            return None
+
+        self._apply_watermark()
+        writer = PdfWriter()
+        usable_width = PREVIEW_PAGE_WIDTH - PREVIEW_PAGE_MARGIN
+        usable_height = PREVIEW_PAGE_HEIGHT - PREVIEW_PAGE_MARGIN
+
+        for i in range(preview_pages):
+            page = self.reader.pages[i]
+            orig_width = float(page.mediabox.width)
+            orig_height = float(page.mediabox.height)
+            scale = min(usable_width / orig_width, usable_height / orig_height)
+
+            writer.add_blank_page(width=PREVIEW_PAGE_WIDTH, height=PREVIEW_PAGE_HEIGHT)
+            new_page = writer.pages[-1]
+
+            new_page.merge_transformed_page(
+                page,
+                (
+                    scale,
+                    0,
+                    0,
+                    scale,
+                    (PREVIEW_PAGE_WIDTH - orig_width * scale) / 2,
+                    (PREVIEW_PAGE_HEIGHT - orig_height * scale) / 2,
+                ),
+            )
+
+        pdf_buffer = BytesIO()
+        writer.write(pdf_buffer)
+        pdf_buffer.seek(0)
+        return pdf_buffer
+
+    def first_page_pdf(self) -> bytes:
+        """A single-page PDF holding the watermarked first page.
+
+        Rasterising this instead of the whole upload keeps poppler from
+        parsing every page of a large document.
+        """
+        self._apply_watermark()
+        writer = PdfWriter()
+        writer.add_page(self.reader.pages[0])
+        buffer = BytesIO()
+        writer.write(buffer)
+        return buffer.getvalue()
+
+    def first_page_thumbnails(
+        self, widths: Iterable[int] = THUMBNAIL_WIDTHS
+    ) -> Dict[int, Dict[str, bytes]]:
+        """Rasterise the watermarked first page, see
+        ``render_first_page_thumbnails``."""
+        if self.page_count < 1:
+            return {}
+        return render_first_page_thumbnails(self.first_page_pdf(), widths)
@@ -1,18 +1,16 @@
+import hashlib
 import logging
 import os
 from datetime import datetime
 
 from django.conf import settings
-from django.core.cache import cache
+from django.core.files import File
 from django.core.files.storage import default_storage
-from django.core.mail import EmailMultiAlternatives
-from django.db.models import Avg, Count, F, OuterRef, Prefetch, Q, Subquery, Sum
-from django.http import FileResponse
+from django.db import transaction
+from django.db.models import Avg, Count, OuterRef, Prefetch, Q, Subquery, Sum
 from django.shortcuts import get_object_or_404
-from django.template.loader import render_to_string
 from django.utils.decorators import method_decorator
-from django.utils.timezone import now
-from django.views.decorators.cache import cache_page
+from django.utils.text import slugify
 from django.views.decorators.csrf import csrf_exempt
 from django_filters.rest_framework import ChoiceFilter, DjangoFilterBackend, FilterSet
 from rest_framework import filters, generics, permissions
@@ -23,9 +21,11 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from payments.models import Wallet
+from communications.outbox import queue_email
 from users.models import User
 
+from . import analytics, catalog_cache, counters, dashboard_stats
+from .entitlements import is_owned, owned_paper_ids
 from .models import (
     Category,
     Course,
@@ -34,19 +34,33 @@ from .models import (
     PaperDownload,
     Review,
     School,
-    Wishlist,
+    UploadSession,
+)
+from .pagination import KeysetPagination
+from .search import (
+    cached_search_facets,
+    filter_price_bucket,
+    search_papers,
+    search_terms,
 )
 from .serializers import (
     CategorySerializer,
     CourseSerializer,
     OrderSerializer,
     PaperListSerializer,
+    PaperProcessingStatusSerializer,
     PaperReviewSerializer,
     PaperSerializer,
     SchoolDetailSerializer,
     SchoolSerializer,
+    SellerAnalyticsQuerySerializer,
+    UploadSessionSerializer,
     UserUploadSchoolSerializer,
 )
+from .storage import private_storage
+from .tasks import delete_unreferenced_files
+from .utils.file_delivery import deliver_file, is_initial_request
+from .utils.paper_helpers import file_sha256
 
 logger = logging.getLogger(__name__)
 
@@ -67,7 +81,16 @@ class PaperFilterMixin:
         filters.SearchFilter,
         filters.OrderingFilter,
     ]
-    filterset_fields = ["category", "course", "school", "status", "is_free"]
+    filterset_fields = {
+        "category": ["exact"],
+        "course": ["exact"],
+        "school": ["exact"],
+        "status": ["exact"],
+        "is_free": ["exact"],
+        "downloads": ["gte"],
+        "review_count": ["gte"],
+        "sold_count": ["gte"],
+    }
     search_fields = [
         "title",
         "description",
@@ -80,6 +103,9 @@ class PaperFilterMixin:
         "title",
         "upload_date",
         "downloads",
+        "review_count",
+        "sold_count",
+        "average_rating",
         "views",
         "price",
         "earnings",
@@ -90,81 +116,92 @@ class PaperFilterMixin:
     ordering = ["-upload_date"]
 
 
-class AllPapersView(PaperFilterMixin, generics.ListAPIView):
-    serializer_class = PaperListSerializer
-    permission_classes = [permissions.AllowAny]
-    pagination_class = PaperPagination
-    queryset = (
-        Paper.objects.select_related("category", "course", "school", "author")
-        .prefetch_related(
-            "reviews",
-            "paperdownload_set",
-            "author__papers",
-            "author__papers__reviews",
-        )
-        .annotate(
-            download_count=Count("paperdownload", distinct=True),
-            average_rating=Avg("reviews__rating"),
-            review_count=Count("reviews", distinct=True),
-        )
+def _with_list_data(queryset):
+    """Only what PaperListSerializer renders: the paper's own columns, the
+    names of its category and course, and its school with the school's
+    stats (one extra query per page)."""
+    return (
+        queryset.select_related("category", "course")
+        .prefetch_related(Prefetch("school", queryset=School.objects.with_stats()))
+        .with_listing_stats()
         .only(
             "id",
             "title",
             "description",
-            "file",
-            "preview_file",
-            "preview_image",
             "price",
-            "status",
-            "category_id",
-            "course_id",
-            "school_id",
-            "page_count",
-            "views",
-            "downloads",
             "upload_date",
-            "author_id",
-            "is_free",
-            "year",
+            "downloads",
+            "review_count",
+            "rating_sum",
+            "school_id",
+            "category__id",
+            "category__name",
+            "course__id",
+            "course__name",
         )
     )
 
 
-@method_decorator(cache_page(60 * 5), name="dispatch")
-class LatestPapersView(generics.ListAPIView):
+class AllPapersView(PaperFilterMixin, generics.ListAPIView):
     serializer_class = PaperListSerializer
     permission_classes = [permissions.AllowAny]
-    pagination_class = None
+    query_budget = 5
+    pagination_class = KeysetPagination
+    queryset = _with_list_data(Paper.objects.all())
 
-    def get_queryset(self):
-        return (
-            Paper.objects.filter(status="published")
-            .select_related("category", "course", "school")
-            .only(
-                "id",
-                "title",
-                "upload_date",
-                "price",
-                "status",
-                "is_free",
-                "category__name",
-                "course__name",
-                "school__name",
-            )
-            .order_by("-upload_date")[:8]
+
+class PaperSearchView(generics.ListAPIView):
+    """Full-text search over published papers (``?q=``), best match first.
+
+    Results can be narrowed by category, course, school, year, price_bucket
+    and is_free, and the response carries facet counts for each of them.
+    """
+
+    serializer_class = PaperListSerializer
+    permission_classes = [permissions.AllowAny]
+    query_budget = 7
+    pagination_class = PaperPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ["category", "course", "school", "year", "is_free"]
+
+    def get_matches(self):
+        params = self.request.query_params
+        matches = self.filter_queryset(
+            search_papers(Paper.objects.filter(status="published"), params.get("q"))
         )
+        if params.get("price_bucket"):
+            matches = filter_price_bucket(matches, params["price_bucket"])
+        return matches
 
     def list(self, request, *args, **kwargs):
-        cache_key = "latest_papers_json"
-        data = cache.get(cache_key)
-        if not data:
-            queryset = self.get_queryset()
-            serializer = self.get_serializer(
-                queryset, many=True, context={"request": request}
-            )
-            data = serializer.data
-            cache.set(cache_key, data, 300)
-        return Response(data)
+        query = request.query_params.get("q")
+        if not search_terms(query):
+            return Response({"detail": "A search query (q) is required."}, status=400)
+
+        matches = self.get_matches()
+        page = self.paginate_queryset(_with_list_data(matches))
+        serializer = self.get_serializer(page, many=True)
+        response = self.get_paginated_response(serializer.data)
+        filters = {
+            key: request.query_params[key]
+            for key in (*self.filterset_fields, "price_bucket")
+            if request.query_params.get(key)
+        }
+        response.data["facets"] = cached_search_facets(matches, query, filters)
+        return response
+
+
+class LatestPapersView(generics.ListAPIView):
+    serializer_class = PaperListSerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = None
+
+    def list(self, request, *args, **kwargs):
+        papers = catalog_cache.get("latest_papers")
+        owned = owned_paper_ids(request.user, request)
+        return Response(
+            [{**paper, "is_owned": paper["id"] in owned} for paper in papers]
+        )
 
 
 class UserUploadsView(generics.ListAPIView):
@@ -192,12 +229,11 @@ class UserUploadsView(generics.ListAPIView):
 class UserDownloadsView(ListAPIView):
     serializer_class = PaperSerializer
     permission_classes = [IsAuthenticated]
+    query_budget = 6
 
     def get_queryset(self):
-        return (
-            Paper.objects.filter(paperdownload__user=self.request.user)
-            .distinct()
-            .select_related("category", "course", "school")
+        return _with_card_data(
+            Paper.objects.filter(paperdownload__user=self.request.user).distinct()
         )
 
     def list(self, request, *args, **kwargs):
@@ -228,10 +264,15 @@ class UserDownloadsView(ListAPIView):
 
 class PaperDetailView(APIView):
     permission_classes = [permissions.AllowAny]
+    query_budget = 8
 
     def get(self, request, pk):
-        paper = get_object_or_404(Paper, pk=pk, status="published")
-        Paper.objects.filter(pk=paper.pk).update(views=F("views") + 1)
+        paper = get_object_or_404(
+            _with_card_data(Paper.objects.filter(status="published")), pk=pk
+        )
+        counters.increment("views", paper.pk)
+        dashboard_stats.record("total_views")
+        counters.merge_pending([paper])
         serializer = PaperSerializer(paper, context={"request": request})
         return Response(serializer.data)
 
@@ -239,22 +280,42 @@ class PaperDetailView(APIView):
 class PapersByAuthorView(generics.ListAPIView):
     serializer_class = PaperListSerializer
     permission_classes = [permissions.AllowAny]
-    pagination_class = PaperPagination
+    pagination_class = KeysetPagination
     filter_backends = [
         DjangoFilterBackend,
         filters.SearchFilter,
         filters.OrderingFilter,
     ]
 
-    filterset_fields = ["category__name", "course__name", "school__name", "is_free"]
+    filterset_fields = {
+        "category__name": ["exact"],
+        "course__name": ["exact"],
+        "school__name": ["exact"],
+        "is_free": ["exact"],
+        "downloads": ["gte"],
+        "review_count": ["gte"],
+        "sold_count": ["gte"],
+    }
     search_fields = ["title"]
-    ordering_fields = ["title", "price", "upload_date", "school__name"]
+    ordering_fields = [
+        "title",
+        "price",
+        "upload_date",
+        "school__name",
+        "downloads",
+        "review_count",
+        "sold_count",
+        "average_rating",
+    ]
 
     def get_queryset(self):
         author_id = self.kwargs["author_id"]
-        return Paper.objects.filter(
-            author_id=author_id, status="published"
-        ).select_related("category", "course", "school")
+        return (
+            Paper.objects.filter(author_id=author_id, status="published")
+            .select_related("category", "course")
+            .prefetch_related(Prefetch("school", queryset=School.objects.with_stats()))
+            .with_listing_stats()
+        )
 
     def list(self, request, *args, **kwargs):
         response = super().list(request, *args, **kwargs)
@@ -303,7 +364,7 @@ class MostViewedPapersView(ListAPIView):
         return (
             Paper.objects.filter(status="published", author=self.request.user)
             .select_related("course", "category")
-            .annotate(download_count=Count("downloads"))
+            .with_listing_stats()
         )
 
 
@@ -321,7 +382,7 @@ class LatestUserPapersView(ListAPIView):
         return (
             Paper.objects.filter(author=self.request.user)
             .select_related("course", "category")
-            .annotate(download_count=Count("downloads"))
+            .with_listing_stats()
         )
 
 
@@ -331,30 +392,173 @@ class PaperUploadView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def perform_create(self, serializer):
+        # Only the raw upload is stored here; watermarking and previews are
+        # generated by the processing pipeline (see exampapers.tasks).
         try:
             paper = serializer.save(author=self.request.user)
 
-            if paper.file:
-                # Verify storage is writable
-
-                if not default_storage.exists(paper.file.name):
-                    raise ValueError("File storage not accessible")
-
-                try:
-                    paper.set_page_count()
-                    paper.generate_preview()
-                    paper.save()
-                except Exception as e:
-                    logger.error(
-                        f"Error generating preview for paper {paper.id}: {str(e)}"
-                    )
-                    raise
+            # Verify storage is writable
+            source = paper.source_file
+            if source and not source.storage.exists(source.name):
+                raise ValueError("File storage not accessible")
 
         except Exception as e:
             logger.error(f"Paper upload failed: {str(e)}", exc_info=True)
             raise
 
 
+class PaperProcessingStatusView(generics.RetrieveAPIView):
+    serializer_class = PaperProcessingStatusSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return Paper.objects.filter(author=self.request.user).only(
+            "id", "processing_state", "processing_error", "page_count"
+        )
+
+
+UPLOAD_READ_SIZE = 64 * 1024
+
+
+class UploadSessionCreateView(generics.CreateAPIView):
+    """Start a chunked upload: the client declares the file's name, size and
+    SHA-256 and gets back the chunk size to split it into."""
+
+    serializer_class = UploadSessionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+
+class UploadSessionDetailView(generics.RetrieveAPIView):
+    """Lets a client see which parts already arrived to resume an upload."""
+
+    serializer_class = UploadSessionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(user=self.request.user)
+
+
+class UploadSessionPartView(APIView):
+    """Receive one part of a chunked upload as a raw request body.
+
+    The body is streamed into the session's temp file at the part's offset,
+    never held in memory. An optional ``X-Part-SHA256`` header is checked
+    before the part is recorded. Re-sending a part overwrites it.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def put(self, request, pk, part):
+        session = get_object_or_404(UploadSession, pk=pk, user=request.user)
+        if session.status != "pending":
+            return Response(
+                {"detail": "This upload is no longer accepting parts."}, status=409
+            )
+        if part >= session.part_count:
+            return Response({"detail": "Part number out of range."}, status=400)
+
+        expected = session.part_size(part)
+        try:
+            content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            content_length = 0
+        if content_length != expected:
+            return Response(
+                {"detail": f"Part {part} must be exactly {expected} bytes."},
+                status=400,
+            )
+
+        os.makedirs(settings.PAPER_UPLOAD_TEMP_DIR, exist_ok=True)
+        digest = hashlib.sha256()
+        written = 0
+        fd = os.open(session.temp_path, os.O_WRONLY | os.O_CREAT, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.seek(part * session.chunk_size)
+            while written < expected:
+                chunk = request.stream.read(min(UPLOAD_READ_SIZE, expected - written))
+                if not chunk:
+                    break
+                f.write(chunk)
+                digest.update(chunk)
+                written += len(chunk)
+
+        if written != expected:
+            return Response(
+                {"detail": f"Part {part} was truncated, please resend it."},
+                status=400,
+            )
+        part_sha256 = request.headers.get("X-Part-SHA256")
+        if part_sha256 and part_sha256.lower() != digest.hexdigest():
+            return Response(
+                {"detail": f"Checksum mismatch for part {part}, please resend it."},
+                status=400,
+            )
+
+        with transaction.atomic():
+            session = UploadSession.objects.select_for_update().get(pk=session.pk)
+            if part not in session.received_parts:
+                session.received_parts = sorted(session.received_parts + [part])
+                session.save(update_fields=["received_parts", "updated_at"])
+
+        return Response(UploadSessionSerializer(session).data)
+
+
+class UploadSessionCompleteView(APIView):
+    """Verify a fully received upload and turn it into a Paper.
+
+    Takes the same paper fields as ``PaperUploadView``. The assembled file is
+    checked against the declared SHA-256 and then saved like a regular
+    upload, which queues the processing pipeline.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk):
+        context = {"request": request}
+        with transaction.atomic():
+            session = get_object_or_404(
+                UploadSession.objects.select_for_update(), pk=pk, user=request.user
+            )
+            if session.status == "completed" and session.paper is not None:
+                return Response(PaperSerializer(session.paper, context=context).data)
+            if session.status != "pending":
+                return Response({"detail": "This upload has expired."}, status=409)
+
+            missing = sorted(
+                set(range(session.part_count)) - set(session.received_parts)
+            )
+            if missing:
+                return Response(
+                    {"detail": "Upload is incomplete.", "missing_parts": missing},
+                    status=400,
+                )
+
+            with open(session.temp_path, "rb") as f:
+                sha256 = file_sha256(File(f))
+            if sha256 != session.sha256:
+                session.received_parts = []
+                session.save(update_fields=["received_parts", "updated_at"])
+                session.discard_temp_file()
+                return Response(
+                    {"detail": "Checksum mismatch, please upload the file again."},
+                    status=400,
+                )
+
+            serializer = PaperSerializer(data=request.data, context=context)
+            serializer.is_valid(raise_exception=True)
+            with open(session.temp_path, "rb") as f:
+                paper = serializer.save(
+                    author=request.user, file=File(f, name=session.filename)
+                )
+
+            session.status = "completed"
+            session.paper = paper
+            session.save(update_fields=["status", "paper", "updated_at"])
+
+        session.discard_temp_file()
+        return Response(serializer.data, status=201)
+
+
 class CategoryListView(generics.ListAPIView):
     serializer_class = CategorySerializer
     permission_classes = [permissions.AllowAny]
@@ -461,9 +665,23 @@ class CourseListView(generics.ListAPIView):
         return Response({"results": data, "count": len(data)})
 
 
+def _with_card_data(queryset):
+    """Load everything ``PaperSerializer`` renders for a page of papers in a
+    fixed number of queries, however many papers are on the page."""
+    return (
+        queryset.select_related("author", "category", "course")
+        .prefetch_related(
+            Prefetch("school", queryset=School.objects.with_stats()),
+            Prefetch("reviews", queryset=Review.objects.select_related("user")),
+        )
+        .with_stats()
+    )
+
+
 class CoursePapersView(generics.ListAPIView):
     serializer_class = PaperSerializer
     permission_classes = [permissions.AllowAny]
+    query_budget = 6
     pagination_class = PaperPagination
     filter_backends = [
         DjangoFilterBackend,
@@ -482,12 +700,13 @@ class CoursePapersView(generics.ListAPIView):
         if course_id:
             qs = qs.filter(course_id=course_id)
 
-        return qs.select_related("course", "school").prefetch_related("reviews")
+        return _with_card_data(qs)
 
 
 class CategoryPapersView(generics.ListAPIView):
     serializer_class = PaperSerializer
     permission_classes = [permissions.AllowAny]
+    query_budget = 6
     pagination_class = PaperPagination
     filter_backends = [
         DjangoFilterBackend,
@@ -506,9 +725,7 @@ class CategoryPapersView(generics.ListAPIView):
         if category_id:
             qs = qs.filter(category_id=category_id)
 
-        return qs.select_related("category", "course", "school").prefetch_related(
-            "reviews"
-        )
+        return _with_card_data(qs)
 
 
 class UploadCourseListView(generics.ListAPIView):
@@ -576,106 +793,31 @@ class UploadCourseListView(generics.ListAPIView):
         return queryset.distinct()
 
 
-@method_decorator(cache_page(60 * 5), name="dispatch")
 class PopularCoursesView(generics.ListAPIView):
     serializer_class = CourseSerializer
     permission_classes = [permissions.AllowAny]
     pagination_class = None
 
-    def get_queryset(self):
-        return (
-            Course.objects.annotate(
-                paper_count=Count("papers", filter=Q(papers__status="published")),
-                average_price=Avg(
-                    "papers__price", filter=Q(papers__status="published")
-                ),
-                average_rating=Avg(
-                    "papers__reviews__rating", filter=Q(papers__status="published")
-                ),
-                category_name=F("papers__category__name"),
-                school_name=F("papers__school__name"),
-            )
-            .filter(paper_count__gt=0)
-            .order_by("-paper_count")[:8]
-        )
-
     def list(self, request, *args, **kwargs):
-        cache_key = "popular_courses_json"
-        data = cache.get(cache_key)
-        if not data:
-            queryset = self.get_queryset()
-            serialized = []
-            for course in queryset:
-                serialized.append(
-                    {
-                        "id": course.id,
-                        "name": course.name,
-                        "paper_count": course.paper_count,
-                        "average_price": course.average_price,
-                        "average_rating": course.average_rating,
-                    }
-                )
-            cache.set(cache_key, serialized, 300)
-            data = serialized
-        return Response(data)
+        return Response(catalog_cache.get("popular_courses"))
 
 
-@method_decorator(cache_page(60 * 5), name="dispatch")
 class PopularCategoriesView(generics.ListAPIView):
     serializer_class = CategorySerializer
     permission_classes = [permissions.AllowAny]
     pagination_class = None
 
-    def get_queryset(self):
-        return (
-            Category.objects.annotate(
-                paper_count=Count("papers", filter=Q(papers__status="published")),
-                average_price=Avg(
-                    "papers__price", filter=Q(papers__status="published")
-                ),
-                average_rating=Avg(
-                    "papers__reviews__rating", filter=Q(papers__status="published")
-                ),
-            )
-            .filter(paper_count__gt=0)
-            .only("id", "name")
-            .order_by("-paper_count")[:8]
-        )
-
     def list(self, request, *args, **kwargs):
-        cache_key = "popular_categories_json"
-        data = cache.get(cache_key)
-        if not data:
-            queryset = self.get_queryset()
-            data = self.get_serializer(queryset, many=True).data
-            cache.set(cache_key, data, 300)
-        return Response(data)
+        return Response(catalog_cache.get("popular_categories"))
 
 
-@method_decorator(cache_page(60 * 5), name="dispatch")
 class PopularSchoolsView(generics.ListAPIView):
     serializer_class = SchoolSerializer
     permission_classes = [permissions.AllowAny]
     pagination_class = None
 
-    def get_queryset(self):
-        return (
-            School.objects.annotate(
-                paper_count=Count("papers", filter=Q(papers__status="published")),
-            )
-            .filter(paper_count__gt=0)
-            .only("id", "name")
-            .order_by("-paper_count")[:8]
-        )
-
     def list(self, request, *args, **kwargs):
-        cache_key = "popular_schools_json"
-        data = cache.get(cache_key)
-        if not data:
-            queryset = self.get_queryset()
-            data = self.get_serializer(queryset, many=True).data
-            cache.set(cache_key, data, 300)
-        return Response(data)
+        return Response(catalog_cache.get("popular_schools"))
 
 
 class UserUploadSchoolListView(generics.ListAPIView):
@@ -747,6 +889,7 @@ class SchoolListView(generics.ListAPIView):
 class SchoolDetailView(generics.RetrieveAPIView):
     serializer_class = SchoolDetailSerializer
     permission_classes = [permissions.AllowAny]
+    query_budget = 6
     lookup_field = "pk"
 
     def get_queryset(self):
@@ -758,28 +901,16 @@ class SchoolDetailView(generics.RetrieveAPIView):
         ).prefetch_related(
             Prefetch(
                 "papers",
-                queryset=Paper.objects.filter(status="published")
-                .only("id", "title", "price", "upload_date", "course_id", "category_id")
-                .select_related("course", "category")
-                .annotate(
-                    download_count=Count("downloads"),
-                    review_count=Count("reviews"),
-                ),
+                queryset=_with_card_data(Paper.objects.filter(status="published")),
             ),
-            Prefetch("papers__course", queryset=Course.objects.only("id", "name")),
         )
 
 
-class SchoolPapersPagination(PageNumberPagination):
-    page_size = 12
-    page_size_query_param = "page_size"
-    max_page_size = 100
-
-
 class SchoolPapersView(generics.ListAPIView):
     serializer_class = PaperSerializer
     permission_classes = [permissions.AllowAny]
-    pagination_class = SchoolPapersPagination
+    query_budget = 6
+    pagination_class = KeysetPagination
     filter_backends = [
         DjangoFilterBackend,
         filters.SearchFilter,
@@ -793,19 +924,15 @@ class SchoolPapersView(generics.ListAPIView):
         "price",
         "download_count",
         "review_count",
+        "sold_count",
+        "average_rating",
     ]
     ordering = ["-upload_date"]
 
     def get_queryset(self):
         school_id = self.kwargs["pk"]
-        return (
+        return _with_card_data(
             Paper.objects.filter(school_id=school_id, status="published")
-            .select_related("course", "category")
-            .only("id", "title", "price", "upload_date", "course_id", "category_id")
-            .annotate(
-                download_count=Count("downloads", distinct=True),
-                review_count=Count("reviews", distinct=True),
-            )
         )
 
 
@@ -862,76 +989,72 @@ class CreateOrderView(generics.CreateAPIView):
 
 
 class DashboardStatsView(APIView):
+    """Platform-wide numbers from the daily snapshots, and the signed-in
+    user's own numbers (see exampapers.dashboard_stats)."""
+
     permission_classes = [permissions.IsAuthenticated]
+    # A new user's first load also creates their wallet.
+    query_budget = 4
 
     def get(self, request):
         user = request.user
-        today = now().date()
-
-        # --- Global Stats in ONE query ---
-        global_stats = Paper.objects.filter(status="published").aggregate(
-            total_papers=Count("id"),
-            total_downloads=Sum("downloads"),
-            total_uploads=Sum("uploads"),
-            total_views=Sum("views"),
-            total_earnings=Sum("earnings"),
-        )
-
-        total_users = User.objects.count()
-        total_orders = Order.objects.count()
-        completed_orders = Order.objects.filter(status="completed").count()
-        new_users_today = User.objects.filter(date_joined__date=today).count()
-        papers_uploaded_today = Paper.objects.filter(upload_date__date=today).count()
-
-        # --- User Stats in ONE query ---
-        user_papers_stats = Paper.objects.filter(author=user).aggregate(
-            user_papers_uploaded=Count("id"),
-            user_total_views=Sum("views"),
-            user_total_earnings_from_papers=Sum("earnings"),
-        )
-
-        # Single count queries for smaller datasets
-        user_downloaded_papers = PaperDownload.objects.filter(user=user).count()
-        user_orders = Order.objects.filter(user=user)
-        user_reviews = Review.objects.filter(user=user).count()
-        user_wishlist_count = Wishlist.objects.filter(user=user).count()
-
-        # Wallet
-        wallet, _ = Wallet.objects.get_or_create(user=user)
+        platform = dashboard_stats.platform_numbers()
+        mine = dashboard_stats.user_numbers(user)
 
         return Response(
             {
                 # 🌐 Platform-wide
-                "total_users": total_users,
-                "new_users_today": new_users_today,
-                "total_papers": global_stats["total_papers"] or 0,
-                "papers_uploaded_today": papers_uploaded_today,
-                "total_downloads": global_stats["total_downloads"] or 0,
-                "total_uploads": global_stats["total_uploads"] or 0,
-                "total_views": global_stats["total_views"] or 0,
-                "total_orders": total_orders,
-                "completed_orders": completed_orders,
-                "total_earnings": float(global_stats["total_earnings"] or 0),
+                "total_users": platform["total_users"],
+                "new_users_today": platform["new_users_today"],
+                "total_papers": platform["total_papers"],
+                "papers_uploaded_today": platform["papers_uploaded_today"],
+                "total_downloads": platform["total_downloads"],
+                "total_uploads": platform["total_uploads"],
+                "total_views": platform["total_views"],
+                "total_orders": platform["total_orders"],
+                "completed_orders": platform["completed_orders"],
+                "total_earnings": float(platform["total_earnings"]),
                 # 👤 User-specific
                 "user_name": user.get_full_name() or user.username,
-                "user_papers_uploaded": user_papers_stats["user_papers_uploaded"] or 0,
-                "user_total_downloads": user_downloaded_papers,
-                "user_total_views": user_papers_stats["user_total_views"] or 0,
-                "user_total_earnings_from_papers": float(
-                    user_papers_stats["user_total_earnings_from_papers"] or 0
-                ),
-                "user_orders": user_orders.count(),
-                "user_completed_orders": user_orders.filter(status="completed").count(),
-                "user_review_count": user_reviews,
-                "user_wishlist_count": user_wishlist_count,
+                "user_papers_uploaded": mine["papers_uploaded"],
+                "user_total_downloads": mine["download_count"],
+                "user_total_views": mine["paper_views"],
+                "user_total_earnings_from_papers": float(mine["paper_earnings"]),
+                "user_orders": mine["order_count"],
+                "user_completed_orders": mine["completed_order_count"],
+                "user_review_count": mine["review_count"],
+                "user_wishlist_count": mine["wishlist_count"],
                 # 💰 Wallet
-                "wallet_total_earned": float(wallet.total_earned),
-                "wallet_total_withdrawn": float(wallet.total_withdrawn),
-                "wallet_available_balance": float(wallet.available_balance),
+                "wallet_total_earned": float(mine["wallet_total_earned"]),
+                "wallet_total_withdrawn": float(mine["wallet_total_withdrawn"]),
+                "wallet_available_balance": float(mine["wallet_available_balance"]),
             }
         )
 
 
+class SellerAnalyticsView(APIView):
+    """The signed-in seller's views, downloads, sales, revenue and ratings
+    per day, week or month (``?period=``), from ``start`` to ``end``,
+    optionally for one ``paper`` (see exampapers.analytics)."""
+
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 2
+
+    def get(self, request):
+        query = SellerAnalyticsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        return Response(
+            analytics.series(
+                request.user,
+                params["start"],
+                params["end"],
+                params["period"],
+                paper_id=params.get("paper"),
+            )
+        )
+
+
 class PaperDownloadView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -941,33 +1064,32 @@ class PaperDownloadView(APIView):
         except Paper.DoesNotExist:
             return Response({"detail": "Paper not found."}, status=404)
 
+        if paper.processing_state != "ready":
+            return Response(
+                {"detail": "This paper is still being processed."}, status=409
+            )
+
         # Check if user owns the paper
-        if not Order.objects.filter(
-            user=request.user, papers=paper, status="completed"
-        ).exists():
+        if not is_owned(request.user, paper, request):
             return Response(
                 {"detail": "You have not purchased this paper."}, status=403
             )
 
-        # Create download record
-        PaperDownload.objects.create(
-            user=request.user, paper=paper, ip_address=self.get_client_ip(request)
-        )
-
-        # Increment download count
-        paper.increment_downloads()
+        # Resumed downloads (Range requests past the first byte) are
+        # continuations of one already recorded.
+        if is_initial_request(request):
+            # Also bumps paper.downloads (see exampapers.signals).
+            PaperDownload.objects.create(
+                user=request.user, paper=paper, ip_address=self.get_client_ip(request)
+            )
 
-        # Send email notification
-        self.send_download_email(request.user, paper)
+            # Send email notification
+            self.send_download_email(request.user, paper)
 
         # Return the original file (now pre-watermarked during upload)
-        response = FileResponse(
-            paper.file.open("rb"),
-            content_type="application/pdf",
-            as_attachment=True,
-            filename=os.path.basename(paper.file.name),
+        return deliver_file(
+            request, paper.file, f"{slugify(paper.title) or paper.pk}.pdf"
         )
-        return response
 
     def get_client_ip(self, request):
         x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
@@ -976,24 +1098,18 @@ class PaperDownloadView(APIView):
         return request.META.get("REMOTE_ADDR")
 
     def send_download_email(self, user, paper):
-        subject = f"You downloaded: {paper.title}"
-        from_email = settings.DEFAULT_FROM_EMAIL
-        to_email = user.email
-
-        html_content = render_to_string(
-            "emails/paper_download_email.html",
-            {
+        queue_email(
+            user.email,
+            f"You downloaded: {paper.title}",
+            f"You downloaded the paper: {paper.title}",
+            template_name="emails/paper_download_email.html",
+            context={
                 "user": user,
                 "paper": paper,
                 "download_time": datetime.now().strftime("%B %d, %Y at %I:%M %p"),
                 "year": datetime.now().year,
             },
         )
-        text_content = f"You downloaded the paper: {paper.title}"
-
-        msg = EmailMultiAlternatives(subject, text_content, from_email, [to_email])
-        msg.attach_alternative(html_content, "text/html")
-        msg.send()
 
 
 class PaperReviewCreateAPIView(generics.CreateAPIView):
@@ -1053,13 +1169,22 @@ class PaperDeleteView(generics.DestroyAPIView):
         if instance.author != self.request.user:
             raise permissions.PermissionDenied("You can only delete your own papers.")
 
-        # Delete associated files safely
-        try:
-            if instance.file and hasattr(instance.file, "url"):
-                instance.file.delete(save=False)
-            if hasattr(instance, "preview_file") and instance.preview_file:
-                instance.preview_file.delete(save=False)
-        except Exception as e:
-            logger.error(f"Error deleting files for paper {instance.id}: {str(e)}")
+        source_name = instance.source_file.name
+        names = {
+            instance.file.name,
+            instance.preview_file.name,
+            instance.preview_image.name,
+        }
+        for formats in (instance.preview_thumbnails or {}).values():
+            names.update(formats.values())
+        paper_id = instance.id
 
         instance.delete()
+
+        # Delete associated files safely; uploads are content-addressed, so
+        # files still used by a duplicate paper are kept.
+        try:
+            delete_unreferenced_files(default_storage, names)
+            delete_unreferenced_files(private_storage, [source_name])
+        except Exception as e:
+            logger.error(f"Error deleting files for paper {paper_id}: {str(e)}")
@@ -4,7 +4,13 @@ from datetime import datetime
 import requests
 from django.conf import settings
 
+from backend.cache import namespace
+
 DEFAULT_TIMEOUT = 60
+# Cached access tokens are dropped this many seconds before Safaricom
+# expires them.
+TOKEN_EXPIRY_MARGIN = 60
+cache = namespace("payments")
 
 
 def get_mpesa_access_token():
@@ -12,11 +18,25 @@ def get_mpesa_access_token():
     consumer_secret = settings.MPESA_CONSUMER_SECRET
     auth_url = settings.MPESA_AUTH_URL
 
+    cache_key = f"mpesa:token:{auth_url}:{consumer_key}"
+    access_token = cache.get(cache_key)
+    if access_token:
+        return access_token
+
     response = requests.get(
         auth_url, auth=(consumer_key, consumer_secret), timeout=DEFAULT_TIMEOUT
     )
     response_data = response.json()
-    return response_data["access_token"]
+    access_token = response_data["access_token"]
+    if response_data.get("expires_in"):
+        cache.set(
+            cache_key,
+            access_token,
+            int(response_data["expires_in"]) - TOKEN_EXPIRY_MARGIN,
+        )
+    else:
+        cache.set(cache_key, access_token)
+    return access_token
 
 
 def send_money_b2c(phone_number, amount, access_token, remarks="", occasion="Payout"):
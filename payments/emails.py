@@ -1,33 +1,35 @@
 from datetime import datetime
 
 from celery import shared_task
-from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
 
+from communications.outbox import queue_email
 from payments.models import WithdrawalRequest
 
 User = get_user_model()
 
 
-@shared_task
-def send_withdrawal_email_async(user_id, withdrawal_id, template_name, subject):
-    user = User.objects.get(id=user_id)
-    withdrawal = WithdrawalRequest.objects.get(id=withdrawal_id)
-
-    html_content = render_to_string(
-        f"emails/{template_name}",
-        {
+def send_withdrawal_email(user, withdrawal, template_name, subject):
+    queue_email(
+        user.email,
+        subject,
+        "This is a withdrawal notification from GradesWorld.",
+        template_name=f"emails/{template_name}",
+        context={
             "user": user,
             "withdrawal": withdrawal,
             "year": datetime.now().year,
         },
     )
-    text_content = "This is a withdrawal notification from GradesWorld."
 
-    msg = EmailMultiAlternatives(
-        subject, text_content, settings.DEFAULT_FROM_EMAIL, [user.email]
+
+@shared_task
+def send_withdrawal_email_async(user_id, withdrawal_id, template_name, subject):
+    # Kept so tasks queued before withdrawal emails moved to the outbox
+    # still get delivered.
+    send_withdrawal_email(
+        User.objects.get(id=user_id),
+        WithdrawalRequest.objects.get(id=withdrawal_id),
+        template_name,
+        subject,
     )
-    msg.attach_alternative(html_content, "text/html")
-    msg.send()
@@ -2,11 +2,10 @@ import logging
 from decimal import Decimal
 
 from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
 from django.db import transaction
-from django.template.loader import render_to_string
 from django.utils.timezone import now
 
+from communications.outbox import queue_email
 from payments.models import OrganizationAccount, Payment, Wallet
 
 logger = logging.getLogger(__name__)
@@ -100,11 +99,6 @@ def send_payment_success_email(order, user, papers):
         "year": now().year,
     }
 
-    subject = "Payment Successful - Download Your Papers"
-    from_email = settings.DEFAULT_FROM_EMAIL
-    to_email = user.email
-
-    html_content = render_to_string("emails/payment_success_email.html", context)
     text_content = (
         f"Hi {user.username},\n\n"
         f"Your payment was successful. You can download your purchased papers below:\n\n"
@@ -112,6 +106,10 @@ def send_payment_success_email(order, user, papers):
         + "\n\nThank you for using GradesWorld!"
     )
 
-    msg = EmailMultiAlternatives(subject, text_content, from_email, [to_email])
-    msg.attach_alternative(html_content, "text/html")
-    msg.send()
+    queue_email(
+        user.email,
+        "Payment Successful - Download Your Papers",
+        text_content,
+        template_name="emails/payment_success_email.html",
+        context=context,
+    )
@@ -5,7 +5,7 @@ from django.db import transaction
 from django.utils.timezone import now
 
 from mpesa_api.utils import get_mpesa_access_token, send_money_b2c
-from payments.emails import send_withdrawal_email_async
+from payments.emails import send_withdrawal_email
 from payments.models import WithdrawalRequest
 
 logger = logging.getLogger(__name__)
@@ -127,9 +127,9 @@ def finalize_withdrawal(withdrawal, transaction_reference):
     wallet.save()
 
     logger.info(f"Withdrawal {withdrawal.id} finalized for {withdrawal.user.email}")
-    send_withdrawal_email_async.delay(
-        withdrawal.user.id,
-        withdrawal.id,
+    send_withdrawal_email(
+        withdrawal.user,
+        withdrawal,
         "withdrawal_success_email.html",
         "Withdrawal Successful – GradesWorld",
     )
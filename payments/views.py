@@ -13,7 +13,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from intasend_api.verification import verify_intasend_payment
-from payments.emails import send_withdrawal_email_async
+from payments.emails import send_withdrawal_email
 from payments.models import Order, Payment
 from payments.serializers import WithdrawalRequestSerializer
 from payments.services.payment_update_service import update_payment_status
@@ -195,9 +195,9 @@ class WithdrawalRequestViewSet(viewsets.ModelViewSet):
         withdrawal = serializer.save(user=user, status="approved")
         logger.info(f"Created withdrawal {withdrawal.id} for user {user.id}")
 
-        send_withdrawal_email_async.delay(
-            user.id,
-            withdrawal.id,
+        send_withdrawal_email(
+            user,
+            withdrawal,
             "withdrawal_requested_email.html",
             "Your GradesWorld Withdrawal Request",
         )
@@ -214,9 +214,9 @@ class WithdrawalRequestViewSet(viewsets.ModelViewSet):
             withdrawal.save(update_fields=["status"])
             logger.error(f"Withdrawal {withdrawal.id} failed: {result.get('error')}")
 
-            send_withdrawal_email_async.delay(
-                user.id,
-                withdrawal.id,
+            send_withdrawal_email(
+                user,
+                withdrawal,
                 "withdrawal_failed_email.html",
                 "Withdrawal Failed – GradesWorld",
             )
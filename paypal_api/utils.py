@@ -3,15 +3,27 @@ import logging
 import requests
 from django.conf import settings
 
+from backend.cache import namespace
+
 DEFAULT_TIMEOUT = 60
+# Cached access tokens are dropped this many seconds before PayPal expires
+# them.
+TOKEN_EXPIRY_MARGIN = 60
 logger = logging.getLogger(__name__)
+cache = namespace("payments")
 
 
 def get_paypal_access_token():
     """
     Get PayPal OAuth2 access token.
     Works for both sandbox and live environments.
+    The token is cached until shortly before it expires.
     """
+    cache_key = f"paypal:token:{settings.PAYPAL_MODE}:{settings.PAYPAL_CLIENT_ID}"
+    token = cache.get(cache_key)
+    if token:
+        return token
+
     api_url = (
         "https://api-m.paypal.com/v1/oauth2/token"
         if settings.PAYPAL_MODE == "live"
@@ -27,9 +39,14 @@ def get_paypal_access_token():
             timeout=DEFAULT_TIMEOUT,
         )
         response.raise_for_status()
-        token = response.json().get("access_token")
+        data = response.json()
+        token = data.get("access_token")
         if not token:
             raise ValueError("PayPal API did not return an access token")
+        if data.get("expires_in"):
+            cache.set(cache_key, token, int(data["expires_in"]) - TOKEN_EXPIRY_MARGIN)
+        else:
+            cache.set(cache_key, token)
         return token
 
     except requests.exceptions.RequestException as e:
@@ -0,0 +1,88 @@
+import logging
+import re
+import secrets
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+
+from backend.cache import namespace
+
+logger = logging.getLogger(__name__)
+cache = namespace("auth")
+
+USERNAME_MAX_LENGTH = 30
+
+
+def _subject_key(subject):
+    return f"auth0:subject:{subject}"
+
+
+def _user_key(user_id):
+    return f"auth0:user:{user_id}"
+
+
+def _generate_username(email):
+    User = get_user_model()
+    base = re.sub(r"[^\w.+-]", "", email.split("@")[0])[:USERNAME_MAX_LENGTH] or "user"
+    candidate = base
+    for _ in range(5):
+        if not User.objects.filter(username=candidate).exists():
+            return candidate
+        suffix = secrets.token_hex(3)
+        candidate = f"{base[: USERNAME_MAX_LENGTH - len(suffix) - 1]}_{suffix}"
+    return candidate
+
+
+def provision_user(claims):
+    """Return the user for verified Auth0 claims, creating them on first login.
+
+    Safe to call concurrently for the same new user: whoever loses the
+    race to insert picks up the row the winner created.
+    """
+    User = get_user_model()
+    email = User.objects.normalize_email(claims["email"])
+    user = User.objects.filter(email=email).first()
+    if user is not None:
+        return user, False
+
+    try:
+        with transaction.atomic():
+            user = User(
+                email=email,
+                username=_generate_username(email),
+                first_name=claims.get("given_name", ""),
+                last_name=claims.get("family_name", ""),
+            )
+            user.set_unusable_password()
+            user.save()
+    except IntegrityError:
+        user = User.objects.filter(email=email).first()
+        if user is None:
+            raise
+        return user, False
+
+    logger.info(f"Provisioned user {user.id} from Auth0 login")
+    return user, True
+
+
+def resolve_user(claims):
+    """Map verified Auth0 claims to a user, from cache where possible.
+
+    The token subject (or email, for tokens without one) is cached to the
+    user id, and the user itself is cached by id until it is saved or
+    deleted, so a warm request doesn't touch the database.
+    """
+    subject_key = _subject_key(claims.get("sub") or claims["email"])
+    user_id = cache.get(subject_key)
+    if user_id is not None:
+        user = cache.get(_user_key(user_id))
+        if user is not None:
+            return user
+
+    user, _ = provision_user(claims)
+    cache.set_many({subject_key: user.id, _user_key(user.id): user})
+    return user
+
+
+def invalidate_user(user_id):
+    cache.delete(_user_key(user_id))
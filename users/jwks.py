@@ -0,0 +1,208 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+
+import requests
+from django.conf import settings
+from jose import jwt
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 10
+
+
+class JWKSUnavailable(Exception):
+    """Auth0's signing keys could not be fetched and none are cached."""
+
+
+class SigningKeyNotFound(Exception):
+    """The token was signed with a key Auth0 doesn't publish."""
+
+
+class JWKSCache:
+    """Process-wide cache of Auth0's JSON Web Key Set, keyed by ``kid``.
+
+    Keys older than ``ttl`` are still served while a background thread
+    fetches fresh ones. An unknown ``kid`` (e.g. after a key rotation)
+    forces a synchronous refresh, at most once per
+    ``min_refresh_interval``. When Auth0 can't be reached, cached keys keep
+    being used for up to ``max_stale`` seconds.
+    """
+
+    def __init__(self, ttl, max_stale, min_refresh_interval, timeout=DEFAULT_TIMEOUT):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+        self.stats = Counter()
+        self._keys = {}
+        self._fetched_at = 0.0
+        self._last_forced_refresh = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    @property
+    def url(self):
+        return f"https://{settings.AUTH0_DOMAIN}/.well-known/jwks.json"
+
+    def get_key(self, kid):
+        age = time.monotonic() - self._fetched_at
+        if self._keys and age > self.max_stale:
+            # Too old to trust without trying to refresh first.
+            self.refresh()
+        elif self._keys and age > self.ttl:
+            self._refresh_in_background()
+
+        key = self._keys.get(kid)
+        if key is not None:
+            self.stats["hits"] += 1
+            return key
+
+        self.stats["misses"] += 1
+        since_forced = time.monotonic() - self._last_forced_refresh
+        if not self._keys or since_forced >= self.min_refresh_interval:
+            self._last_forced_refresh = time.monotonic()
+            self.refresh()
+            key = self._keys.get(kid)
+        if key is None:
+            raise SigningKeyNotFound(f"Matching RSA key not found in JWKS: {kid}")
+        return key
+
+    def refresh(self):
+        with self._lock:
+            try:
+                response = requests.get(self.url, timeout=self.timeout)
+                response.raise_for_status()
+                keys = {
+                    key["kid"]: {
+                        "kty": key["kty"],
+                        "kid": key["kid"],
+                        "use": key["use"],
+                        "n": key["n"],
+                        "e": key["e"],
+                    }
+                    for key in response.json()["keys"]
+                }
+            except (requests.RequestException, ValueError, KeyError) as e:
+                self.stats["refresh_errors"] += 1
+                age = time.monotonic() - self._fetched_at
+                if not self._keys or age > self.max_stale:
+                    raise JWKSUnavailable(f"Unable to fetch JWKS keys from Auth0: {e}")
+                logger.warning(f"JWKS refresh failed, using cached keys: {e}")
+                return
+
+            self.stats["refreshes"] += 1
+            self._keys = keys
+            self._fetched_at = time.monotonic()
+
+    def _refresh_in_background(self):
+        if self._refreshing:
+            return
+        self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except JWKSUnavailable as e:
+                logger.warning(str(e))
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="jwks-refresh", daemon=True).start()
+
+    def clear(self):
+        with self._lock:
+            self._keys = {}
+            self._fetched_at = 0.0
+
+
+class ClaimsCache:
+    """Bounded LRU of verified token claims.
+
+    Entries are keyed by a hash of the token and never outlive the token's
+    ``exp``, so a cached token stops authenticating exactly when it would
+    have failed verification.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.stats = Counter()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token):
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                claims, expires_at = entry
+                if time.time() < expires_at:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return claims
+                del self._entries[key]
+            self.stats["misses"] += 1
+        return None
+
+    def set(self, token, claims):
+        expires_at = claims.get("exp")
+        if not expires_at or self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[self._key(token)] = (claims, float(expires_at))
+            self._entries.move_to_end(self._key(token))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+jwks_cache = JWKSCache(
+    ttl=settings.AUTH0_JWKS_CACHE_TTL,
+    max_stale=settings.AUTH0_JWKS_MAX_STALE,
+    min_refresh_interval=settings.AUTH0_JWKS_MIN_REFRESH_INTERVAL,
+)
+claims_cache = ClaimsCache(max_size=settings.AUTH0_CLAIMS_CACHE_SIZE)
+
+
+def decode_auth0_token(token):
+    """Verify an Auth0 access token and return its claims.
+
+    Raises the usual ``jose`` errors for invalid or expired tokens, and
+    ``SigningKeyNotFound`` / ``JWKSUnavailable`` when no key can verify it.
+    """
+    claims = claims_cache.get(token)
+    if claims is not None:
+        return claims
+
+    unverified_header = jwt.get_unverified_header(token)
+    claims = jwt.decode(
+        token,
+        jwks_cache.get_key(unverified_header.get("kid")),
+        algorithms=settings.AUTH0_ALGORITHMS,
+        audience=settings.AUTH0_API_IDENTIFIER,
+        issuer=f"https://{settings.AUTH0_DOMAIN}/",
+    )
+    claims_cache.set(token, claims)
+    return claims
+
+
+def _hit_rate(stats):
+    total = stats["hits"] + stats["misses"]
+    return round(stats["hits"] / total, 4) if total else None
+
+
+def auth_cache_stats():
+    """Hit/miss counters of this process's JWKS and claims caches."""
+    return {
+        "jwks": {**jwks_cache.stats, "hit_rate": _hit_rate(jwks_cache.stats)},
+        "claims": {**claims_cache.stats, "hit_rate": _hit_rate(claims_cache.stats)},
+    }
@@ -2,12 +2,12 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.tokens import default_token_generator
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
 from django.utils.timezone import now
 
+from communications.outbox import queue_email
+
 User = get_user_model()
 
 
@@ -17,26 +17,17 @@ def send_activation_email(user):
 
     activation_link = f"{settings.BASE_URL}/activate/{uid}/{token}/"
 
-    html_message = render_to_string(
-        "emails/activation_email_template.html",
-        {
-            "user": user,
-            "activation_link": activation_link,
-            "current_year": now().year,
-        },
-    )
-
-    subject = "Activate Your GradesWorld Account"
     message = f"Hi {user.username},\n\nPlease activate your account by\
         clicking the link below:\n\n{activation_link}\n\nThank you!"
-    from_email = settings.DEFAULT_FROM_EMAIL
-    recipient_list = [user.email]
 
-    send_mail(
-        subject,
+    queue_email(
+        user.email,
+        "Activate Your GradesWorld Account",
         message,
-        from_email,
-        recipient_list,
-        fail_silently=False,
-        html_message=html_message,
+        template_name="emails/activation_email_template.html",
+        context={
+            "user": user,
+            "activation_link": activation_link,
+            "current_year": now().year,
+        },
     )
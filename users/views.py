@@ -1,21 +1,20 @@
-import requests
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.tokens import default_token_generator
-from django.core.mail import send_mail
 from django.http import JsonResponse
-from django.template.loader import render_to_string
 from django.utils.encoding import force_bytes, force_str
 from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 from django.utils.timezone import now
 from django.views.decorators.csrf import csrf_exempt
-from jose import jwt
 from rest_framework import generics, status
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from communications.outbox import queue_email
+from users.auth0_users import provision_user
+from users.jwks import SigningKeyNotFound, decode_auth0_token
 from users.utils import send_activation_email
 
 from .serializers import (
@@ -29,8 +28,6 @@ from .serializers import (
 
 User = get_user_model()
 
-DEFAULT_TIMEOUT = 60
-
 
 class RegisterUserView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -109,24 +106,18 @@ class RequestPasswordResetView(generics.GenericAPIView):
 
         reset_link = f"{settings.BASE_URL}/reset-password-confirm/{uid}/{token}"
 
-        html_message = render_to_string(
-            "emails/password_reset_email_template.html",
-            {
+        queue_email(
+            email,
+            "Password Reset Request",
+            f"Click the link to reset your password: {reset_link}",
+            template_name="emails/password_reset_email_template.html",
+            context={
                 "user": user,
                 "reset_link": reset_link,
                 "current_year": now().year,
             },
         )
 
-        send_mail(
-            subject="Password Reset Request",
-            message=f"Click the link to reset your password: {reset_link}",
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[email],
-            fail_silently=False,
-            html_message=html_message,
-        )
-
         return Response(
             {"detail": "Password reset link sent."}, status=status.HTTP_200_OK
         )
@@ -219,34 +210,13 @@ class Auth0LoginView(APIView):
 
         try:
             # Verify the token with Auth0
-            jwks_url = f"https://{settings.AUTH0_DOMAIN}/.well-known/jwks.json"
-            jwks = requests.get(jwks_url, timeout=DEFAULT_TIMEOUT).json()
-
-            unverified_header = jwt.get_unverified_header(token)
-            rsa_key = {}
-            for key in jwks["keys"]:
-                if key["kid"] == unverified_header["kid"]:
-                    rsa_key = {
-                        "kty": key["kty"],
-                        "kid": key["kid"],
-                        "use": key["use"],
-                        "n": key["n"],
-                        "e": key["e"],
-                    }
-
-            if not rsa_key:
+            try:
+                payload = decode_auth0_token(token)
+            except SigningKeyNotFound:
                 return Response(
                     {"detail": "Invalid token"}, status=status.HTTP_400_BAD_REQUEST
                 )
 
-            payload = jwt.decode(
-                token,
-                rsa_key,
-                algorithms=settings.AUTH0_ALGORITHMS,
-                audience=settings.AUTH0_API_IDENTIFIER,
-                issuer=f"https://{settings.AUTH0_DOMAIN}/",
-            )
-
             email = payload.get("email")
             if not email:
                 return Response(
@@ -255,12 +225,7 @@ class Auth0LoginView(APIView):
                 )
 
             # Get or create user
-            user, created = User.objects.get_or_create(email=email)
-            if created:
-                user.first_name = payload.get("given_name", "")
-                user.last_name = payload.get("family_name", "")
-                user.set_unusable_password()
-                user.save()
+            user, _ = provision_user(payload)
 
             # Generate tokens
             refresh = RefreshToken.for_user(user)